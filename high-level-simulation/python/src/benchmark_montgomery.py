@@ -0,0 +1,529 @@
+"""
+This module contains a benchmark of the montgomery implementations, timing monpro
+and modexp over a grid of key sizes and limb widths, with the results as JSON.
+"""
+
+import sys
+import json
+import random
+import timeit
+import argparse
+import logging
+import platform
+import statistics
+from dataclasses import dataclass, asdict
+from datetime import datetime
+from typing import Callable
+
+from generate_rsa_key_values import get_rsa_key_values
+from montgomery import montgomery_monpro, montgomery_modexp
+from montgomery_monpro_cios import (
+    MontgomeryContext,
+    MAX_WORD_SIZE,
+    to_limb_matrix,
+    get_montgomery_context,
+    montgomery_monpro_cios,
+    montgomery_modexp as montgomery_modexp_cios,
+)
+from montgomery_monpro_cios_batched import montgomery_monpro_cios_batched
+from montgomery_monpro_cios_systolic_array import (
+    montgomery_monpro_cios_systolic_array,
+    montgomery_modexp as montgomery_modexp_cios_systolic_array,
+)
+from montgomery_modexp_many import modexp_many
+from montgomery_monpro_karatsuba import (
+    KARATSUBA_THRESHOLD,
+    monpro_limbs,
+    montgomery_monpro_karatsuba,
+    montgomery_modexp as montgomery_modexp_karatsuba,
+    to_limb_list,
+)
+from montgomery_monpro_variants import (
+    montgomery_monpro_sos,
+    montgomery_monpro_fios,
+    montgomery_monpro_cihs,
+)
+
+logger = logging.getLogger(__name__)
+
+KEY_SIZES = [256, 1024, 2048]
+
+# Limb widths of the (w, s) grid in test_montgomery_monpro.py
+LIMB_WIDTHS = [32, 16, 8, 4, 2]
+
+# The limb based python models are O(s²) per monpro, bigger s is skipped by default
+MAX_NUM_LIMBS = 64
+
+# Number of 32-bit limbs of the Karatsuba crossover benchmark
+CROSSOVER_NUM_LIMBS = [8, 16, 32, 64, 128]
+
+# Messages per call of the batched implementations
+BATCH_SIZE = 64
+
+# Ratio of the new to the baseline minimum time that is reported as a regression
+REGRESSION_THRESHOLD = 1.25
+
+
+@dataclass(frozen=True)
+class BenchmarkResult:
+    name: str
+    key_size: int
+    # Limb width and number of limbs, 0 for the implementations without limbs
+    w: int
+    s: int
+    # Number of calls timed in each repeat
+    number: int
+    repeat: int
+    # Seconds per call
+    mean: float
+    minimum: float
+    stdev: float
+    # Messages handled per call, more than one for the batched implementations
+    batch_size: int = 1
+
+    @property
+    def key(self) -> tuple[str, int, int, int]:
+        return (self.name, self.key_size, self.w, self.s)
+
+
+def measure(func: Callable, min_time: float = 0.2, repeat: int = 5):
+    """
+    Time func(), calling it enough times per repeat to take about 'min_time'
+    seconds, like timeit autorange. Returns (number, seconds per call of each repeat)
+    """
+
+    timer = timeit.Timer(func)
+
+    number = 1
+    while True:
+        seconds = timer.timeit(number)
+        if seconds >= min_time / repeat:
+            break
+        number *= 2
+
+    times = [seconds / number] + [
+        timer.timeit(number) / number for _ in range(repeat - 1)
+    ]
+
+    return number, times
+
+
+def random_modulus(key_size: int, seed: int = 4141) -> int:
+    """
+    Random odd modulus with the top bit set. Montgomery multiplication only needs
+    n to be odd, so there is no need to generate primes for the benchmark.
+    """
+
+    rng = random.Random(seed + key_size)
+    return rng.getrandbits(key_size) | (1 << (key_size - 1)) | 1
+
+
+def get_benchmarks(key_size: int, w: int, e: int, seed: int = 4141):
+    """
+    Get (name, w, s, batch_size, func) for every implementation with a
+    key of 'key_size' bits and limbs of 'w' bits. w = 0 gives the ones without limbs.
+    """
+
+    n = random_modulus(key_size, seed)
+    rng = random.Random(seed)
+    a, b = rng.randrange(n), rng.randrange(n)
+
+    if w == 0:
+        key_values = get_rsa_key_values(n, key_size)
+
+        return [
+            ("monpro/montgomery", 0, 0, 1, lambda: montgomery_monpro(a, b, key_values)),
+            (
+                "modexp/montgomery",
+                0,
+                0,
+                1,
+                lambda: montgomery_modexp(a, e, n, key_values, skip_leading_zeros=True),
+            ),
+        ]
+
+    s = -(-key_size // w)
+    key_values = get_rsa_key_values(n, w, s)
+    n_0_prime = key_values.n_0_prime
+    messages = [rng.randrange(n) for _ in range(BATCH_SIZE)]
+
+    benchmarks = [
+        (
+            "monpro/cios",
+            w,
+            s,
+            1,
+            lambda: montgomery_monpro_cios(a, b, w, s, n, n_0_prime),
+        ),
+        (
+            "monpro/cios_systolic_array",
+            w,
+            s,
+            1,
+            lambda: montgomery_monpro_cios_systolic_array(a, b, w, s, n, n_0_prime),
+        ),
+        (
+            "modexp/cios_systolic_array",
+            w,
+            s,
+            1,
+            lambda: montgomery_modexp_cios_systolic_array(
+                a, e, n, w, s, key_values, skip_leading_zeros=True
+            ),
+        ),
+    ]
+
+    if w <= MAX_WORD_SIZE:
+        context = MontgomeryContext(n, w, s)
+        a_limbs, b_limbs = context.to_limbs(a), context.to_limbs(b)
+        a_matrix = to_limb_matrix(messages, s, w)
+        b_matrix = to_limb_matrix(messages[::-1], s, w)
+
+        benchmarks += [
+            (
+                "monpro/cios_context",
+                w,
+                s,
+                1,
+                lambda: context.monpro(a_limbs, b_limbs),
+            ),
+            (
+                "monpro/cios_batched",
+                w,
+                s,
+                BATCH_SIZE,
+                lambda: montgomery_monpro_cios_batched(
+                    a_matrix, b_matrix, w, s, n, n_0_prime
+                ),
+            ),
+            (
+                "monpro/karatsuba",
+                w,
+                s,
+                1,
+                lambda: montgomery_monpro_karatsuba(a, b, w, s, n, n_0_prime),
+            ),
+            (
+                "modexp/cios",
+                w,
+                s,
+                1,
+                lambda: montgomery_modexp_cios(
+                    a, e, n, w, s, key_values, skip_leading_zeros=True
+                ),
+            ),
+            (
+                "modexp/karatsuba",
+                w,
+                s,
+                1,
+                lambda: montgomery_modexp_karatsuba(
+                    a, e, n, w, s, key_values, skip_leading_zeros=True
+                ),
+            ),
+            (
+                "modexp/cios_batched",
+                w,
+                s,
+                BATCH_SIZE,
+                lambda: modexp_many(messages, e, key_values, skip_leading_zeros=True),
+            ),
+        ]
+
+        # The scanning orders of montgomery_monpro_variants, CIOS is monpro/cios
+        variants = [("sos", montgomery_monpro_sos), ("fios", montgomery_monpro_fios)]
+        if s < 1 << w:
+            variants.append(("cihs", montgomery_monpro_cihs))
+
+        benchmarks += [
+            (
+                f"monpro/{name}",
+                w,
+                s,
+                1,
+                lambda monpro=monpro: monpro(a, b, w, s, n, n_0_prime),
+            )
+            for name, monpro in variants
+        ]
+
+    return benchmarks
+
+
+def run_benchmarks(
+    key_sizes=KEY_SIZES,
+    limb_widths=LIMB_WIDTHS,
+    e: int = 0x10001,
+    max_num_limbs: int = MAX_NUM_LIMBS,
+    min_time: float = 0.2,
+    repeat: int = 5,
+    name_filter: str = "",
+) -> list[BenchmarkResult]:
+    """Run every benchmark whose name contains 'name_filter'"""
+
+    results = []
+
+    for key_size in key_sizes:
+        for w in [0] + list(limb_widths):
+            if w and -(-key_size // w) > max_num_limbs:
+                logger.info(f"Skipping {key_size} bits with {w}-bit limbs")
+                continue
+
+            for name, w, s, batch_size, func in get_benchmarks(key_size, w, e):
+                if name_filter not in name:
+                    continue
+
+                number, times = measure(func, min_time, repeat)
+                result = BenchmarkResult(
+                    name=name,
+                    key_size=key_size,
+                    w=w,
+                    s=s,
+                    number=number,
+                    repeat=repeat,
+                    mean=statistics.mean(times),
+                    minimum=min(times),
+                    stdev=statistics.stdev(times) if repeat > 1 else 0.0,
+                    batch_size=batch_size,
+                )
+                logger.info(result)
+
+                results.append(result)
+
+    return results
+
+
+def run_crossover(
+    num_limbs=CROSSOVER_NUM_LIMBS,
+    w: int = 32,
+    threshold: int = KARATSUBA_THRESHOLD,
+    min_time: float = 0.2,
+    repeat: int = 5,
+) -> list[BenchmarkResult]:
+    """
+    Time one monpro of montgomery_monpro, the CIOS context and the multiply-then-
+    reduce monpro with and without Karatsuba, for keys of w * s bits
+
+    The limb based ones get their operands as limbs, so the conversion is not timed.
+    Squaring is timed separately, as it is most of the monpros of a modexp.
+    """
+
+    results = []
+
+    for s in num_limbs:
+        key_size = w * s
+        n = random_modulus(key_size)
+        rng = random.Random(4141)
+        a, b = rng.randrange(n), rng.randrange(n)
+
+        key_values = get_rsa_key_values(n, key_size)
+        context = get_montgomery_context(n, w, s)
+        a_limbs, b_limbs = context.to_limbs(a), context.to_limbs(b)
+
+        a_list, b_list = to_limb_list(a, s, w), to_limb_list(b, s, w)
+        n_list = to_limb_list(n, s, w)
+        n_prime = to_limb_list(get_rsa_key_values(n, w, s).n_0_prime, s, w)
+
+        benchmarks = [
+            ("montgomery", lambda x, y: montgomery_monpro(x, y, key_values), a, b),
+            ("cios_context", context.monpro, a_limbs, b_limbs),
+            (
+                "schoolbook",
+                lambda x, y: monpro_limbs(x, y, w, n_list, n_prime, threshold=s),
+                a_list,
+                b_list,
+            ),
+            (
+                "karatsuba",
+                lambda x, y: monpro_limbs(x, y, w, n_list, n_prime, threshold),
+                a_list,
+                b_list,
+            ),
+        ]
+
+        for name, monpro, x, y in benchmarks:
+            for suffix, func in (
+                ("", lambda: monpro(x, y)),
+                ("_square", lambda: monpro(x, x)),
+            ):
+                number, times = measure(func, min_time, repeat)
+                result = BenchmarkResult(
+                    name=f"crossover/{name}{suffix}",
+                    key_size=key_size,
+                    w=w,
+                    s=s,
+                    number=number,
+                    repeat=repeat,
+                    mean=statistics.mean(times),
+                    minimum=min(times),
+                    stdev=statistics.stdev(times) if repeat > 1 else 0.0,
+                )
+                logger.info(result)
+
+                results.append(result)
+
+    return results
+
+
+def find_crossover(
+    results: list[BenchmarkResult], name: str, baseline_name: str
+) -> int | None:
+    """
+    Find the smallest number of limbs from which 'name' is faster than
+    'baseline_name' for every bigger key, or None if it never is
+    """
+
+    minimum = {
+        (result.name, result.s): result.minimum
+        for result in results
+        if result.name in (name, baseline_name)
+    }
+    num_limbs = sorted({s for _, s in minimum})
+
+    crossover = None
+    for s in reversed(num_limbs):
+        if minimum[(name, s)] >= minimum[(baseline_name, s)]:
+            break
+        crossover = s
+
+    return crossover
+
+
+def to_json(results: list[BenchmarkResult], e: int) -> dict:
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "exponent_bits": e.bit_length(),
+        "results": [asdict(result) for result in results],
+    }
+
+
+def from_json(data: dict) -> list[BenchmarkResult]:
+    return [BenchmarkResult(**result) for result in data["results"]]
+
+
+def find_regressions(
+    results: list[BenchmarkResult],
+    baseline: list[BenchmarkResult],
+    threshold: float = REGRESSION_THRESHOLD,
+) -> list[tuple[BenchmarkResult, float]]:
+    """Find the results that are more than 'threshold' times slower than baseline"""
+
+    baseline = {result.key: result for result in baseline}
+
+    regressions = []
+    for result in results:
+        if result.key not in baseline:
+            continue
+
+        ratio = result.minimum / baseline[result.key].minimum
+        if ratio > threshold:
+            regressions.append((result, ratio))
+
+    return regressions
+
+
+def main():
+    """Run main CLI application"""
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-k", "--key-sizes", nargs="+", type=int, default=KEY_SIZES)
+    parser.add_argument("-w", "--limb-widths", nargs="+", type=int, default=LIMB_WIDTHS)
+    parser.add_argument(
+        "-s",
+        "--max-num-limbs",
+        type=int,
+        default=MAX_NUM_LIMBS,
+        help="Skip limb widths that need more limbs than this",
+    )
+    parser.add_argument("-e", "--exponent", type=lambda x: int(x, 0), default=0x10001)
+    parser.add_argument("-t", "--min-time", type=float, default=0.2)
+    parser.add_argument("-r", "--repeat", type=int, default=5)
+    parser.add_argument(
+        "-f", "--filter", default="", help="Only run benchmarks containing this"
+    )
+    parser.add_argument("-o", "--output", help="Write the results to a JSON file")
+    parser.add_argument(
+        "-c", "--compare", help="JSON file from an earlier run to compare with"
+    )
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    parser.add_argument(
+        "--crossover",
+        nargs="*",
+        type=int,
+        help="Find where Karatsuba is faster, with these numbers of 32-bit limbs",
+    )
+    args = parser.parse_args()
+
+    if args.crossover is not None:
+        results = run_crossover(
+            args.crossover or CROSSOVER_NUM_LIMBS,
+            min_time=args.min_time,
+            repeat=args.repeat,
+        )
+
+        print(f"{'benchmark':<30} {'bits':>5} {'s':>4} {'min':>12}")
+        for result in results:
+            print(
+                f"{result.name:<30} {result.key_size:>5} {result.s:>4} "
+                f"{result.minimum * 1e6:>9.1f} us"
+            )
+
+        for name, baseline_name in (
+            ("karatsuba", "schoolbook"),
+            ("karatsuba", "cios_context"),
+            ("karatsuba", "montgomery"),
+        ):
+            for suffix in ("", "_square"):
+                crossover = find_crossover(
+                    results,
+                    f"crossover/{name}{suffix}",
+                    f"crossover/{baseline_name}{suffix}",
+                )
+                print(
+                    f"{name}{suffix} is faster than {baseline_name}{suffix} from: "
+                    f"{'never' if crossover is None else f'{crossover} limbs'}"
+                )
+
+        return 0
+
+    results = run_benchmarks(
+        args.key_sizes,
+        args.limb_widths,
+        args.exponent,
+        args.max_num_limbs,
+        args.min_time,
+        args.repeat,
+        args.filter,
+    )
+
+    print(f"{'benchmark':<28} {'bits':>5} {'w':>3} {'s':>4} {'mean':>12} {'msg/s':>10}")
+    for result in results:
+        print(
+            f"{result.name:<28} {result.key_size:>5} {result.w:>3} {result.s:>4} "
+            f"{result.mean * 1e6:>9.1f} us "
+            f"{result.batch_size / result.mean:>10.1f}"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(to_json(results, args.exponent), f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = from_json(json.load(f))
+
+        regressions = find_regressions(results, baseline, args.threshold)
+        for result, ratio in regressions:
+            print(
+                f"Regression: {result.name} {result.key_size} bits w={result.w} "
+                f"is {ratio:.2f} times slower"
+            )
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
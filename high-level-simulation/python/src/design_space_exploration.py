@@ -0,0 +1,196 @@
+"""
+This module contains a design space exploration of the RSA accelerator,
+predicting the throughput of exponentiation.vhd for a grid of core counts,
+limb widths and window sizes, without synthesizing each of them.
+"""
+
+import sys
+import argparse
+import functools
+import itertools
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+from modexp_cycle_model import (
+    AXIS_DATA_WIDTH,
+    CLK_FREQUENCY_HZ,
+    DISPATCH_CYCLES,
+    get_num_limbs,
+    get_num_instructions,
+    monpro_cycles,
+    window_modexp_cycles,
+    NUM_PHASES,
+)
+from rsa_test_vectors import (
+    TEST_VECTOR_PATH,
+    count_blocks,
+    find_input_files,
+    read_header,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class DesignPoint:
+    num_cores: int
+    limb_width: int
+    window_size: int = 1
+
+
+@dataclass(frozen=True)
+class DesignResult:
+    point: DesignPoint
+    num_limbs: int
+    # Alpha and gamma modules per core
+    num_pe: int
+    monpro_cycles: int
+    # Mean over the messages of the test vectors
+    modexp_cycles: float
+    messages_per_second: float
+    # What limits the throughput, "cores" or "stream"
+    bound: str
+
+    @property
+    def num_modules(self) -> int:
+        """Alpha and gamma modules of all cores, a rough measure of the DSP usage"""
+        return self.point.num_cores * 2 * self.num_pe
+
+
+def load_exponent_stats(paths=None) -> dict[int, int]:
+    """
+    Count the messages of each exponent in the test vectors
+
+    Returns a dictionary from exponent to number of messages, so the cycle model
+    is weighted like the workload the accelerator is tested with.
+    """
+
+    if paths is None:
+        paths = find_input_files(TEST_VECTOR_PATH)
+
+    stats = {}
+    for path in paths:
+        exponent = read_header(path).exponent
+        stats[exponent] = stats.get(exponent, 0) + count_blocks(path)
+
+    return stats
+
+
+def evaluate_design_point(
+    point: DesignPoint,
+    exponent_stats: dict[int, int],
+    block_size: int = 256,
+    frequency: float = CLK_FREQUENCY_HZ,
+) -> DesignResult:
+    """Predict the throughput of one configuration of the accelerator"""
+
+    num_limbs = get_num_limbs(block_size, point.limb_width)
+    num_instructions = get_num_instructions(num_limbs)
+
+    num_messages = sum(exponent_stats.values())
+    modexp_cycles = (
+        sum(
+            count * window_modexp_cycles(e, point.window_size, num_instructions)
+            for e, count in exponent_stats.items()
+        )
+        / num_messages
+    )
+
+    # Every core is busy for a whole modexp, while the input and output streams
+    # can at most move one block per block_size / AXIS_DATA_WIDTH clock cycles
+    core_rate = point.num_cores / (modexp_cycles + DISPATCH_CYCLES)
+    stream_rate = AXIS_DATA_WIDTH / block_size
+
+    return DesignResult(
+        point=point,
+        num_limbs=num_limbs,
+        num_pe=(num_limbs + 1) // NUM_PHASES,
+        monpro_cycles=monpro_cycles(num_instructions),
+        modexp_cycles=modexp_cycles,
+        messages_per_second=min(core_rate, stream_rate) * frequency,
+        bound="cores" if core_rate < stream_rate else "stream",
+    )
+
+
+def explore(
+    points: list[DesignPoint],
+    exponent_stats: dict[int, int],
+    block_size: int = 256,
+    frequency: float = CLK_FREQUENCY_HZ,
+    max_workers: int = None,
+) -> list[DesignResult]:
+    """Evaluate every design point in a pool of processes, keeping the order"""
+
+    evaluate = functools.partial(
+        evaluate_design_point,
+        exponent_stats=exponent_stats,
+        block_size=block_size,
+        frequency=frequency,
+    )
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(evaluate, points, chunksize=8))
+
+
+def main():
+    """Run main CLI application"""
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-c", "--cores", nargs="+", type=int, default=list(range(1, 13))
+    )
+    parser.add_argument(
+        "-w", "--limb-width", nargs="+", type=int, default=[8, 16, 24, 32, 64]
+    )
+    parser.add_argument(
+        "-W", "--window-size", nargs="+", type=int, default=[1, 2, 3, 4, 5]
+    )
+    parser.add_argument("-b", "--block-size", default=256, type=int)
+    parser.add_argument("-f", "--frequency", default=CLK_FREQUENCY_HZ, type=float)
+    parser.add_argument("-j", "--jobs", default=None, type=int)
+    parser.add_argument(
+        "-t",
+        "--test-vectors",
+        default=TEST_VECTOR_PATH,
+        help="Directory with the rsa_tests test suites",
+    )
+    parser.add_argument(
+        "-n", "--top", default=20, type=int, help="Number of results to print"
+    )
+    args = parser.parse_args()
+
+    exponent_stats = load_exponent_stats(find_input_files(args.test_vectors))
+    if not exponent_stats:
+        print(f"No test vectors found in {args.test_vectors}")
+        return 1
+
+    points = [
+        DesignPoint(*values)
+        for values in itertools.product(args.cores, args.limb_width, args.window_size)
+    ]
+
+    results = explore(
+        points, exponent_stats, args.block_size, args.frequency, args.jobs
+    )
+    results.sort(key=lambda result: result.messages_per_second, reverse=True)
+
+    print(
+        f"{'cores':>5} {'w':>3} {'window':>6} {'s':>3} {'PE':>3} "
+        f"{'modules':>7} {'monpro':>6} {'modexp':>9} {'msg/s':>10}  bound"
+    )
+    for result in results[: args.top]:
+        point = result.point
+        print(
+            f"{point.num_cores:>5} {point.limb_width:>3} {point.window_size:>6} "
+            f"{result.num_limbs:>3} {result.num_pe:>3} {result.num_modules:>7} "
+            f"{result.monpro_cycles:>6} "
+            f"{result.modexp_cycles:>9.1f} {result.messages_per_second:>10.0f}  "
+            f"{result.bound}"
+        )
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,354 @@
+"""
+This module contains a discrete event simulator of the dispatcher in exponentiation.vhd,
+which hands messages to the modexp cores round robin and releases the results
+in the order of their message tags.
+"""
+
+import sys
+import heapq
+import argparse
+import itertools
+import logging
+from enum import IntEnum
+from dataclasses import dataclass
+
+import numpy as np
+
+from modexp_cycle_model import (
+    AXIS_DATA_WIDTH,
+    CLK_FREQUENCY_HZ,
+    NUM_MONPRO_INSTRUCTIONS,
+    get_num_instructions,
+    get_num_limbs,
+    modexp_cycles,
+)
+from rsa_test_vectors import count_blocks, read_header
+
+logger = logging.getLogger(__name__)
+
+LATENCY_PERCENTILES = (50, 90, 99, 100)
+
+
+class CoreState(IntEnum):
+    """T_CORE_STATE in exponentiation.vhd"""
+
+    READY = 0
+    WORKING = 1
+    DONE = 2
+
+
+class Event(IntEnum):
+    # rsa_msgin has assembled a block
+    INPUT = 0
+    # The result of a core is stored in the core table
+    DONE = 1
+    # The output stream can take a new result
+    OUTPUT = 2
+    # A core is marked as ready again after its result was handed out
+    READY = 3
+
+
+@dataclass
+class Core:
+    state: CoreState = CoreState.READY
+    tag: int = None
+    done_at: int = 0
+    # Clock cycles spent on modexp
+    busy_cycles: int = 0
+    # Clock cycles spent holding a result, waiting for its tag to be released
+    held_cycles: int = 0
+
+
+@dataclass(frozen=True)
+class MessageTiming:
+    tag: int
+    core: int
+    # Clock cycle the block was assembled by rsa_msgin
+    arrival: int
+    # Clock cycle valid_in was set on the core
+    start: int
+    # Clock cycle the result was stored in the core table
+    done: int
+    # Clock cycle the result was accepted by rsa_msgout
+    output: int
+
+    @property
+    def latency(self) -> int:
+        return self.output - self.arrival
+
+
+@dataclass(frozen=True)
+class DispatcherReport:
+    num_messages: int
+    cycles: int
+    frequency: float
+    core_utilization: list[float]
+    # Fraction of the time each core holds a result that is not yet released
+    core_blocked: list[float]
+    max_reorder_occupancy: int
+    # Time weighted mean of the results held in the core table
+    mean_reorder_occupancy: float
+    latency_percentiles: dict[int, float]
+
+    @property
+    def messages_per_second(self) -> float:
+        if self.cycles == 0:
+            return 0.0
+        return self.num_messages / self.cycles * self.frequency
+
+    def __repr__(self):
+        a = "-" * 50 + "\n"
+        b = f"Messages: {self.num_messages}\n"
+        b += f"Clock cycles: {self.cycles}\n"
+        b += f"Throughput: {self.messages_per_second:.0f} messages/s\n"
+        b += "Core utilization: "
+        b += " ".join(f"{utilization:.2f}" for utilization in self.core_utilization)
+        b += "\nCore blocked: "
+        b += " ".join(f"{blocked:.2f}" for blocked in self.core_blocked)
+        b += "\n"
+        b += f"Reorder occupancy: max {self.max_reorder_occupancy}, "
+        b += f"mean {self.mean_reorder_occupancy:.2f}\n"
+        for percentile, latency in self.latency_percentiles.items():
+            b += f"Latency p{percentile}: {latency:.0f} cycles\n"
+        return a + b + a
+
+
+class DispatcherSimulator:
+    """
+    Event driven model of the input, core table and output processes of
+    exponentiation.vhd, fed with the latency of each message.
+
+    Blocks are assembled from 'stream_cycles' chunks by rsa_msgin, starting when the
+    previous block is accepted, and results are sent out in as many chunks by
+    rsa_msgout. Tags are counted without wrapping.
+    """
+
+    def __init__(self, num_cores: int = 7, stream_cycles: int = 8):
+        self.num_cores = num_cores
+        self.stream_cycles = stream_cycles
+
+    def run(self, latencies: list[int]) -> list[MessageTiming]:
+        """Run every message through the dispatcher, returning them in tag order"""
+
+        self.cores = [Core() for _ in range(self.num_cores)]
+        self.occupancy = [(0, 0)]
+
+        self._latencies = latencies
+        self._events = []
+        self._order = itertools.count()
+        self._pending = None
+        self._arrival = 0
+        self._pointer = 0
+        self._tag_counter = 0
+        self._expected_tag = 0
+        self._output_free_at = 0
+        self._timings = {}
+
+        if latencies:
+            self._schedule(self.stream_cycles, Event.INPUT, 0)
+
+        while self._events:
+            time, _, event, value = heapq.heappop(self._events)
+
+            if event == Event.INPUT:
+                self._pending = value
+                self._arrival = time
+                self._dispatch(time)
+            elif event == Event.DONE:
+                core = self.cores[value]
+                core.state = CoreState.DONE
+                core.done_at = time
+                self._update_occupancy(time, 1)
+                self._output(time)
+            elif event == Event.OUTPUT:
+                self._output(time)
+            elif event == Event.READY:
+                self.cores[value].state = CoreState.READY
+                self._dispatch(time)
+
+        return [self._timings[tag] for tag in range(len(latencies))]
+
+    def _schedule(self, time: int, event: Event, value: int = None):
+        heapq.heappush(self._events, (time, next(self._order), event, value))
+
+    def _update_occupancy(self, time: int, change: int):
+        self.occupancy.append((time, self.occupancy[-1][1] + change))
+
+    def _dispatch(self, time: int):
+        """p_input_control: find a free core round robin from the pointer"""
+
+        if self._pending is None:
+            return
+
+        for offset in range(self.num_cores):
+            k = (self._pointer + offset) % self.num_cores
+            core = self.cores[k]
+
+            if core.state != CoreState.READY:
+                continue
+
+            latency = self._latencies[self._pending]
+
+            core.state = CoreState.WORKING
+            core.tag = self._tag_counter
+            core.busy_cycles += latency
+
+            # valid_in_array is registered, and the result is stored in the
+            # core table on the clock edge after valid_out
+            start = time + 1
+            self._timings[core.tag] = (k, self._arrival, start)
+            self._schedule(start + latency + 1, Event.DONE, k)
+
+            self._pointer = (k + 1) % self.num_cores
+            self._tag_counter += 1
+
+            self._pending = None
+            if self._tag_counter < len(self._latencies):
+                self._schedule(
+                    time + self.stream_cycles, Event.INPUT, self._tag_counter
+                )
+            return
+
+    def _output(self, time: int):
+        """p_output: release the result with the expected tag"""
+
+        if time < self._output_free_at:
+            return
+
+        for k, core in enumerate(self.cores):
+            if core.state == CoreState.DONE and core.tag == self._expected_tag:
+                break
+        else:
+            return
+
+        core.held_cycles += time - core.done_at
+        self._update_occupancy(time, -1)
+
+        self._timings[core.tag] = MessageTiming(
+            core.tag, *self._timings[core.tag], done=core.done_at, output=time
+        )
+
+        # The core is not ready for new work before the clock edge after the output
+        core.state = CoreState.WORKING
+        self._schedule(time + 1, Event.READY, k)
+
+        self._expected_tag += 1
+        self._output_free_at = time + self.stream_cycles
+        self._schedule(self._output_free_at, Event.OUTPUT)
+
+    def report(
+        self, timings: list[MessageTiming], frequency: float = CLK_FREQUENCY_HZ
+    ) -> DispatcherReport:
+        """Summarize the last run, which is all zeros if there were no messages"""
+
+        if not timings:
+            return DispatcherReport(
+                num_messages=0,
+                cycles=0,
+                frequency=frequency,
+                core_utilization=[0.0] * self.num_cores,
+                core_blocked=[0.0] * self.num_cores,
+                max_reorder_occupancy=0,
+                mean_reorder_occupancy=0.0,
+                latency_percentiles={p: 0.0 for p in LATENCY_PERCENTILES},
+            )
+
+        cycles = max(timing.output for timing in timings)
+
+        times, occupancy = zip(*self.occupancy, (cycles, 0))
+        durations = np.diff(times)
+
+        latencies = [timing.latency for timing in timings]
+
+        return DispatcherReport(
+            num_messages=len(timings),
+            cycles=cycles,
+            frequency=frequency,
+            core_utilization=[core.busy_cycles / cycles for core in self.cores],
+            core_blocked=[core.held_cycles / cycles for core in self.cores],
+            max_reorder_occupancy=max(occupancy),
+            mean_reorder_occupancy=float(np.dot(durations, occupancy[:-1]) / cycles),
+            latency_percentiles={
+                p: float(np.percentile(latencies, p)) for p in LATENCY_PERCENTILES
+            },
+        )
+
+
+def simulate_dispatcher(
+    latencies: list[int],
+    num_cores: int = 7,
+    stream_cycles: int = 8,
+    frequency: float = CLK_FREQUENCY_HZ,
+) -> DispatcherReport:
+    """Run the messages through the dispatcher and summarize the result"""
+
+    simulator = DispatcherSimulator(num_cores, stream_cycles)
+    return simulator.report(simulator.run(latencies), frequency)
+
+
+def message_latencies(
+    paths,
+    num_instructions: int = NUM_MONPRO_INSTRUCTIONS,
+    interleave: bool = False,
+) -> list[int]:
+    """
+    Latency in clock cycles of every message in the input files,
+    from the exponent in the header of each file
+
+    With interleave the messages of the files are mixed one by one,
+    instead of sending one file after the other.
+    """
+
+    files = []
+    for path in paths:
+        exponent = read_header(path).exponent
+        latency = modexp_cycles(exponent, num_instructions=num_instructions)
+        files.append([latency] * count_blocks(path))
+
+    if not interleave:
+        return list(itertools.chain.from_iterable(files))
+
+    return [
+        latency
+        for latencies in itertools.zip_longest(*files)
+        for latency in latencies
+        if latency is not None
+    ]
+
+
+def main():
+    """Run main CLI application"""
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("files", nargs="+", help="Input message files")
+    parser.add_argument("-c", "--cores", default=7, type=int)
+    parser.add_argument("-w", "--limb-width", default=32, type=int)
+    parser.add_argument("-b", "--block-size", default=256, type=int)
+    parser.add_argument("-f", "--frequency", default=CLK_FREQUENCY_HZ, type=float)
+    parser.add_argument(
+        "-i",
+        "--interleave",
+        action="store_true",
+        help="Mix the messages of the files one by one",
+    )
+    args = parser.parse_args()
+
+    num_instructions = get_num_instructions(
+        get_num_limbs(args.block_size, args.limb_width)
+    )
+    latencies = message_latencies(args.files, num_instructions, args.interleave)
+
+    print(
+        simulate_dispatcher(
+            latencies,
+            args.cores,
+            args.block_size // AXIS_DATA_WIDTH,
+            args.frequency,
+        )
+    )
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
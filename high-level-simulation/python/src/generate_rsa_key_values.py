@@ -1,5 +1,7 @@
 import sys
+import random
 import argparse
+import functools
 import math
 from dataclasses import dataclass
 
@@ -8,7 +10,7 @@ import logging
 logger = logging.getLogger(__name__)
 
 
-@dataclass
+@dataclass(frozen=True)
 class RsaKeyValues:
     n: int
     n_0_prime: int
@@ -28,31 +30,194 @@ class RsaKeyValues:
         return a + b + a
 
 
+@dataclass(frozen=True)
+class RsaKeySet:
+    n: int
+    e: int
+    d: int
+    p: int
+    q: int
+
+    @property
+    def key_size(self) -> int:
+        return self.n.bit_length()
+
+    def __repr__(self):
+        a = "-" * 50 + "\n"
+        b = f"key size: {self.key_size}\n"
+        b += f"n: {hex(self.n)}\n"
+        b += f"e: {hex(self.e)}\n"
+        b += f"d: {hex(self.d)}\n"
+        b += f"p: {hex(self.p)}\n"
+        b += f"q: {hex(self.q)}\n"
+        return a + b + a
+
+
+# Key sizes of the scaling profiles, from the LAB key up to 4096 bits
+KEY_SIZES = (256, 512, 1024, 2048, 3072, 4096)
+
+# Widest limbs of the numpy based models, MAX_WORD_SIZE in montgomery_monpro_cios,
+# and the limb width of the hardware
+DEFAULT_LIMB_WIDTH = 32
+
+# Primes below 1000, and the product of the odd ones to sieve candidates with a gcd
+_SMALL_PRIMES = tuple(
+    x for x in range(2, 1000) if all(x % y for y in range(2, math.isqrt(x) + 1))
+)
+_SMALL_PRIMES_PRODUCT = math.prod(_SMALL_PRIMES[1:])
+
+
 def gcd_extended(a, b):
-    """Method for calculating the extended euclidean algorithm"""
-    # Base Case
-    if a == 0:
-        return b, 0, 1
+    """
+    Method for calculating the extended euclidean algorithm,
+    returns gcd, x and y such that a * x + b * y = gcd
 
-    gcd, x1, y1 = gcd_extended(b % a, a)
+    Iterative, so it does not hit the recursion limit for large keys.
+    """
 
-    # Update x and y using results of recursive
-    # call
-    x = y1 - (b // a) * x1
-    y = x1
+    old_r, r = b, a
+    old_x, x = 0, 1
+    old_y, y = 1, 0
 
-    return gcd, x, y
+    while r != 0:
+        quotient = old_r // r
+        old_r, r = r, old_r - quotient * r
+        old_x, x = x, old_x - quotient * x
+        old_y, y = y, old_y - quotient * y
+
+    return old_r, old_x, old_y
 
 
 def gcd_extended_ensure_positive_x(a, b):
     gcd, x, y = gcd_extended(a, b)
 
     if x < 0:
-        x + b
+        x += b
 
     return gcd, x, y
 
 
+def get_n_0_prime(n: int, word_size: int) -> int:
+    """
+    Get n'_0 = -n⁻¹ mod 2^word_size, the only part of n' used by CIOS
+
+    Uses Newton iteration x = x * (2 - n * x), which doubles the number of correct
+    low bits of n⁻¹ each step, so no full width inverse is needed.
+    """
+
+    assert n % 2 != 0
+
+    bitmask = (1 << word_size) - 1
+
+    # n * n = 1 mod 8 for every odd n, so n is its own inverse in the lowest 3 bits
+    x = n & bitmask
+    correct_bits = 3
+    while correct_bits < word_size:
+        x = (x * (2 - n * x)) & bitmask
+        correct_bits *= 2
+
+    return -x & bitmask
+
+
+def supports_lazy_reduction(n: int, k: int) -> bool:
+    """
+    Check if R = 2^k > 4n, which keeps the monpro results in [0, 2n) without the
+    final subtraction, as long as the inputs are below 2n as well
+    """
+    return 4 * n < (1 << k)
+
+
+def select_limbs(
+    key_size: int, limb_width: int = None, lazy_reduction: bool = False
+) -> tuple[int, int]:
+    """
+    Choose the limb width w and the number of limbs s for a key of 'key_size' bits
+
+    The widest limbs give the fewest limbs, which is the fastest in every limb
+    based model, so w is DEFAULT_LIMB_WIDTH unless it is given. s covers the key,
+    and two more bits with lazy_reduction, so that R = 2^(w * s) > 4n.
+    """
+
+    if limb_width is None:
+        limb_width = DEFAULT_LIMB_WIDTH
+
+    num_bits = key_size + 2 if lazy_reduction else key_size
+
+    return limb_width, -(-num_bits // limb_width)
+
+
+def is_probable_prime(x: int, rng: random.Random = None, rounds: int = 40) -> bool:
+    """Miller-Rabin test of x with 'rounds' random bases, after a sieve of small primes"""
+
+    if x < 1000:
+        return x in _SMALL_PRIMES
+    if math.gcd(x, 2 * _SMALL_PRIMES_PRODUCT) != 1:
+        return False
+
+    if rng is None:
+        rng = random.Random()
+
+    # x - 1 = d * 2^r with d odd
+    d = x - 1
+    r = (d & -d).bit_length() - 1
+    d >>= r
+
+    for _ in range(rounds):
+        y = pow(rng.randrange(2, x - 1), d, x)
+        if y in (1, x - 1):
+            continue
+
+        for _ in range(r - 1):
+            y = y * y % x
+            if y == x - 1:
+                break
+        else:
+            return False
+
+    return True
+
+
+def random_prime(num_bits: int, rng: random.Random = None) -> int:
+    """
+    Get a random prime of 'num_bits' bits, with the two top bits set, so the
+    product of two of them has exactly the sum of their bits
+    """
+
+    if rng is None:
+        rng = random.Random()
+
+    while True:
+        x = rng.getrandbits(num_bits) | (3 << (num_bits - 2)) | 1
+        if is_probable_prime(x, rng):
+            return x
+
+
+def generate_rsa_key_set(
+    key_size: int, e: int = 0x10001, seed: int = None
+) -> RsaKeySet:
+    """
+    Generate a random RSA key of 'key_size' bits, with n = p * q and
+    d = e⁻¹ mod (p - 1)(q - 1), like the LAB key
+
+    The same seed gives the same key, so tests and profiles can be repeated.
+    """
+
+    if key_size < 16:
+        raise ValueError(f"Key size must be at least 16 bits, got {key_size}")
+
+    rng = random.Random(seed)
+
+    while True:
+        p = random_prime(key_size - key_size // 2, rng)
+        q = random_prime(key_size // 2, rng)
+        phi = (p - 1) * (q - 1)
+
+        if p != q and math.gcd(e, phi) == 1:
+            break
+
+    return RsaKeySet(n=p * q, e=e, d=pow(e, -1, phi), p=p, q=q)
+
+
 def hex_to_int(x):
     """Converts a hexadecimal string to an integer."""
     return int(x, 0)
@@ -62,7 +227,9 @@ def main():
     """Run main CLI application"""
 
     parser = argparse.ArgumentParser()
-    parser.add_argument("key-n", type=hex_to_int, help="N - key", metavar="key_n")
+    parser.add_argument(
+        "key-n", type=hex_to_int, help="N - key", metavar="key_n", nargs="?"
+    )
     # parser.add_argument(
     #     "key-e", type=hex_to_int, help="Encryption key", metavar="key_e"
     # )
@@ -74,18 +241,45 @@ def main():
     # )
     parser.add_argument("-w", "--word-size", default=256, type=int)
     parser.add_argument("-s", "--limb-size", default=1, type=int)
+    parser.add_argument(
+        "-g",
+        "--generate",
+        type=int,
+        metavar="KEY_SIZE",
+        help="Generate a random key of this many bits instead of using key_n",
+    )
+    parser.add_argument("--seed", default=None, type=int)
     args = parser.parse_args()
 
-    key_values = get_rsa_key_values(
-        getattr(args, "key-n"), args.word_size, args.limb_size
-    )
+    key_n = getattr(args, "key-n")
+
+    if args.generate:
+        key_set = generate_rsa_key_set(args.generate, seed=args.seed)
+        print(key_set)
+
+        key_n = key_set.n
+        word_size, limb_size = select_limbs(key_set.key_size)
+        print(f"Limbs: {limb_size} x {word_size} bits")
+    elif key_n is None:
+        parser.error("key_n is required unless a key is generated")
+    else:
+        word_size, limb_size = args.word_size, args.limb_size
+
+    key_values = get_rsa_key_values(key_n, word_size, limb_size)
     print(key_values)
+    print(f"n'_0: {hex(get_n_0_prime(key_n, word_size))}")
 
     return 0
 
 
+@functools.lru_cache(maxsize=64)
 def get_rsa_key_values(n, word_size: int, limb_size: int = 1) -> RsaKeyValues:
-    """Get RSA key values that can be pre-calculated"""
+    """
+    Get RSA key values that can be pre-calculated
+
+    The result is cached, since the same key is set up by every test and every
+    message that is encrypted.
+    """
 
     k = word_size * limb_size
 
@@ -97,9 +291,11 @@ def get_rsa_key_values(n, word_size: int, limb_size: int = 1) -> RsaKeyValues:
     assert math.gcd(r, n) == 1
 
     gcd, x, r_inv = gcd_extended_ensure_positive_x(n, r)
-    n_0_prime = r - x
+    n_0_prime = (r - x) % r
+    r_inv %= n
 
     assert (n * n_0_prime + 1) % r == 0
+    assert (r * r_inv) % n == 1
 
     r2_mod_n = (r * r) % n
 
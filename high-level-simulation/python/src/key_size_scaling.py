@@ -0,0 +1,232 @@
+"""
+This module contains a profile of how the latency and memory of the modexp
+backends and the cycle count of the hardware scale with the key size, using a
+random key of each size, as C_BLOCK_SIZE would be set to in exponentiation.vhd.
+"""
+
+import sys
+import math
+import time
+import random
+import argparse
+import functools
+import logging
+import tracemalloc
+from dataclasses import dataclass
+
+from generate_rsa_key_values import (
+    KEY_SIZES,
+    RsaKeySet,
+    generate_rsa_key_set,
+)
+from modexp_backends import BACKENDS, get_backend
+from modexp_cycle_model import (
+    CLK_FREQUENCY_HZ,
+    get_num_instructions,
+    get_num_limbs,
+    modexp_cycles,
+    monpro_cycles,
+    NUM_PHASES,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BACKENDS = ["pow", "montgomery", "cios", "karatsuba"]
+
+
+@dataclass(frozen=True)
+class ScalingResult:
+    name: str
+    key_size: int
+    # Limb width and number of limbs the backend uses for the key,
+    # 0 for the backends without limbs
+    w: int
+    s: int
+    # Seconds per modexp, the fastest of the repeats
+    latency: float
+    # Most memory allocated by python at once during a modexp, from tracemalloc
+    peak_memory: int
+
+    def __repr__(self):
+        a = "-" * 50 + "\n"
+        b = f"Backend: {self.name}\n"
+        b += f"Key size: {self.key_size}"
+        b += f" ({self.s} x {self.w} bits)\n" if self.s else "\n"
+        b += f"Latency: {self.latency * 1e3:.3f} ms\n"
+        b += f"Peak memory: {self.peak_memory / 1024:.1f} KiB\n"
+        return a + b + a
+
+
+@dataclass(frozen=True)
+class HardwareScalingResult:
+    key_size: int
+    limb_width: int
+    # Limbs and alpha/gamma module pairs of the systolic array
+    num_limbs: int
+    num_pe: int
+    monpro_cycles: int
+    modexp_cycles: int
+
+    @property
+    def latency(self) -> float:
+        return self.modexp_cycles / CLK_FREQUENCY_HZ
+
+
+@functools.lru_cache(maxsize=16)
+def get_key_set(key_size: int, seed: int = 4141) -> RsaKeySet:
+    """The random key of a key size, generated once, as 4096-bit keys take seconds"""
+    return generate_rsa_key_set(key_size, seed=seed + key_size)
+
+
+def profile_backend(
+    name: str,
+    key_set: RsaKeySet,
+    private: bool = False,
+    repeat: int = 3,
+    seed: int = 4141,
+) -> ScalingResult:
+    """
+    Time a modexp of a backend with the public exponent, or the private exponent
+    if private is set, and measure its peak memory in a separate run
+    """
+
+    backend = get_backend(name)
+    modexp = backend.modexp
+    e = key_set.d if private else key_set.e
+    M = random.Random(seed).randrange(key_set.n)
+
+    times = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        modexp(M, e, key_set.n)
+        times.append(time.perf_counter() - start_time)
+
+    # Tracing slows python down, so the memory is measured after the timing
+    tracemalloc.start()
+    try:
+        modexp(M, e, key_set.n)
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    w, s = backend.get_limbs(key_set.n.bit_length())
+
+    return ScalingResult(
+        name=name,
+        key_size=key_set.key_size,
+        w=w,
+        s=s,
+        latency=min(times),
+        peak_memory=peak_memory,
+    )
+
+
+def profile_hardware(
+    key_set: RsaKeySet, limb_width: int = 32, private: bool = False
+) -> HardwareScalingResult:
+    """Predict the systolic array and modexp cycles of the key with the cycle model"""
+
+    num_limbs = get_num_limbs(key_set.key_size, limb_width)
+    num_instructions = get_num_instructions(num_limbs)
+
+    return HardwareScalingResult(
+        key_size=key_set.key_size,
+        limb_width=limb_width,
+        num_limbs=num_limbs,
+        num_pe=(num_limbs + 1) // NUM_PHASES,
+        monpro_cycles=monpro_cycles(num_instructions),
+        modexp_cycles=modexp_cycles(
+            key_set.d if private else key_set.e,
+            key_set.key_size,
+            num_instructions=num_instructions,
+        ),
+    )
+
+
+def scaling_exponent(key_sizes: list[int], latencies: list[float]) -> float:
+    """
+    Fit latency = c * key_size^x with least squares in log-log space, and return x
+
+    Schoolbook limb products give 2 for a fixed exponent, and 3 when the exponent
+    grows with the key, like the private exponent.
+    """
+
+    x = [math.log(key_size) for key_size in key_sizes]
+    y = [math.log(latency) for latency in latencies]
+
+    x_mean = sum(x) / len(x)
+    y_mean = sum(y) / len(y)
+
+    covariance = sum((a - x_mean) * (b - y_mean) for a, b in zip(x, y))
+    variance = sum((a - x_mean) ** 2 for a in x)
+
+    return covariance / variance
+
+
+def main():
+    """Run main CLI application"""
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-k", "--key-sizes", nargs="+", type=int, default=list(KEY_SIZES)
+    )
+    parser.add_argument(
+        "-b",
+        "--backends",
+        nargs="+",
+        choices=list(BACKENDS),
+        default=DEFAULT_BACKENDS,
+    )
+    parser.add_argument(
+        "-d",
+        "--private",
+        action="store_true",
+        help="Use the private exponent, which is slow for the limb based backends",
+    )
+    parser.add_argument("-r", "--repeat", default=3, type=int)
+    parser.add_argument("-w", "--limb-width", default=32, type=int)
+    parser.add_argument("--seed", default=4141, type=int)
+    args = parser.parse_args()
+
+    key_sets = [get_key_set(key_size, args.seed) for key_size in args.key_sizes]
+
+    print(f"{'backend':<28} {'bits':>5} {'s':>4} {'latency':>12} {'peak memory':>12}")
+    results = {}
+    for name in args.backends:
+        results[name] = [
+            profile_backend(name, key_set, args.private, args.repeat)
+            for key_set in key_sets
+        ]
+
+        for result in results[name]:
+            print(
+                f"{result.name:<28} {result.key_size:>5} {result.s:>4} "
+                f"{result.latency * 1e3:>9.3f} ms "
+                f"{result.peak_memory / 1024:>8.1f} KiB"
+            )
+
+    if len(key_sets) > 1:
+        for name, backend_results in results.items():
+            exponent = scaling_exponent(
+                [result.key_size for result in backend_results],
+                [result.latency for result in backend_results],
+            )
+            print(f"{name}: latency grows as key size^{exponent:.2f}")
+
+    print(
+        f"{'bits':>5} {'limbs':>5} {'PE':>3} {'monpro':>6} {'modexp':>9} "
+        f"{'latency':>12}"
+    )
+    for key_set in key_sets:
+        hardware = profile_hardware(key_set, args.limb_width, args.private)
+        print(
+            f"{hardware.key_size:>5} {hardware.num_limbs:>5} {hardware.num_pe:>3} "
+            f"{hardware.monpro_cycles:>6} {hardware.modexp_cycles:>9} "
+            f"{hardware.latency * 1e6:>9.1f} us"
+        )
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
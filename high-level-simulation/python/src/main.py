@@ -3,30 +3,20 @@
 import math
 import logging
 import argparse
+import contextlib
 from datetime import datetime
 
+from generate_rsa_key_values import gcd_extended
+from modexp_backends import BACKENDS, get_backend
+from rsa_crt import get_rsa_crt_key_values, crt_decrypt, crt_decrypt_many
+from parallel_modexp import ParallelModexp
+
 
 def eulers_totient_function(a: int, b: int):
     """Calculate the eulers totient function from two integers"""
     return (a - 1) * (b - 1)
 
 
-def gcd_extended(a, b):
-    """Method for calculating the extended euclidean algorithm"""
-    # Base Case
-    if a == 0:
-        return b, 0, 1
-
-    gcd, x1, y1 = gcd_extended(b % a, a)
-
-    # Update x and y using results of recursive
-    # call
-    x = y1 - (b // a) * x1
-    y = x1
-
-    return gcd, x, y
-
-
 def chunk_bytearray(data, n):
     for i in range(0, len(data), n):
         yield data[i : i + n]
@@ -34,7 +24,34 @@ def chunk_bytearray(data, n):
 
 def rsa_calculation(X: int, e: int, n: int):
     """Encrypt/Decrypt using RSA methodology"""
-    return (X**e) % n
+    return pow(X, e, n)
+
+
+def get_block_sizes(n: int) -> tuple[int, int]:
+    """
+    Get the number of bytes in a plaintext and a ciphertext block for modulus n
+
+    A plaintext block is the largest number of whole bytes that is always
+    smaller than n, while a ciphertext block must be able to hold any value below n.
+    """
+
+    return (n.bit_length() - 1) // 8, (n.bit_length() + 7) // 8
+
+
+def _check_block_size(block_size: int, n: int) -> int:
+    """Get the plaintext block size, which can not be larger than the default"""
+
+    plaintext_block_size, _ = get_block_sizes(n)
+    if block_size is None:
+        return plaintext_block_size
+
+    if block_size > plaintext_block_size:
+        raise ValueError(
+            f"Blocks of {block_size} bytes can be larger than n, "
+            f"the largest block size is {plaintext_block_size} bytes"
+        )
+
+    return block_size
 
 
 def encrypt_from_bytearray(
@@ -45,20 +62,28 @@ def encrypt_from_bytearray(
     endianness: str = "little",
     chunk_size=None,
     method=rsa_calculation,
+    method_many=None,
 ):
-    """Use RSA to encrypt a message"""
+    """Use RSA to encrypt a message, one byte at a time"""
 
     if chunk_size is None:
-        chunk_size = int(math.ceil(math.log2(n)))
+        _, chunk_size = get_block_sizes(n)
 
     logging.debug(f"Encrypting message: {message}")
 
-    secret_message = b""
-    for b in message:
-        raw_crypt = method(b, e, n)
-        secret_message += raw_crypt.to_bytes(chunk_size, byteorder=endianness)
+    secret_message = bytearray(len(message) * chunk_size)
+    view = memoryview(secret_message)
+    if method_many is not None:
+        results = method_many(list(message), e, n)
+    else:
+        results = (method(b, e, n) for b in message)
+
+    for i, raw_crypt in enumerate(results):
+        view[i * chunk_size : (i + 1) * chunk_size] = raw_crypt.to_bytes(
+            chunk_size, byteorder=endianness
+        )
 
-    return secret_message
+    return bytes(secret_message)
 
 
 def decrypt_from_bytearray(
@@ -69,23 +94,239 @@ def decrypt_from_bytearray(
     endianness: str = "little",
     chunk_size=None,
     method=rsa_calculation,
+    method_many=None,
 ):
-    """Use RSA to decrypt a message"""
+    """Use RSA to decrypt a message that was encrypted one byte at a time"""
 
     if chunk_size is None:
-        chunk_size = int(math.ceil(math.log2(n)))
+        _, chunk_size = get_block_sizes(n)
 
     logging.debug(f"Decrypting message: {message}")
 
-    recovered_message = b""
-    for chunk in chunk_bytearray(message, chunk_size):
-        b = int.from_bytes(chunk, byteorder=endianness)
-        raw_crypt = method(b, d, n)
-        recovered_message += raw_crypt.to_bytes(1, byteorder=endianness)
+    blocks = [
+        int.from_bytes(chunk, byteorder=endianness)
+        for chunk in chunk_bytearray(message, chunk_size)
+    ]
+
+    if method_many is not None:
+        results = method_many(blocks, d, n)
+    else:
+        results = (method(b, d, n) for b in blocks)
+
+    recovered_message = bytearray(len(blocks))
+    for i, result in enumerate(results):
+        recovered_message[i] = result
+
+    return bytes(recovered_message)
+
+
+def transform_blocks(
+    data,
+    exponent: int,
+    n: int,
+    in_block_size: int,
+    out_block_size: int,
+    *,
+    endianness: str = "little",
+    method=rsa_calculation,
+    method_many=None,
+) -> bytearray:
+    """
+    Run RSA on every 'in_block_size' bytes of data, writing 'out_block_size'
+    bytes per block into a preallocated output buffer
+
+    The last block is zero padded if data is not a multiple of the block size.
+    A ValueError is raised if a block is not smaller than n, like rsa_msgin needs
+    every 256-bit block of a 256-bit key to be.
+    If 'method_many' is given it is called once with all blocks,
+    as method_many(blocks, exponent, n), instead of calling 'method' per block.
+    """
+
+    num_blocks = -(-len(data) // in_block_size)
+
+    view = memoryview(data)
+    output = bytearray(num_blocks * out_block_size)
+    output_view = memoryview(output)
+
+    blocks = [
+        int.from_bytes(
+            view[i * in_block_size : (i + 1) * in_block_size], byteorder=endianness
+        )
+        for i in range(num_blocks)
+    ]
+
+    # A block that is not smaller than n would silently be reduced mod n
+    if blocks and max(blocks) >= n:
+        raise ValueError(f"Block of {in_block_size} bytes is not smaller than n")
+
+    if method_many is not None:
+        results = method_many(blocks, exponent, n)
+    else:
+        results = (method(block, exponent, n) for block in blocks)
+
+    for i, result in enumerate(results):
+        output_view[i * out_block_size : (i + 1) * out_block_size] = result.to_bytes(
+            out_block_size, byteorder=endianness
+        )
+
+    return output
+
+
+def encrypt_blocks(
+    message,
+    e: int,
+    n: int,
+    *,
+    endianness: str = "little",
+    block_size=None,
+    method=rsa_calculation,
+    method_many=None,
+) -> bytearray:
+    """
+    Use RSA to encrypt a message, packing 'block_size' bytes into each RSA block
+
+    By default a block is the largest number of bytes that is always smaller than n,
+    larger blocks raise a ValueError, since they could be reduced mod n.
+    """
+
+    _, ciphertext_block_size = get_block_sizes(n)
+    block_size = _check_block_size(block_size, n)
+
+    logging.debug(f"Encrypting {len(message)} bytes in blocks of {block_size} bytes")
+
+    return transform_blocks(
+        message,
+        e,
+        n,
+        block_size,
+        ciphertext_block_size,
+        endianness=endianness,
+        method=method,
+        method_many=method_many,
+    )
+
+
+def decrypt_blocks(
+    secret_message,
+    d: int,
+    n: int,
+    *,
+    length=None,
+    endianness: str = "little",
+    block_size=None,
+    method=rsa_calculation,
+    method_many=None,
+) -> bytearray:
+    """
+    Use RSA to decrypt a message encrypted with encrypt_blocks
+
+    The zero padding of the last block is removed if the original 'length' is given.
+    """
+
+    _, ciphertext_block_size = get_block_sizes(n)
+    block_size = _check_block_size(block_size, n)
+
+    recovered_message = transform_blocks(
+        secret_message,
+        d,
+        n,
+        ciphertext_block_size,
+        block_size,
+        endianness=endianness,
+        method=method,
+        method_many=method_many,
+    )
+
+    if length is not None:
+        del recovered_message[length:]
 
     return recovered_message
 
 
+def _read_full(source, view: memoryview) -> int:
+    """
+    Read into 'view' until it is full or the source is exhausted, since readinto
+    may return fewer bytes than requested, e.g. from a pipe or a raw stream
+    """
+
+    size = 0
+    while size < len(view):
+        num_read = source.readinto(view[size:])
+        if not num_read:
+            break
+        size += num_read
+
+    return size
+
+
+def stream_blocks(
+    source,
+    sink,
+    exponent: int,
+    n: int,
+    in_block_size: int,
+    out_block_size: int,
+    *,
+    blocks_per_read: int = 1024,
+    endianness: str = "little",
+    method=rsa_calculation,
+    method_many=None,
+) -> int:
+    """
+    Run RSA on a binary stream, reading 'blocks_per_read' blocks at a time into a
+    reused buffer, and writing the result to 'sink'
+
+    Returns the number of bytes read from 'source'.
+    """
+
+    buffer = bytearray(blocks_per_read * in_block_size)
+    view = memoryview(buffer)
+    num_bytes = 0
+
+    while True:
+        size = _read_full(source, view)
+        if not size:
+            break
+
+        num_bytes += size
+        sink.write(
+            transform_blocks(
+                view[:size],
+                exponent,
+                n,
+                in_block_size,
+                out_block_size,
+                endianness=endianness,
+                method=method,
+                method_many=method_many,
+            )
+        )
+
+    return num_bytes
+
+
+def encrypt_stream(source, sink, e: int, n: int, *, block_size=None, **kwargs) -> int:
+    """Use RSA to encrypt a binary stream block by block, see stream_blocks"""
+
+    _, ciphertext_block_size = get_block_sizes(n)
+    block_size = _check_block_size(block_size, n)
+
+    return stream_blocks(
+        source, sink, e, n, block_size, ciphertext_block_size, **kwargs
+    )
+
+
+def decrypt_stream(source, sink, d: int, n: int, *, block_size=None, **kwargs) -> int:
+    """Use RSA to decrypt a binary stream encrypted with encrypt_stream"""
+
+    _, ciphertext_block_size = get_block_sizes(n)
+    block_size = _check_block_size(block_size, n)
+
+    return stream_blocks(
+        source, sink, d, n, ciphertext_block_size, block_size, **kwargs
+    )
+
+
 def calculate_rsa_keypair(p, q):
     """Find a valid e and q that can be used as keypairs"""
     n = p * q
@@ -110,24 +351,81 @@ def calculate_rsa_keypair(p, q):
     return n, e, d
 
 
-def main(p, q, num_bits, message, calculation_method):
-    """Run main procedure"""
+def main(p, q, num_bits, message, backend_name="pow", use_crt=False, num_workers=None):
+    """
+    Run main procedure
+
+    With num_workers the blocks are split over a pool of processes.
+    """
 
     n, e, d = calculate_rsa_keypair(p, q)
 
+    # Backends that support batching get every block of the message at once
+    backend = get_backend(backend_name)
+    calculation_method = decryption_method = backend.modexp
+    calculation_method_many = decryption_method_many = backend.modexp_many
+
+    if use_crt:
+        # p and q are known, so decryption can be split into two half size modexps,
+        # which run on the selected backend
+        crt_key_values = get_rsa_crt_key_values(p, q, d)
+
+        def crt_modexp(M: int, e: int, n: int, key_values):
+            return backend.modexp(M, e, n)
+
+        def decryption_method(X: int, d: int, n: int):
+            return crt_decrypt(X, crt_key_values, modexp=crt_modexp)
+
+        decryption_method_many = None
+        if backend.supports_batching:
+
+            def decryption_method_many(blocks: list[int], d: int, n: int):
+                return crt_decrypt_many(
+                    blocks, crt_key_values, method_many=backend.modexp_many
+                )
+
     # Print the relevant values calculated
     print(f"p: {p}", f"q: {q}", f"n: {n}", f"e: {e}", f"d: {d}")
 
     logging.info(f"Original message: {message}")
 
-    start_time = datetime.now()
-    secret_message = encrypt_from_bytearray(
-        message, e, n, chunk_size=num_bits, method=calculation_method
-    )
-    recovered_message = decrypt_from_bytearray(
-        secret_message, d, n, chunk_size=num_bits, method=calculation_method
-    )
-    stop_time = datetime.now()
+    block_size = None if num_bits is None else num_bits // 8
+
+    with contextlib.ExitStack() as stack:
+        if num_workers is not None:
+            calculation_method_many = stack.enter_context(
+                ParallelModexp(n, backend_name, num_workers=num_workers)
+            )
+            decryption_method_many = calculation_method_many
+            if use_crt:
+                decryption_method_many = stack.enter_context(
+                    ParallelModexp(
+                        n,
+                        backend_name,
+                        num_workers=num_workers,
+                        crt_key_values=crt_key_values,
+                    )
+                )
+
+        start_time = datetime.now()
+        secret_message = encrypt_blocks(
+            message,
+            e,
+            n,
+            block_size=block_size,
+            method=calculation_method,
+            method_many=calculation_method_many,
+        )
+        recovered_message = decrypt_blocks(
+            secret_message,
+            d,
+            n,
+            length=len(message),
+            block_size=block_size,
+            method=decryption_method,
+            method_many=decryption_method_many,
+        )
+        stop_time = datetime.now()
     assert message == recovered_message
 
     logging.debug(f"Secret message {secret_message}")
@@ -151,7 +449,33 @@ if __name__ == "__main__":
         help="The message to be encrypted and decrypted",
         default="Hey, how are you doing this lovely evening?",
     )
-    parser.add_argument("-k", "--num-bits", type=int, default=256)
+    parser.add_argument(
+        "-k",
+        "--num-bits",
+        type=int,
+        default=None,
+        help="Bits in each plaintext block, by default the largest block below n",
+    )
+    parser.add_argument(
+        "-b",
+        "--backend",
+        choices=list(BACKENDS),
+        default="pow",
+        help="Modular exponentiation implementation to use",
+    )
+    parser.add_argument(
+        "-c",
+        "--crt",
+        action="store_true",
+        help="Decrypt using the chinese remainder theorem",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=None,
+        help="Number of processes to split the blocks over",
+    )
     args = parser.parse_args()
 
     logging.basicConfig(level=logging.INFO)
@@ -161,5 +485,7 @@ if __name__ == "__main__":
         args.q,
         args.num_bits,
         bytes(args.message, encoding="ASCII"),
-        rsa_calculation,
+        args.backend,
+        args.crt,
+        args.jobs,
     )
@@ -0,0 +1,312 @@
+"""
+This module contains a registry of the modular exponentiation implementations,
+so they can be selected by name and compared against each other.
+"""
+
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable
+
+from generate_rsa_key_values import get_rsa_key_values, select_limbs
+from modexp_cycle_model import LIMB_WIDTH
+from montgomery import (
+    montgomery_modexp,
+    montgomery_modexp_constant_time,
+    montgomery_modexp_window,
+)
+from montgomery_monpro_cios import (
+    get_montgomery_context,
+    montgomery_modexp as montgomery_modexp_cios,
+    montgomery_modexp_constant_time as montgomery_modexp_constant_time_cios,
+)
+from montgomery_monpro_cios_systolic_array import (
+    montgomery_modexp as montgomery_modexp_cios_systolic_array,
+)
+from montgomery_monpro_karatsuba import (
+    montgomery_modexp as montgomery_modexp_karatsuba,
+)
+from montgomery_modexp_many import modexp_many
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ModexpBackend:
+    """A named implementation of X = M^e mod n"""
+
+    name: str
+    # Called as modexp(M, e, n) for a single message
+    modexp: Callable[[int, int, int], int]
+    # Called as modexp_many(messages, e, n) for a batch of messages sharing e and n
+    modexp_many: Callable[[list[int], int, int], list[int]] = None
+    description: str = ""
+    # Called as limbs(bit_length) for the (w, s) used for an n of 'bit_length' bits,
+    # None for the backends that do not work on limbs
+    limbs: Callable[[int], tuple[int, int]] = None
+
+    @property
+    def supports_batching(self) -> bool:
+        return self.modexp_many is not None
+
+    def get_limbs(self, bit_length: int) -> tuple[int, int]:
+        """The (w, s) used for an n of 'bit_length' bits, (0, 0) without limbs"""
+
+        if self.limbs is None:
+            return 0, 0
+
+        return self.limbs(bit_length)
+
+
+BACKENDS: dict[str, ModexpBackend] = {}
+
+
+def register_backend(backend: ModexpBackend) -> ModexpBackend:
+    """Add a backend to the registry"""
+
+    if backend.name in BACKENDS:
+        raise ValueError(f"Backend '{backend.name}' is already registered")
+
+    BACKENDS[backend.name] = backend
+
+    return backend
+
+
+def get_backend(name: str) -> ModexpBackend:
+    """Get a backend from the registry by name"""
+
+    if name not in BACKENDS:
+        raise ValueError(
+            f"Unknown backend '{name}', valid backends are: {', '.join(BACKENDS)}"
+        )
+
+    return BACKENDS[name]
+
+
+def run_backend(backend: ModexpBackend, messages, e: int, n: int) -> list[int]:
+    """Run a backend on a list of messages, using batching if it is supported"""
+
+    messages = list(messages)
+
+    if backend.supports_batching:
+        return backend.modexp_many(messages, e, n)
+
+    return [backend.modexp(M, e, n) for M in messages]
+
+
+def benchmark_backend(backend: ModexpBackend, messages, e: int, n: int) -> float:
+    """Measure the number of messages per second of a backend"""
+
+    messages = list(messages)
+
+    start_time = datetime.now()
+    run_backend(backend, messages, e, n)
+    stop_time = datetime.now()
+
+    seconds = (stop_time - start_time).total_seconds()
+    logger.info(f"{backend.name}: {len(messages)} messages in {seconds} s")
+
+    return len(messages) / seconds if seconds > 0 else float("inf")
+
+
+def _limbs(bit_length: int) -> tuple[int, int]:
+    """Limbs of the limb based backends, using the hardware limb width"""
+    return select_limbs(bit_length, LIMB_WIDTH)
+
+
+def _lazy_limbs(bit_length: int) -> tuple[int, int]:
+    return select_limbs(bit_length, LIMB_WIDTH, lazy_reduction=True)
+
+
+def _limb_context(n: int):
+    """Context of the limb based backends, using the hardware limb width"""
+    return get_montgomery_context(n, *_limbs(n.bit_length()))
+
+
+def _montgomery(M: int, e: int, n: int) -> int:
+    key_values = get_rsa_key_values(n, n.bit_length())
+    return montgomery_modexp(M, e, n, key_values, skip_leading_zeros=True)
+
+
+def _montgomery_window(M: int, e: int, n: int) -> int:
+    key_values = get_rsa_key_values(n, n.bit_length())
+    return montgomery_modexp_window(M, e, n, key_values)
+
+
+def _montgomery_lazy(M: int, e: int, n: int) -> int:
+    # Two more bits of R than n, so R > 4n
+    key_values = get_rsa_key_values(n, n.bit_length() + 2)
+    return montgomery_modexp(
+        M, e, n, key_values, skip_leading_zeros=True, lazy_reduction=True
+    )
+
+
+def _montgomery_ladder(M: int, e: int, n: int) -> int:
+    key_values = get_rsa_key_values(n, n.bit_length())
+    return montgomery_modexp_constant_time(M, e, n, key_values, mode="ladder")
+
+
+def _montgomery_always_multiply(M: int, e: int, n: int) -> int:
+    key_values = get_rsa_key_values(n, n.bit_length())
+    return montgomery_modexp_constant_time(M, e, n, key_values, mode="always_multiply")
+
+
+def _cios(M: int, e: int, n: int) -> int:
+    context = _limb_context(n)
+    return montgomery_modexp_cios(
+        M, e, n, context.w, context.s, skip_leading_zeros=True, context=context
+    )
+
+
+def _cios_lazy(M: int, e: int, n: int) -> int:
+    context = get_montgomery_context(n, *_lazy_limbs(n.bit_length()))
+    return montgomery_modexp_cios(
+        M,
+        e,
+        n,
+        context.w,
+        context.s,
+        skip_leading_zeros=True,
+        context=context,
+        lazy_reduction=True,
+    )
+
+
+def _cios_systolic_array(M: int, e: int, n: int) -> int:
+    context = _limb_context(n)
+    return montgomery_modexp_cios_systolic_array(
+        M, e, n, context.w, context.s, skip_leading_zeros=True, context=context
+    )
+
+
+def _cios_ladder(M: int, e: int, n: int) -> int:
+    w, s = _limbs(n.bit_length())
+    return montgomery_modexp_constant_time_cios(M, e, n, w, s)
+
+
+def _karatsuba(M: int, e: int, n: int) -> int:
+    w, s = _limbs(n.bit_length())
+    return montgomery_modexp_karatsuba(M, e, n, w, s, skip_leading_zeros=True)
+
+
+def _cios_batched_many(messages: list[int], e: int, n: int) -> list[int]:
+    return modexp_many(
+        messages,
+        e,
+        _limb_context(n).key_values,
+        backend="cios_batched",
+        skip_leading_zeros=True,
+    )
+
+
+def _cios_batched(M: int, e: int, n: int) -> int:
+    return _cios_batched_many([M], e, n)[0]
+
+
+register_backend(
+    ModexpBackend(
+        name="pow",
+        modexp=pow,
+        modexp_many=lambda messages, e, n: [pow(M, e, n) for M in messages],
+        description="Python builtin pow",
+    )
+)
+register_backend(
+    ModexpBackend(
+        name="montgomery",
+        modexp=_montgomery,
+        description="montgomery.montgomery_modexp",
+    )
+)
+register_backend(
+    ModexpBackend(
+        name="montgomery_window",
+        modexp=_montgomery_window,
+        description="montgomery.montgomery_modexp_window",
+    )
+)
+register_backend(
+    ModexpBackend(
+        name="montgomery_lazy",
+        modexp=_montgomery_lazy,
+        description="montgomery.montgomery_modexp with lazy reduction",
+    )
+)
+register_backend(
+    ModexpBackend(
+        name="montgomery_ladder",
+        modexp=_montgomery_ladder,
+        description="montgomery.montgomery_modexp_constant_time with the ladder",
+    )
+)
+register_backend(
+    ModexpBackend(
+        name="montgomery_always_multiply",
+        modexp=_montgomery_always_multiply,
+        description="montgomery.montgomery_modexp_constant_time always multiplying",
+    )
+)
+register_backend(
+    ModexpBackend(
+        name="cios",
+        modexp=_cios,
+        description="montgomery_monpro_cios.montgomery_modexp",
+        limbs=_limbs,
+    )
+)
+register_backend(
+    ModexpBackend(
+        name="cios_lazy",
+        modexp=_cios_lazy,
+        description="montgomery_monpro_cios.montgomery_modexp with lazy reduction",
+        limbs=_lazy_limbs,
+    )
+)
+register_backend(
+    ModexpBackend(
+        name="cios_systolic_array",
+        modexp=_cios_systolic_array,
+        description="montgomery_monpro_cios_systolic_array.montgomery_modexp",
+        limbs=_limbs,
+    )
+)
+register_backend(
+    ModexpBackend(
+        name="cios_ladder",
+        modexp=_cios_ladder,
+        description="montgomery_monpro_cios.montgomery_modexp_constant_time",
+        limbs=_limbs,
+    )
+)
+register_backend(
+    ModexpBackend(
+        name="karatsuba",
+        modexp=_karatsuba,
+        description="montgomery_monpro_karatsuba.montgomery_modexp",
+        limbs=_limbs,
+    )
+)
+register_backend(
+    ModexpBackend(
+        name="cios_batched",
+        modexp=_cios_batched,
+        modexp_many=_cios_batched_many,
+        description="montgomery_modexp_many.modexp_many using batched CIOS",
+        limbs=_limbs,
+    )
+)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    n = 0x99925173AD65686715385EA800CD28120288FC70A9BC98DD4C90D676F8FF768D
+    e = 0x0000000000000000000000000000000000000000000000000000000000010001
+
+    messages = [
+        0x0000000011111111222222223333333344444444555555556666666677777777 + i
+        for i in range(16)
+    ]
+
+    for backend in BACKENDS.values():
+        print(f"{backend.name}: {benchmark_backend(backend, messages, e, n):.1f} msg/s")
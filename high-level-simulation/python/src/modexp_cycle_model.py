@@ -0,0 +1,247 @@
+"""
+This module contains a cycle count model of the montgomery_modexp2 hardware core,
+so the latency of the FPGA implementation can be predicted from python.
+"""
+
+import sys
+import math
+import argparse
+
+from modexp_schedule import (
+    ModexpOp,
+    binary_schedule,
+    constant_time_monpro_count,
+    count_operations,
+    lazy_reduction_count,
+    count_skipped_squarings,
+    window_monpro_count,
+)
+
+# Clock cycles used by montgomery_modexp2 around each monpro:
+# - the state that sets the operands and asserts monpro_in_valid
+# - ST_CHECK_RESULT in the systolic array, doing the final subtraction
+# - ST_WAIT_FOR_MONPRO capturing the result
+MONPRO_HANDSHAKE_CYCLES = 3
+
+# CLK_FREQUENCY_HZ in the cocotb testbenches
+CLK_FREQUENCY_HZ = 100e6
+
+# C_S_AXIS_TDATA_WIDTH of rsa_msgin and rsa_msgout, a block is sent in 32-bit chunks
+AXIS_DATA_WIDTH = 32
+
+# Clock cycles a core is held by exponentiation.vhd around each modexp:
+# - registering the inputs and setting valid_in of the chosen core
+# - storing the result in the core table when valid_out is set
+# - handing the result out before the core is marked as ready again
+DISPATCH_CYCLES = 3
+
+# ST_IDLE loads message and key, and finds the index of the leftmost one
+MODEXP_LOAD_CYCLES = 1
+
+# M_bar = monpro(M, r² mod n), C_bar = monpro(1, r² mod n) and monpro(C_bar, 1)
+NUM_CONVERSION_MONPROS = 3
+
+
+# Hardware parameters of the python models, C_DATA_WIDTH and C_LIMB_WIDTH in
+# montgomery_pkg.vhd. generate_instruction_set.py has the same defaults, which is
+# checked by test_generator_matches_cycle_model
+BLOCK_SIZE = 256
+LIMB_WIDTH = 32
+
+# An alpha result is used by gamma one clock cycle later, and the gamma result is
+# used by the alpha handling the next limb one clock cycle after that, so each
+# processing element handles the limbs of three consecutive clock cycles
+NUM_PHASES = 3
+
+
+def get_num_pe(num_limbs: int) -> int:
+    """
+    Number of alpha (and gamma) modules needed for 'num_limbs' limbs
+
+    The alpha modules handle limb 0 to num_limbs, where the last position adds
+    the carry to the most significant word of the intermediate result.
+    """
+
+    return -(-(num_limbs + 1) // NUM_PHASES)
+
+
+def get_num_limbs(block_size: int = BLOCK_SIZE, limb_width: int = LIMB_WIDTH) -> int:
+    """
+    Number of limbs the systolic array works on for a block size and limb width
+
+    The instruction schedule needs 3 * PE - 1 limbs, so the block is zero padded
+    up to that, see generate_instruction_set.py.
+    """
+
+    return NUM_PHASES * get_num_pe(-(-block_size // limb_width)) - 1
+
+
+def get_num_instructions(num_limbs: int) -> int:
+    """
+    Number of instructions, and clock cycles in ST_CALC, for one monpro
+
+    The first word of the result is ready NUM_PHASES * num_limbs clock cycles
+    after the start, and the num_limbs + 1 words of the result are captured
+    one per clock cycle after that.
+    """
+
+    return NUM_PHASES * num_limbs + num_limbs + 1
+
+
+# C_NUMBER_OF_INSTRUCTIONS in instruction_pkg.vhd, the instruction at index 0
+# is executed in the same clock cycle as the inputs are loaded into the systolic array
+NUM_MONPRO_INSTRUCTIONS = get_num_instructions(get_num_limbs())
+
+
+def monpro_cycles(num_instructions: int = NUM_MONPRO_INSTRUCTIONS) -> int:
+    """Clock cycles between two monpro operations issued by montgomery_modexp2"""
+    return num_instructions + MONPRO_HANDSHAKE_CYCLES
+
+
+def modexp_cycles(
+    e: int,
+    width: int = 256,
+    skip_leading_zeros: bool = True,
+    num_instructions: int = NUM_MONPRO_INSTRUCTIONS,
+) -> int:
+    """
+    Estimate the number of clock cycles from valid_in to valid_out of montgomery_modexp2
+
+    The hardware starts at the leftmost one of the key, which is what
+    skip_leading_zeros=True models. Without it the estimate is for a core that
+    squares through every bit of the zero-padded key, like montgomery_modexp does.
+    """
+
+    counts = count_operations(binary_schedule(e, width, skip_leading_zeros))
+    num_monpros = (
+        NUM_CONVERSION_MONPROS + counts[ModexpOp.SQUARE] + counts[ModexpOp.MULTIPLY]
+    )
+
+    return MODEXP_LOAD_CYCLES + num_monpros * monpro_cycles(num_instructions)
+
+
+def window_modexp_cycles(
+    e: int,
+    window_size: int,
+    num_instructions: int = NUM_MONPRO_INSTRUCTIONS,
+    mode: str = "sliding",
+) -> int:
+    """
+    Estimate the clock cycles of a modexp core using a window of 'window_size' bits
+
+    A window size of 1 is the binary method of montgomery_modexp2. Bigger windows
+    add the monpros that fill the table of odd powers of M_bar, but the cycles to
+    read the table are not modelled.
+    """
+
+    if window_size == 1:
+        return modexp_cycles(e, num_instructions=num_instructions)
+
+    num_monpros = window_monpro_count(e, window_size, mode)["total"]
+
+    return MODEXP_LOAD_CYCLES + num_monpros * monpro_cycles(num_instructions)
+
+
+def constant_time_modexp_cycles(
+    width: int = 256,
+    num_instructions: int = NUM_MONPRO_INSTRUCTIONS,
+    mode: str = "ladder",
+) -> int:
+    """
+    Estimate the clock cycles of a modexp core that does a squaring and a
+    multiplication for every bit of the key, which is the same for every key
+
+    The final subtraction in ST_CHECK_RESULT already takes the same number of
+    cycles whether it is needed or not, so only the schedule has to change.
+    """
+
+    num_monpros = constant_time_monpro_count(width, mode)["total"]
+
+    return MODEXP_LOAD_CYCLES + num_monpros * monpro_cycles(num_instructions)
+
+
+def lazy_modexp_cycles(e: int, width: int = 256, limb_width: int = 32) -> int:
+    """
+    Estimate the clock cycles of a modexp core using lazy reduction
+
+    Only the conversion out of the montgomery domain goes through ST_CHECK_RESULT,
+    but R > 4n needs two more bits, so the systolic array works on the limbs
+    of width + 2 bits, with a longer instruction schedule.
+    """
+
+    num_instructions = get_num_instructions(get_num_limbs(width + 2, limb_width))
+    counts = lazy_reduction_count(e, width, skip_leading_zeros=True)
+
+    return (
+        MODEXP_LOAD_CYCLES
+        + counts["compares"] * (monpro_cycles(num_instructions) - 1)
+        + counts["lazy_compares"]
+    )
+
+
+def resource_bound_monpro_cycles(
+    multiplications: float,
+    reads: float,
+    writes: float,
+    num_multipliers: int,
+    read_ports: int = 2,
+    write_ports: int = 1,
+) -> tuple[int, str]:
+    """
+    Lower bound of the clock cycles of a monpro on a datapath limited by its resources
+
+    Every multiplier does one w x w product per cycle, and the word memory serves
+    'read_ports' reads and 'write_ports' writes per cycle, so the monpro takes at
+    least as long as its busiest resource. Dependencies between the operations are
+    not modelled. Returns the cycles with the handshake, and the bounding resource.
+    """
+
+    bounds = {
+        "multiplier": math.ceil(multiplications / num_multipliers),
+        "read": math.ceil(reads / read_ports),
+        "write": math.ceil(writes / write_ports),
+    }
+    bound = max(bounds, key=bounds.get)
+
+    return bounds[bound] + MONPRO_HANDSHAKE_CYCLES, bound
+
+
+def skipped_cycles(
+    e: int, width: int = 256, num_instructions: int = NUM_MONPRO_INSTRUCTIONS
+) -> int:
+    """Clock cycles saved by starting at the most significant set bit of e"""
+    return count_skipped_squarings(e, width) * monpro_cycles(num_instructions)
+
+
+def hex_to_int(x):
+    """Converts a hexadecimal string to an integer."""
+    return int(x, 16)
+
+
+def main():
+    """Run main CLI application"""
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("key", type=hex_to_int, help="Exponent e or d in hex")
+    parser.add_argument("-k", "--block-size", default=256, type=int)
+    parser.add_argument("-f", "--frequency", default=100e6, type=float)
+    parser.add_argument(
+        "--no-skip",
+        action="store_true",
+        help="Square through the leading zeros of the key",
+    )
+    args = parser.parse_args()
+
+    cycles = modexp_cycles(args.key, args.block_size, not args.no_skip)
+
+    if not args.no_skip:
+        skipped = count_skipped_squarings(args.key, args.block_size)
+        print(f"Skipped squarings: {skipped}")
+    print(f"Clock cycles per modexp: {cycles}")
+    print(f"Time per modexp: {cycles / args.frequency * 1e6:.3f} us")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,303 @@
+"""
+This module contains code to turn an exponent into a schedule of montgomery
+products, so the exponent only has to be parsed once per key.
+"""
+
+from enum import IntEnum
+
+
+class ModexpOp(IntEnum):
+    SQUARE = 0
+    MULTIPLY = 1
+
+
+class MonproKind(IntEnum):
+    """The state of montgomery_modexp2 a monpro belongs to"""
+
+    # ST_M_TO_MONTGOMERY and ST_C_TO_MONTGOMERY, monpro(x, r² mod n)
+    TO_MONTGOMERY = 0
+    # ST_C_SQUARED, monpro(C_bar, C_bar)
+    SQUARE = 1
+    # ST_M_TIMES_C, monpro(M_bar, C_bar)
+    MULTIPLY = 2
+    # ST_RETURN, monpro(C_bar, 1)
+    FROM_MONTGOMERY = 3
+
+
+# Called with the kind of the monpros that follow, see set_monpro_kind
+_monpro_kind_hook = None
+
+
+def set_monpro_kind_hook(hook):
+    """Set the function called by set_monpro_kind, or None to remove it"""
+    global _monpro_kind_hook
+    _monpro_kind_hook = hook
+
+
+def set_monpro_kind(kind: MonproKind | None):
+    """
+    Tell the profiler which state of the modexp the monpros that follow belong to,
+    the operands alone can not tell them apart. The modexp loops set it back to
+    None when they return.
+    """
+
+    if _monpro_kind_hook is not None:
+        _monpro_kind_hook(kind)
+
+
+def binary_schedule(
+    e: int, width: int, skip_leading_zeros: bool = False
+) -> list[tuple[ModexpOp, int]]:
+    """
+    Create the left-to-right binary schedule used by montgomery_modexp
+
+    Every bit of e zero-padded to 'width' bits gives a squaring of C_bar,
+    followed by a multiplication with M_bar if the bit is set.
+    With skip_leading_zeros the schedule starts at the most significant set bit,
+    like the hardware does using the index of the leftmost one.
+
+    Each step is an (operation, power) tuple, where power is the power of M_bar
+    to multiply with. This is always 1 for the binary method.
+    """
+
+    schedule = []
+
+    binary_e = f"{e:b}" if skip_leading_zeros else f"{e:b}".zfill(width)
+    for bit in binary_e:
+        schedule.append((ModexpOp.SQUARE, 0))
+        if bit == "1":
+            schedule.append((ModexpOp.MULTIPLY, 1))
+
+    return schedule
+
+
+def count_operations(schedule: list[tuple[ModexpOp, int]]) -> dict[ModexpOp, int]:
+    """Count how many squarings and multiplications a schedule performs"""
+
+    counts = {op: 0 for op in ModexpOp}
+    for op, _ in schedule:
+        counts[op] += 1
+
+    return counts
+
+
+def count_skipped_squarings(e: int, width: int) -> int:
+    """Count the squarings saved by starting at the most significant set bit of e"""
+    return max(width - max(e.bit_length(), 1), 0)
+
+
+def select_window_size(bit_length: int) -> int:
+    """
+    Select the window size from the bit length of the exponent
+
+    The thresholds are where a bigger odd-power table starts to pay off
+    compared to the multiplications it saves.
+    """
+
+    if bit_length > 671:
+        return 6
+    if bit_length > 239:
+        return 5
+    if bit_length > 79:
+        return 4
+    if bit_length > 23:
+        return 3
+    if bit_length > 1:
+        return 2
+    return 1
+
+
+def _strip_leading_squarings(schedule):
+    """Squaring C_bar before the first multiplication is squaring one"""
+
+    while schedule and schedule[0][0] == ModexpOp.SQUARE:
+        schedule.pop(0)
+
+    return schedule
+
+
+def sliding_window_schedule(e: int, window_size: int) -> list[tuple[ModexpOp, int]]:
+    """
+    Create a sliding window schedule for exponent e
+
+    The exponent is scanned from the most significant bit, zeros are handled with
+    a single squaring, while a window of up to 'window_size' bits ending in a one
+    gives a squaring per bit followed by a multiplication with an odd power of M_bar.
+
+    The schedule starts with a multiplication, which loads the first odd power.
+    """
+
+    bits = f"{e:b}"
+    schedule = []
+
+    i = 0
+    while i < len(bits):
+        if bits[i] == "0":
+            schedule.append((ModexpOp.SQUARE, 0))
+            i += 1
+            continue
+
+        # Find the longest window that ends with a one
+        j = min(i + window_size, len(bits))
+        while bits[j - 1] == "0":
+            j -= 1
+
+        schedule.extend([(ModexpOp.SQUARE, 0)] * (j - i))
+        schedule.append((ModexpOp.MULTIPLY, int(bits[i:j], 2)))
+        i = j
+
+    return _strip_leading_squarings(schedule)
+
+
+def fixed_window_schedule(e: int, window_size: int) -> list[tuple[ModexpOp, int]]:
+    """
+    Create a fixed window (k-ary) schedule for exponent e
+
+    The exponent is split into digits of 'window_size' bits. Trailing zeros of a
+    digit are moved after the multiplication, so only odd powers of M_bar are needed.
+
+    The schedule starts with a multiplication, which loads the first odd power.
+    """
+
+    num_digits = -(-max(e.bit_length(), 1) // window_size)
+    bits = f"{e:b}".zfill(num_digits * window_size)
+    schedule = []
+
+    for i in range(0, len(bits), window_size):
+        digit = int(bits[i : i + window_size], 2)
+
+        if digit == 0:
+            schedule.extend([(ModexpOp.SQUARE, 0)] * window_size)
+            continue
+
+        trailing_zeros = (digit & -digit).bit_length() - 1
+
+        schedule.extend([(ModexpOp.SQUARE, 0)] * (window_size - trailing_zeros))
+        schedule.append((ModexpOp.MULTIPLY, digit >> trailing_zeros))
+        schedule.extend([(ModexpOp.SQUARE, 0)] * trailing_zeros)
+
+    return _strip_leading_squarings(schedule)
+
+
+def window_schedule(
+    e: int, window_size: int = None, mode: str = "sliding"
+) -> list[tuple[ModexpOp, int]]:
+    """Create a window schedule, choosing the window size from e if not given"""
+
+    if window_size is None:
+        window_size = select_window_size(e.bit_length())
+
+    if mode == "sliding":
+        return sliding_window_schedule(e, window_size)
+    if mode == "fixed":
+        return fixed_window_schedule(e, window_size)
+
+    raise ValueError(f"Unknown window mode '{mode}', valid modes are: sliding, fixed")
+
+
+def binary_monpro_count(
+    e: int, width: int, skip_leading_zeros: bool = False
+) -> dict[str, int]:
+    """Count the montgomery products used by the binary montgomery_modexp"""
+
+    counts = count_operations(binary_schedule(e, width, skip_leading_zeros))
+
+    return {
+        "table": 0,
+        "squarings": counts[ModexpOp.SQUARE],
+        "multiplications": counts[ModexpOp.MULTIPLY],
+        # M_bar, C_bar and the final conversion out of the montgomery domain
+        "conversions": 3,
+        "total": counts[ModexpOp.SQUARE] + counts[ModexpOp.MULTIPLY] + 3,
+    }
+
+
+def lazy_reduction_count(
+    e: int, width: int, skip_leading_zeros: bool = False
+) -> dict[str, int]:
+    """
+    Count the final subtraction compares of the binary montgomery_modexp, with
+    every monpro reduced and with lazy reduction, where only monpro(C_bar, 1) is
+    """
+
+    total = binary_monpro_count(e, width, skip_leading_zeros)["total"]
+
+    return {
+        "compares": total,
+        "lazy_compares": 1,
+        "eliminated": total - 1,
+    }
+
+
+# Modexp modes that perform the same montgomery products for every exponent
+CONSTANT_TIME_MODES = ("ladder", "always_multiply")
+
+
+def check_constant_time_mode(mode: str):
+    if mode not in CONSTANT_TIME_MODES:
+        raise ValueError(
+            f"Unknown constant time mode '{mode}', "
+            f"valid modes are: {', '.join(CONSTANT_TIME_MODES)}"
+        )
+
+
+def constant_time_monpro_count(width: int, mode: str = "ladder") -> dict[str, int]:
+    """
+    Count the montgomery products used by the constant time montgomery_modexp
+
+    Both modes do a squaring and a multiplication for every bit of the exponent
+    zero-padded to 'width' bits, whatever the value of the bit.
+    """
+
+    check_constant_time_mode(mode)
+
+    return {
+        "table": 0,
+        "squarings": width,
+        "multiplications": width,
+        # M_bar, C_bar and the final conversion out of the montgomery domain
+        "conversions": 3,
+        "total": 2 * width + 3,
+    }
+
+
+def window_monpro_count(
+    e: int, window_size: int = None, mode: str = "sliding"
+) -> dict[str, int]:
+    """Count the montgomery products used by the window montgomery_modexp"""
+
+    if window_size is None:
+        window_size = select_window_size(e.bit_length())
+
+    counts = count_operations(window_schedule(e, window_size, mode))
+
+    # M_bar^2 and then one multiplication for every odd power above M_bar
+    table = (1 << (window_size - 1)) if window_size > 1 else 0
+    # The first multiplication only loads a value from the table
+    multiplications = max(counts[ModexpOp.MULTIPLY] - 1, 0)
+
+    return {
+        "table": table,
+        "squarings": counts[ModexpOp.SQUARE],
+        "multiplications": multiplications,
+        # M_bar and the final conversion out of the montgomery domain
+        "conversions": 2,
+        "total": table + counts[ModexpOp.SQUARE] + multiplications + 2,
+    }
+
+
+if __name__ == "__main__":
+    e = 0x0000000000000000000000000000000000000000000000000000000000010001
+    d = 0x0CEA1651EF44BE1F1F1476B7539BED10D73E3AAC782BD9999A1E5A790932BFE9
+
+    for name, exponent in (("e", e), ("d", d)):
+        print(f"Exponent {name}: binary {binary_monpro_count(exponent, 256)}")
+        print(
+            f"Exponent {name}: binary skipping leading zeros "
+            f"{binary_monpro_count(exponent, 256, skip_leading_zeros=True)}"
+        )
+
+        for mode in ("sliding", "fixed"):
+            for window_size in range(1, 7):
+                counts = window_monpro_count(exponent, window_size, mode)
+                print(f"Exponent {name}: {mode} window {window_size} {counts}")
@@ -0,0 +1,351 @@
+"""
+This module contains an opt-in profiler of the montgomery models, counting the
+kind of every monpro, the final subtractions and the limb operations, and timing
+every call of the instrumented functions.
+
+The functions are only wrapped while the profiler is enabled, so the only
+overhead when it is not used is the set_monpro_kind calls of the modexp loops,
+which tell the kind of the monpros that follow.
+
+    with MonproProfiler() as profiler:
+        montgomery_modexp(M, e, n, key_values)
+    print(profiler.report())
+"""
+
+import sys
+import time
+import marshal
+import argparse
+import functools
+import logging
+from collections import Counter
+from dataclasses import dataclass
+
+import montgomery
+import montgomery_modexp_many
+import montgomery_monpro_cios
+import montgomery_monpro_cios_systolic_array
+import modexp_schedule
+from modexp_backends import BACKENDS, get_backend
+from modexp_schedule import MonproKind
+from montgomery_monpro_cios import MontgomeryContext, from_limbs
+
+from key_values import KEY_N, KEY_E, KEY_D, LAB_MESSAGE
+
+logger = logging.getLogger(__name__)
+
+# Caller of the functions that are called outside of the instrumented functions
+TOP_LEVEL = "<top level>"
+
+
+@dataclass
+class FunctionStats:
+    calls: int = 0
+    # Time spent in the function itself, and including the instrumented callees
+    total_time: float = 0.0
+    cumulative_time: float = 0.0
+
+
+@functools.lru_cache(maxsize=64)
+def _get_n_prime(n: int, k: int) -> int:
+    """Full n' = -n⁻¹ mod R for R = 2^k"""
+    r = 1 << k
+    return (-pow(n, -1, r)) % r
+
+
+def _needs_final_subtraction(a: int, b: int, n: int, k: int) -> bool:
+    """Check if the montgomery product of a and b is at least n before reduction"""
+
+    n_prime = _get_n_prime(n, k)
+    t = a * b
+    m = (t * n_prime) & ((1 << k) - 1)
+
+    return (t + m * n) >> k >= n
+
+
+class MonproProfiler:
+    """
+    Wraps montgomery_monpro(_branch_free/_lazy), the CIOS and systolic array monpros,
+    MontgomeryContext, carry_sum and the alpha, beta and gamma cells while enabled
+
+    Counters:
+        - MonproKind: monpros by the modexp state they belong to, as set by the
+          set_monpro_kind calls of the modexp loops
+        - unknown_kind_monpros: monpros called outside of a modexp loop
+        - final_subtractions: monpros where the result was at least n
+        - lazy_monpros: monpros without the compare with n, see lazy_reduction
+        - skipped_subtractions: lazy monpros where the result was left at least n
+        - limb_macs: a + x * y + b limb operations, from carry_sum or the equivalent
+          steps of MontgomeryContext.monpro
+
+    The batched CIOS works on whole limb matrices and is not instrumented.
+    """
+
+    def __init__(self):
+        self.counters = Counter()
+        self.stats: dict[str, FunctionStats] = {}
+        self.callers: dict[tuple[str, str], FunctionStats] = {}
+
+        # (file, line, function) of every instrumented function, as used by pstats
+        self._function_keys = {TOP_LEVEL: ("~", 0, TOP_LEVEL)}
+        self._patched = []
+        # [name, time spent in instrumented callees] for every active call
+        self._stack = []
+        # Kind of the monpros that follow, from set_monpro_kind
+        self._kind = None
+
+    def _targets(self):
+        """(namespace, attribute, wrapper) of every instrumented function"""
+
+        cios = montgomery_monpro_cios
+        systolic = montgomery_monpro_cios_systolic_array
+
+        targets = [
+            (montgomery, "montgomery_monpro", self._wrap_monpro),
+            (montgomery, "montgomery_monpro_branch_free", self._wrap_monpro),
+            (montgomery, "montgomery_monpro_lazy", self._wrap_lazy_monpro),
+            (montgomery_modexp_many, "montgomery_monpro", self._wrap_monpro),
+            (cios, "montgomery_monpro_cios", self._wrap_limb_monpro),
+            (
+                systolic,
+                "montgomery_monpro_cios_systolic_array",
+                self._wrap_limb_monpro,
+            ),
+            (
+                montgomery_modexp_many,
+                "montgomery_monpro_cios_systolic_array",
+                self._wrap_limb_monpro,
+            ),
+            (MontgomeryContext, "monpro", self._wrap_context_monpro),
+            (MontgomeryContext, "monpro_lazy", self._wrap_lazy_context_monpro),
+            (cios, "carry_sum", self._wrap_carry_sum),
+            (systolic, "carry_sum", self._wrap_carry_sum),
+        ]
+        for cell in ("alpha", "beta", "gamma", "alpha_final", "gamma_final"):
+            targets.append((systolic, cell, self._timed))
+
+        return targets
+
+    def enable(self):
+        if self._patched:
+            return
+
+        for namespace, attribute, wrap in self._targets():
+            func = namespace.__dict__[attribute]
+            setattr(namespace, attribute, wrap(func))
+            self._patched.append((namespace, attribute, func))
+
+        self._kind = None
+        modexp_schedule.set_monpro_kind_hook(self._set_kind)
+
+    def disable(self):
+        if not self._patched:
+            return
+
+        modexp_schedule.set_monpro_kind_hook(None)
+        for namespace, attribute, func in reversed(self._patched):
+            setattr(namespace, attribute, func)
+        self._patched = []
+
+    def _set_kind(self, kind: MonproKind | None):
+        self._kind = kind
+
+    def __enter__(self):
+        self.enable()
+        return self
+
+    def __exit__(self, *exc):
+        self.disable()
+
+    def reset(self):
+        self.counters.clear()
+        self.stats.clear()
+        self.callers.clear()
+
+    def _timed(self, func):
+        """Wrap func, recording the number of calls and the time spent in it"""
+
+        name = f"{func.__module__}.{func.__qualname__}"
+        stack = self._stack
+
+        code = func.__code__
+        self._function_keys[name] = (
+            code.co_filename,
+            code.co_firstlineno,
+            func.__qualname__,
+        )
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            caller = stack[-1][0] if stack else TOP_LEVEL
+            stack.append([name, 0.0])
+            start_time = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start_time
+                _, callee_time = stack.pop()
+                if stack:
+                    stack[-1][1] += elapsed
+
+                for stats in (
+                    self.stats.setdefault(name, FunctionStats()),
+                    self.callers.setdefault((name, caller), FunctionStats()),
+                ):
+                    stats.calls += 1
+                    stats.total_time += elapsed - callee_time
+                    stats.cumulative_time += elapsed
+
+        return wrapper
+
+    def _count_monpro(self, a: int, b: int, n: int, k: int, lazy: bool = False):
+        self.counters["unknown_kind_monpros" if self._kind is None else self._kind] += 1
+        if lazy:
+            self.counters["lazy_monpros"] += 1
+
+        if _needs_final_subtraction(a, b, n, k):
+            self.counters["skipped_subtractions" if lazy else "final_subtractions"] += 1
+
+    def _wrap_monpro(self, func, lazy: bool = False):
+        timed = self._timed(func)
+
+        @functools.wraps(func)
+        def wrapper(a, b, key_values):
+            k = key_values.r.bit_length() - 1
+            self._count_monpro(a, b, key_values.n, k, lazy)
+            return timed(a, b, key_values)
+
+        return wrapper
+
+    def _wrap_lazy_monpro(self, func):
+        return self._wrap_monpro(func, lazy=True)
+
+    def _wrap_limb_monpro(self, func):
+        timed = self._timed(func)
+
+        @functools.wraps(func)
+        def wrapper(a, b, w, s, n, n_prime):
+            self._count_monpro(int(a), int(b), n, w * s)
+            return timed(a, b, w, s, n, n_prime)
+
+        return wrapper
+
+    def _wrap_context_monpro(self, func, lazy: bool = False):
+        timed = self._timed(func)
+        counters = self.counters
+
+        @functools.wraps(func)
+        def wrapper(context, a, b, out=None):
+            w, s = context.w, context.s
+            self._count_monpro(
+                from_limbs(a, w), from_limbs(b, w), context.modulus, w * s, lazy
+            )
+            # The same steps as the carry_sum calls of montgomery_monpro_cios
+            counters["limb_macs"] += 2 * s * s + 2 * s
+            return timed(context, a, b, out)
+
+        return wrapper
+
+    def _wrap_lazy_context_monpro(self, func):
+        return self._wrap_context_monpro(func, lazy=True)
+
+    def _wrap_carry_sum(self, func):
+        timed = self._timed(func)
+        counters = self.counters
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            counters["limb_macs"] += 1
+            return timed(*args, **kwargs)
+
+        return wrapper
+
+    @property
+    def monpro_counts(self) -> dict[MonproKind, int]:
+        return {kind: self.counters[kind] for kind in MonproKind}
+
+    def report(self) -> str:
+        a = "-" * 50 + "\n"
+        b = ""
+        for kind, count in self.monpro_counts.items():
+            b += f"{kind.name.lower()}: {count}\n"
+        b += f"monpros: {sum(self.monpro_counts.values())}\n"
+        b += f"monpros outside a modexp: {self.counters['unknown_kind_monpros']}\n"
+        b += f"final subtractions: {self.counters['final_subtractions']}\n"
+        b += f"lazy monpros without compare: {self.counters['lazy_monpros']}\n"
+        b += f"skipped subtractions: {self.counters['skipped_subtractions']}\n"
+        b += f"limb multiply-accumulates: {self.counters['limb_macs']}\n"
+        b += a
+        b += f"{'calls':>10} {'tottime':>10} {'cumtime':>10}  function\n"
+        for name, stats in sorted(
+            self.stats.items(), key=lambda item: item[1].cumulative_time, reverse=True
+        ):
+            b += (
+                f"{stats.calls:>10} {stats.total_time:>10.4f} "
+                f"{stats.cumulative_time:>10.4f}  {name}\n"
+            )
+        return a + b + a
+
+    def as_pstats_dict(self) -> dict:
+        """
+        The timings in the format of cProfile.Profile.stats, which can be
+        loaded by pstats.Stats after dump_stats
+        """
+
+        function_key = self._function_keys.__getitem__
+
+        stats = {}
+        for name, function_stats in self.stats.items():
+            callers = {
+                function_key(caller): (
+                    caller_stats.calls,
+                    caller_stats.calls,
+                    caller_stats.total_time,
+                    caller_stats.cumulative_time,
+                )
+                for (callee, caller), caller_stats in self.callers.items()
+                if callee == name and caller != TOP_LEVEL
+            }
+            stats[function_key(name)] = (
+                function_stats.calls,
+                function_stats.calls,
+                function_stats.total_time,
+                function_stats.cumulative_time,
+                callers,
+            )
+
+        return stats
+
+    def dump_stats(self, path):
+        """Write the timings to a file that can be read with pstats or snakeviz"""
+
+        with open(path, "wb") as f:
+            marshal.dump(self.as_pstats_dict(), f)
+
+
+def main():
+    """Run main CLI application"""
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-b", "--backend", choices=list(BACKENDS), default="cios")
+    parser.add_argument(
+        "-d", "--decrypt", action="store_true", help="Use the LAB key d instead of e"
+    )
+    parser.add_argument("-o", "--output", help="Write cProfile compatible stats")
+    args = parser.parse_args()
+
+    backend = get_backend(args.backend)
+
+    with MonproProfiler() as profiler:
+        backend.modexp(LAB_MESSAGE, KEY_D if args.decrypt else KEY_E, KEY_N)
+
+    print(profiler.report())
+
+    if args.output:
+        profiler.dump_stats(args.output)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
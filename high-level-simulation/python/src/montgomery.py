@@ -1,6 +1,24 @@
 import math
+import logging
+import functools
 
-from generate_rsa_key_values import RsaKeyValues, get_rsa_key_values
+from generate_rsa_key_values import (
+    RsaKeyValues,
+    get_rsa_key_values,
+    supports_lazy_reduction,
+)
+from montgomery_monpro_cios import MontgomeryContext
+from modexp_schedule import (
+    ModexpOp,
+    MonproKind,
+    check_constant_time_mode,
+    count_skipped_squarings,
+    select_window_size,
+    set_monpro_kind,
+    window_schedule,
+)
+
+logger = logging.getLogger(__name__)
 
 
 def montgomery_monpro(a, b, key_values: RsaKeyValues):
@@ -18,28 +36,252 @@ def montgomery_monpro(a, b, key_values: RsaKeyValues):
     return u
 
 
-def montgomery_modexp(M, e, n, key_values: RsaKeyValues):
+def montgomery_monpro_branch_free(a, b, key_values: RsaKeyValues):
+    """
+    Perform the montgomery mod multiplication, always calculating u - n and
+    selecting the result with a mask from the sign, instead of branching on u >= n
+    """
+    k = key_values.r.bit_length() - 1
+
+    t = a * b
+    m = t * key_values.n_0_prime % key_values.r
+    u = (t + m * key_values.n) >> k
+
+    # u < 2n < 2R, so u - n >> k is -1 (all ones) if u < n and 0 otherwise
+    d = u - key_values.n
+    return d + (key_values.n & (d >> k))
+
+
+def montgomery_monpro_lazy(a, b, key_values: RsaKeyValues):
+    """
+    Perform the montgomery mod multiplication without the final subtraction
+
+    With R > 4n and a, b < 2n the result stays below 2n, and can be used
+    as input to the next monpro without being reduced.
+    """
+    t = a * b
+    m = t * key_values.n_0_prime % key_values.r
+
+    return (t + m * key_values.n) >> (key_values.r.bit_length() - 1)
+
+
+def select(bit: int, x, y):
+    """Select x if bit is 1 and y if it is 0, using a mask instead of a branch"""
+    mask = -bit
+    return y ^ (mask & (x ^ y))
+
+
+def montgomery_modexp(
+    M,
+    e,
+    n,
+    key_values: RsaKeyValues = None,
+    skip_leading_zeros=False,
+    context: MontgomeryContext = None,
+    lazy_reduction=False,
+    return_skipped=False,
+):
     """
     Perform montgomery exponentiation to find the solution to
     X = M^e mod n
+
+    With skip_leading_zeros the exponent is scanned from its most significant
+    set bit, instead of squaring C_bar for every leading zero. With return_skipped
+    the number of skipped squarings is returned as well, as (X, skipped).
+
+    With lazy_reduction M_bar and C_bar are kept in [0, 2n), and only the
+    conversion out of the montgomery domain does the final subtraction.
+    This needs R > 4n.
+
+    If a context is given, its key values are used, with R = 2^(w * s).
     """
 
-    M_bar = montgomery_monpro(M, key_values.r2_mod_n, key_values)
-    C_bar = montgomery_monpro(1, key_values.r2_mod_n, key_values)
+    if context is not None:
+        key_values = context.key_values
 
-    binary_e = f"{e:b}".zfill(key_values.word_size)
+    k = key_values.r.bit_length() - 1
+
+    if lazy_reduction:
+        if not supports_lazy_reduction(key_values.n, k):
+            raise ValueError(
+                f"Lazy reduction needs R > 4n, n has {key_values.n.bit_length()} "
+                f"bits and R is 2^{k}"
+            )
+        monpro = montgomery_monpro_lazy
+    else:
+        monpro = montgomery_monpro
+
+    set_monpro_kind(MonproKind.TO_MONTGOMERY)
+    M_bar = monpro(M, key_values.r2_mod_n, key_values)
+    C_bar = monpro(1, key_values.r2_mod_n, key_values)
+
+    skipped = count_skipped_squarings(e, k) if skip_leading_zeros else 0
+    if skip_leading_zeros:
+        binary_e = f"{e:b}"
+        logger.debug(f"Skipped {skipped} leading squarings")
+    else:
+        binary_e = f"{e:b}".zfill(k)
     for bit in binary_e:
         bit = int(bit)
 
-        C_bar = montgomery_monpro(C_bar, C_bar, key_values)
+        set_monpro_kind(MonproKind.SQUARE)
+        C_bar = monpro(C_bar, C_bar, key_values)
         if bit == 1:
-            C_bar = montgomery_monpro(M_bar, C_bar, key_values)
-    return montgomery_monpro(C_bar, 1, key_values)
+            set_monpro_kind(MonproKind.MULTIPLY)
+            C_bar = monpro(M_bar, C_bar, key_values)
+    set_monpro_kind(MonproKind.FROM_MONTGOMERY)
+    X = montgomery_monpro(C_bar, 1, key_values)
+    set_monpro_kind(None)
+
+    return (X, skipped) if return_skipped else X
+
+
+def montgomery_modexp_constant_time(
+    M,
+    e,
+    n,
+    key_values: RsaKeyValues = None,
+    mode="ladder",
+    context: MontgomeryContext = None,
+):
+    """
+    Perform montgomery exponentiation to find the solution to
+    X = M^e mod n, doing the same montgomery products for every exponent
+
+    Every bit of e zero-padded to k bits gives one squaring and one multiplication,
+    and the branch free monpro is used, so the time does not depend on e.
+        - ladder: the montgomery ladder, keeping R1 = R0 * M_bar. The registers
+          are swapped with a mask when the bit changes.
+        - always_multiply: square and always multiply, selecting the product
+          with a mask if the bit is set.
+    """
+
+    check_constant_time_mode(mode)
+
+    if context is not None:
+        key_values = context.key_values
+
+    k = key_values.r.bit_length() - 1
+    if e.bit_length() > k:
+        raise ValueError(f"Exponent does not fit in {k} bits")
+
+    monpro = montgomery_monpro_branch_free
+
+    set_monpro_kind(MonproKind.TO_MONTGOMERY)
+    M_bar = monpro(M, key_values.r2_mod_n, key_values)
+    C_bar = monpro(1, key_values.r2_mod_n, key_values)
+
+    if mode == "ladder":
+        R0, R1 = C_bar, M_bar
+        swapped = 0
+
+        for i in reversed(range(k)):
+            bit = (e >> i) & 1
+
+            # Swap the registers if the bit differs from the previous one
+            mask = -(bit ^ swapped) & (R0 ^ R1)
+            R0, R1 = R0 ^ mask, R1 ^ mask
+            swapped = bit
+
+            set_monpro_kind(MonproKind.MULTIPLY)
+            R1 = monpro(R0, R1, key_values)
+            set_monpro_kind(MonproKind.SQUARE)
+            R0 = monpro(R0, R0, key_values)
+
+        C_bar = select(swapped, R1, R0)
+    else:
+        for i in reversed(range(k)):
+            bit = (e >> i) & 1
+
+            set_monpro_kind(MonproKind.SQUARE)
+            C_bar = monpro(C_bar, C_bar, key_values)
+            set_monpro_kind(MonproKind.MULTIPLY)
+            C_bar = select(bit, monpro(M_bar, C_bar, key_values), C_bar)
+
+    set_monpro_kind(MonproKind.FROM_MONTGOMERY)
+    X = monpro(C_bar, 1, key_values)
+    set_monpro_kind(None)
+
+    return X
+
+
+@functools.lru_cache(maxsize=256)
+def odd_power_table(M_bar, window_size, key_values: RsaKeyValues) -> dict[int, int]:
+    """
+    Pre-calculate the odd powers M_bar^1, M_bar^3, ..., M_bar^(2^window_size - 1)
+    The table is cached, so a message that is seen again skips the precalculation.
+    """
+
+    table = {1: M_bar}
+
+    if window_size > 1:
+        set_monpro_kind(MonproKind.SQUARE)
+        M_bar_squared = montgomery_monpro(M_bar, M_bar, key_values)
+
+        set_monpro_kind(MonproKind.MULTIPLY)
+        for power in range(3, 1 << window_size, 2):
+            table[power] = montgomery_monpro(
+                table[power - 2], M_bar_squared, key_values
+            )
+
+    return table
+
+
+def montgomery_modexp_window(
+    M,
+    e,
+    n,
+    key_values: RsaKeyValues = None,
+    window_size=None,
+    mode="sliding",
+    context: MontgomeryContext = None,
+):
+    """
+    Perform montgomery exponentiation to find the solution to
+    X = M^e mod n, using a sliding or fixed window over the exponent
+
+    If window_size is not given, it is chosen from the bit length of e.
+    If a context is given, its key values are used, with R = 2^(w * s).
+    """
+
+    if context is not None:
+        key_values = context.key_values
+
+    if window_size is None:
+        window_size = select_window_size(e.bit_length())
+
+    schedule = window_schedule(e, window_size, mode)
+
+    set_monpro_kind(MonproKind.TO_MONTGOMERY)
+    M_bar = montgomery_monpro(M, key_values.r2_mod_n, key_values)
+    table = odd_power_table(M_bar, window_size, key_values)
+
+    if not schedule:
+        # e = 0
+        set_monpro_kind(None)
+        return 1 % n
+
+    # The schedule always starts with a multiplication, which loads the first power
+    _, power = schedule[0]
+    C_bar = table[power]
+
+    for op, power in schedule[1:]:
+        if op == ModexpOp.SQUARE:
+            set_monpro_kind(MonproKind.SQUARE)
+            C_bar = montgomery_monpro(C_bar, C_bar, key_values)
+        else:
+            set_monpro_kind(MonproKind.MULTIPLY)
+            C_bar = montgomery_monpro(table[power], C_bar, key_values)
+    set_monpro_kind(MonproKind.FROM_MONTGOMERY)
+    X = montgomery_monpro(C_bar, 1, key_values)
+    set_monpro_kind(None)
+
+    return X
 
 
 if __name__ == "__main__":
-    word_size = 256
     n = 0x99925173AD65686715385EA800CD28120288FC70A9BC98DD4C90D676F8FF768D
+    word_size = n.bit_length()
 
     rsa_key_values = get_rsa_key_values(n, word_size)
 
@@ -65,3 +307,8 @@ if __name__ == "__main__":
 
     assert encoded == 0x23026C469918F5EA097F843DC5D5259192F9D3510415841CE834324F4C237AC7
     assert decoded == original_message
+
+    decoded_window = montgomery_modexp_window(encoded, d, n, rsa_key_values)
+    print(f"Decoded message with sliding window {hex(decoded_window)}")
+
+    assert decoded_window == original_message
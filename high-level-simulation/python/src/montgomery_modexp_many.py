@@ -0,0 +1,197 @@
+"""
+This module contains code to run montgomery exponentiation on a batch of messages
+that share the same exponent, such as all blocks of a message file.
+"""
+
+import logging
+from dataclasses import dataclass
+from typing import Callable
+
+from generate_rsa_key_values import (
+    RsaKeyValues,
+    get_rsa_key_values,
+    select_limbs,
+)
+from modexp_schedule import ModexpOp, MonproKind, binary_schedule, set_monpro_kind
+from montgomery import montgomery_monpro
+from montgomery_monpro_cios import (
+    MontgomeryContext,
+    to_limbs,
+    to_limb_matrix,
+    from_limb_matrix,
+)
+from montgomery_monpro_cios_systolic_array import montgomery_monpro_cios_systolic_array
+from montgomery_monpro_cios_batched import montgomery_monpro_cios_batched
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BatchOperations:
+    """Operations needed to run montgomery monpro on a batch of messages"""
+
+    # Convert a list of integers to the representation used by monpro
+    to_batch: Callable
+    # Convert a single integer to an operand that is shared by the whole batch
+    constant: Callable
+    # Perform monpro on two batches (or a batch and a constant)
+    monpro: Callable
+    # Convert the batch back to a list of integers
+    from_batch: Callable
+
+
+def get_num_limbs(key_values: RsaKeyValues) -> int:
+    """Get the number of limbs 's' used when the key values were calculated"""
+    return (key_values.r.bit_length() - 1) // key_values.word_size
+
+
+def _elementwise_operations(monpro: Callable) -> BatchOperations:
+    """Run a monpro function that handles one message at a time on each message"""
+
+    return BatchOperations(
+        to_batch=list,
+        constant=lambda value: value,
+        monpro=lambda a, b: [
+            monpro(x, y) for x, y in zip(a, b if isinstance(b, list) else [b] * len(a))
+        ],
+        from_batch=list,
+    )
+
+
+def _montgomery_operations(key_values: RsaKeyValues) -> BatchOperations:
+    return _elementwise_operations(lambda a, b: montgomery_monpro(a, b, key_values))
+
+
+def _cios_operations(key_values: RsaKeyValues) -> BatchOperations:
+    context = MontgomeryContext.from_key_values(key_values)
+
+    # Every message is kept as a limb vector between the monpro steps
+    return BatchOperations(
+        to_batch=lambda values: [context.to_limbs(value) for value in values],
+        constant=context.to_limbs,
+        monpro=lambda a, b: [
+            context.monpro(x, y)
+            for x, y in zip(a, b if isinstance(b, list) else [b] * len(a))
+        ],
+        from_batch=lambda batch: [context.from_limbs(x) for x in batch],
+    )
+
+
+def _cios_systolic_array_operations(key_values: RsaKeyValues) -> BatchOperations:
+    w = key_values.word_size
+    s = get_num_limbs(key_values)
+
+    return _elementwise_operations(
+        lambda a, b: montgomery_monpro_cios_systolic_array(
+            a, b, w, s, key_values.n, key_values.n_0_prime
+        )
+    )
+
+
+def _cios_batched_operations(key_values: RsaKeyValues) -> BatchOperations:
+    w = key_values.word_size
+    s = get_num_limbs(key_values)
+
+    return BatchOperations(
+        to_batch=lambda values: to_limb_matrix(values, s, w),
+        constant=lambda value: to_limbs(value, s, w),
+        monpro=lambda a, b: montgomery_monpro_cios_batched(
+            a, b, w, s, key_values.n, key_values.n_0_prime
+        ),
+        from_batch=lambda batch: from_limb_matrix(batch, w),
+    )
+
+
+BACKENDS = {
+    "montgomery": _montgomery_operations,
+    "cios": _cios_operations,
+    "cios_systolic_array": _cios_systolic_array_operations,
+    "cios_batched": _cios_batched_operations,
+}
+
+
+def modexp_many(
+    messages,
+    e: int,
+    key_values: RsaKeyValues,
+    backend: str = "cios_batched",
+    skip_leading_zeros: bool = False,
+) -> list[int]:
+    """
+    Perform montgomery exponentiation to find the solution to
+    X = M^e mod n for every message M in 'messages'
+
+    The exponent is parsed into a schedule once, and every step of the schedule
+    is applied to the whole batch.
+
+    Arguments:
+        - messages: iterable of integers smaller than n
+        - e: exponent shared by all messages
+        - key_values: pre-calculated values for the modulus
+        - backend: name of the monpro implementation to use, see BACKENDS
+        - skip_leading_zeros: start at the most significant set bit of e
+    """
+
+    if backend not in BACKENDS:
+        raise ValueError(
+            f"Unknown backend '{backend}', valid backends are: {', '.join(BACKENDS)}"
+        )
+
+    operations = BACKENDS[backend](key_values)
+
+    messages = list(messages)
+    if not messages:
+        return []
+
+    k = key_values.r.bit_length() - 1
+    schedule = binary_schedule(e, k, skip_leading_zeros)
+
+    logger.debug(f"Running {len(schedule)} monpro steps on {len(messages)} messages")
+
+    r2_mod_n = operations.constant(key_values.r2_mod_n)
+
+    # Convert the whole batch into the montgomery domain
+    set_monpro_kind(MonproKind.TO_MONTGOMERY)
+    M_bar = operations.monpro(operations.to_batch(messages), r2_mod_n)
+    C_bar = operations.monpro(operations.to_batch([1] * len(messages)), r2_mod_n)
+
+    for op, _ in schedule:
+        if op == ModexpOp.SQUARE:
+            set_monpro_kind(MonproKind.SQUARE)
+            C_bar = operations.monpro(C_bar, C_bar)
+        else:
+            set_monpro_kind(MonproKind.MULTIPLY)
+            C_bar = operations.monpro(M_bar, C_bar)
+
+    # Convert the whole batch back from the montgomery domain
+    set_monpro_kind(MonproKind.FROM_MONTGOMERY)
+    X = operations.from_batch(operations.monpro(C_bar, operations.constant(1)))
+    set_monpro_kind(None)
+
+    return X
+
+
+if __name__ == "__main__":
+    n = 0x99925173AD65686715385EA800CD28120288FC70A9BC98DD4C90D676F8FF768D
+
+    word_size, num_limbs = select_limbs(n.bit_length())
+
+    rsa_key_values = get_rsa_key_values(n, word_size, num_limbs)
+
+    e = 0x0000000000000000000000000000000000000000000000000000000000010001
+    d = 0x0CEA1651EF44BE1F1F1476B7539BED10D73E3AAC782BD9999A1E5A790932BFE9
+
+    original_messages = [
+        0x0000000011111111222222223333333344444444555555556666666677777777,
+        0x8888888899999999AAAAAAAABBBBBBBBCCCCCCCCDDDDDDDDEEEEEEEEFFFFFFFF,
+    ]
+
+    encoded = modexp_many(original_messages, e, rsa_key_values)
+    decoded = modexp_many(encoded, d, rsa_key_values)
+
+    for original, enc, dec in zip(original_messages, encoded, decoded):
+        print(f"Original message: {hex(original)}")
+        print(f"Encoded message: {hex(enc)}")
+        print(f"Decoded message: {hex(dec)}")
+
+    assert decoded == original_messages
@@ -1,11 +1,27 @@
 import logging
+import functools
 
 import numpy as np
 
-from generate_rsa_key_values import RsaKeyValues, get_rsa_key_values
+from generate_rsa_key_values import (
+    RsaKeyValues,
+    get_rsa_key_values,
+    get_n_0_prime,
+    select_limbs,
+    supports_lazy_reduction,
+)
+from modexp_schedule import (
+    MonproKind,
+    check_constant_time_mode,
+    count_skipped_squarings,
+    set_monpro_kind,
+)
 
 logger = logging.getLogger(__name__)
 
+# The product of two limbs plus two carries has to fit in an unsigned 64-bit integer
+MAX_WORD_SIZE = 32
+
 
 def carry_sum(a: int, x: int, y: int, b: int, width=16):
     """
@@ -20,11 +36,22 @@ def carry_sum(a: int, x: int, y: int, b: int, width=16):
     return int(c), int(s)
 
 
+# Little endian numpy dtypes for limb widths that are a whole number of bytes,
+# these can be converted with int.to_bytes and np.frombuffer instead of shifting
+LIMB_DTYPES = {8: "<u1", 16: "<u2", 32: "<u4", 64: "<u8"}
+
+
 def to_limbs(x, s, width) -> np.ndarray:
     """
     Split x to 's' limbs of width 'width'
     """
 
+    if width in LIMB_DTYPES and width <= MAX_WORD_SIZE:
+        x &= (1 << (s * width)) - 1
+        return np.frombuffer(
+            x.to_bytes(s * width // 8, byteorder="little"), dtype=LIMB_DTYPES[width]
+        ).astype(int)
+
     _arr = np.zeros(s, dtype=int)
 
     bitmask = 2**width - 1
@@ -42,6 +69,11 @@ def to_limbs(x, s, width) -> np.ndarray:
 def from_limbs(x: np.ndarray, width: int) -> int:
     """Turn splitted x back into integer"""
 
+    if width in LIMB_DTYPES and isinstance(x, np.ndarray) and x.dtype.kind in "ui":
+        return int.from_bytes(
+            x.astype(LIMB_DTYPES[width]).tobytes(), byteorder="little"
+        )
+
     _value = 0
 
     for limb in x[::-1]:
@@ -51,6 +83,98 @@ def from_limbs(x: np.ndarray, width: int) -> int:
     return _value
 
 
+def to_limb_matrix(values, s, width) -> np.ndarray:
+    """
+    Split every integer in 'values' into 's' limbs of width 'width',
+    returning an (N, s) matrix with one row per value
+    """
+
+    if width not in LIMB_DTYPES:
+        values = [to_limbs(x, s, width) for x in values]
+        return np.array(values, dtype=np.uint64).reshape(len(values), s)
+
+    bitmask = (1 << (s * width)) - 1
+    num_bytes = s * width // 8
+
+    data = b"".join(
+        (x & bitmask).to_bytes(num_bytes, byteorder="little") for x in values
+    )
+
+    return bytes_to_limb_matrix(data, width, num_bytes, byteorder="little")
+
+
+def from_limb_matrix(x: np.ndarray, width: int) -> list[int]:
+    """Turn every row of an (N, s) limb matrix back into an integer"""
+
+    if width not in LIMB_DTYPES:
+        return [from_limbs(row, width) for row in x]
+
+    num_bytes = x.shape[1] * width // 8
+    data = memoryview(limb_matrix_to_bytes(x, width, byteorder="little"))
+
+    return [
+        int.from_bytes(data[i : i + num_bytes], byteorder="little")
+        for i in range(0, len(data), num_bytes)
+    ]
+
+
+def _check_limb_width(width: int):
+    if width not in LIMB_DTYPES:
+        raise ValueError(
+            f"Limb width {width} is not supported, "
+            f"valid limb widths are: {', '.join(str(w) for w in LIMB_DTYPES)}"
+        )
+
+
+def bytes_to_limb_matrix(
+    data, width: int = 32, block_size: int = 32, byteorder: str = "big"
+) -> np.ndarray:
+    """
+    Split a buffer of 'block_size' byte blocks into an (N, s) limb matrix
+
+    Each block is read as an integer with the given byte order, so the blocks of
+    bytes.fromhex() on the lines of a hex test file use byteorder="big".
+    The buffer is viewed with np.frombuffer, only the conversion to uint64 copies.
+    """
+
+    _check_limb_width(width)
+
+    if len(data) % block_size != 0:
+        raise ValueError(
+            f"Buffer of {len(data)} bytes is not a whole number of {block_size} "
+            "byte blocks"
+        )
+    if block_size * 8 % width != 0:
+        raise ValueError(f"Block of {block_size} bytes is not a whole number of limbs")
+
+    blocks = np.frombuffer(data, dtype=np.uint8).reshape(-1, block_size)
+    if byteorder == "big":
+        blocks = np.ascontiguousarray(blocks[:, ::-1])
+    elif byteorder != "little":
+        raise ValueError(
+            f"Unknown byte order '{byteorder}', valid byte orders are: big, little"
+        )
+
+    return blocks.view(LIMB_DTYPES[width]).astype(np.uint64)
+
+
+def limb_matrix_to_bytes(x: np.ndarray, width: int = 32, byteorder: str = "big"):
+    """Turn every row of an (N, s) limb matrix into a block of bytes, see above"""
+
+    _check_limb_width(width)
+
+    data = np.ascontiguousarray(x, dtype=LIMB_DTYPES[width])
+    if byteorder == "big":
+        blocks = data.view(np.uint8).reshape(x.shape[0], -1)
+        return np.ascontiguousarray(blocks[:, ::-1]).tobytes()
+    elif byteorder != "little":
+        raise ValueError(
+            f"Unknown byte order '{byteorder}', valid byte orders are: big, little"
+        )
+
+    return data.tobytes()
+
+
 def montgomery_monpro_cios(a, b, w, s, n, n_prime):
     """
     Perform the montgomery mod multiplication using the CIOS algorithm
@@ -72,7 +196,7 @@ def montgomery_monpro_cios(a, b, w, s, n, n_prime):
     BITMASK = (1 << w) - 1
 
     # Create array T to store all intermediate results
-    T = np.zeros(s + 2)
+    T = np.zeros(s + 2, dtype=np.uint64)
 
     for i in range(s):
         C = 0
@@ -83,7 +207,7 @@ def montgomery_monpro_cios(a, b, w, s, n, n_prime):
         T[s + 1], T[s] = carry_sum(T[s], 0, 0, C, width=w)
 
         C = 0
-        m = int(T[0] * n_prime[0]) & BITMASK  # AND instead of modulo 2^w
+        m = (int(T[0]) * int(n_prime[0])) & BITMASK  # AND instead of modulo 2^w
 
         C, _ = carry_sum(T[0], m, n[0], 0, width=w)
         for j in range(1, s):
@@ -99,44 +223,339 @@ def montgomery_monpro_cios(a, b, w, s, n, n_prime):
     return T
 
 
-def montgomery_modexp(M, e, n, w, s, key_values: RsaKeyValues):
+class MontgomeryContext:
+    """
+    Limbs of n, n'_0, R mod n and R² mod n for one key, held once in unsigned
+    integer arrays, together with scratch buffers that are reused by every monpro
+
+    Use get_montgomery_context to share the contexts of recently used keys.
+    The scratch buffers make a context unsafe to share between threads.
+
+    With branch_free the final subtraction is always calculated, and the
+    result is selected with a mask, so it does not depend on the operands.
+    """
+
+    def __init__(self, n: int, w: int, s: int, branch_free: bool = False):
+        if w > MAX_WORD_SIZE:
+            raise ValueError(f"Word size can not be larger than {MAX_WORD_SIZE} bits")
+        if n.bit_length() > w * s:
+            raise ValueError(f"n does not fit in {s} limbs of {w} bits")
+
+        self.w = w
+        self.s = s
+        self.bitmask = (1 << w) - 1
+        self.branch_free = branch_free
+
+        self.modulus = n
+        self.n = to_limbs(n, s, w).astype(np.uint64)
+        self.n_0_prime = get_n_0_prime(n, w)
+
+        # R mod n is 1 in the montgomery domain, and R² mod n converts into it
+        self.r_mod_n = (1 << (w * s)) % n
+        self.r2_mod_n = self.r_mod_n * self.r_mod_n % n
+
+        # The inner loop works on python integers, which are faster to index
+        # than numpy scalars, so the limbs of n are kept as a list as well
+        self._n = self.n.tolist()
+        self._T = [0] * (s + 2)
+        self._D = [0] * s
+
+        self._r2_mod_n = self.to_limbs(self.r2_mod_n)
+        self._one = self.to_limbs(1)
+
+    @classmethod
+    def from_key_values(cls, key_values: RsaKeyValues) -> "MontgomeryContext":
+        w = key_values.word_size
+        s = (key_values.r.bit_length() - 1) // w
+        return get_montgomery_context(key_values.n, w, s)
+
+    @property
+    def key_values(self) -> RsaKeyValues:
+        return get_rsa_key_values(self.modulus, self.w, self.s)
+
+    def to_limbs(self, x: int, out: np.ndarray = None) -> np.ndarray:
+        """Split x into the limbs of this context, writing them into 'out' if given"""
+
+        if out is None:
+            out = np.empty(self.s, dtype=np.uint64)
+
+        for j in range(self.s):
+            out[j] = x & self.bitmask
+            x >>= self.w
+
+        return out
+
+    def from_limbs(self, x: np.ndarray) -> int:
+        return from_limbs(x, self.w)
+
+    def to_montgomery(self, x: int, out: np.ndarray = None) -> np.ndarray:
+        """x * R mod n as limbs, using a monpro with R² mod n"""
+        return self.monpro(self.to_limbs(x, out), self._r2_mod_n, out=out)
+
+    def from_montgomery(self, x_bar: np.ndarray) -> int:
+        """x_bar * R⁻¹ mod n as an integer, using a monpro with 1"""
+        return self.from_limbs(self.monpro(x_bar, self._one))
+
+    def monpro(self, a: np.ndarray, b: np.ndarray, out: np.ndarray = None):
+        """
+        Perform the montgomery mod multiplication a * b * R^(-1) mod n
+        on two limb vectors, writing the result into 'out' if given
+        """
+
+        s = self.s
+        BITMASK = self.bitmask
+        n = self._n
+
+        T = self._multiply_reduce(a, b)
+
+        if self.branch_free:
+            self._final_subtraction_branch_free(T)
+        # Final subtraction if T >= n, comparing from the most significant limb
+        elif T[s] or T[s - 1 :: -1] >= n[::-1]:
+            borrow = 0
+            for j in range(s):
+                t = T[j] - n[j] - borrow
+                T[j] = t & BITMASK
+                borrow = t < 0
+
+        if out is None:
+            out = np.empty(s, dtype=np.uint64)
+        out[:] = T[:s]
+
+        return out
+
+    def monpro_lazy(self, a: np.ndarray, b: np.ndarray, out: np.ndarray = None):
+        """
+        Perform the montgomery mod multiplication without the final subtraction,
+        giving a * b * R^(-1) mod n plus 0 or n
+
+        With R > 4n and a, b < 2n the result stays below 2n, and can be used
+        as input to the next monpro without being reduced.
+        """
+
+        T = self._multiply_reduce(a, b)
+
+        if out is None:
+            out = np.empty(self.s, dtype=np.uint64)
+        out[:] = T[: self.s]
+
+        return out
+
+    def _multiply_reduce(self, a: np.ndarray, b: np.ndarray) -> list[int]:
+        """The CIOS loop, leaving the unreduced result in the scratch buffer"""
+
+        w = self.w
+        s = self.s
+        BITMASK = self.bitmask
+        n = self._n
+        n_0_prime = self.n_0_prime
+
+        a = a.tolist()
+        b = b.tolist()
+
+        T = self._T
+        for j in range(s + 2):
+            T[j] = 0
+
+        for i in range(s):
+            C = 0
+            b_i = b[i]
+
+            for j in range(s):
+                t = T[j] + a[j] * b_i + C
+                T[j] = t & BITMASK
+                C = t >> w
+
+            t = T[s] + C
+            T[s] = t & BITMASK
+            T[s + 1] = t >> w
+
+            m = (T[0] * n_0_prime) & BITMASK
+
+            C = (T[0] + m * n[0]) >> w
+            for j in range(1, s):
+                t = T[j] + m * n[j] + C
+                T[j - 1] = t & BITMASK
+                C = t >> w
+
+            t = T[s] + C
+            T[s - 1] = t & BITMASK
+            T[s] = T[s + 1] + (t >> w)
+
+        return T
+
+    def _final_subtraction_branch_free(self, T: list[int]):
+        """Always subtract n from T, and keep T with a mask if it borrowed"""
+
+        w = self.w
+        s = self.s
+        BITMASK = self.bitmask
+        n = self._n
+        D = self._D
+
+        borrow = 0
+        for j in range(s):
+            t = T[j] - n[j] - borrow
+            D[j] = t & BITMASK
+            borrow = (t >> w) & 1
+
+        # T < 2n, so the top limb is 0 or 1, and T < n if it is less than the borrow
+        keep = -(((T[s] - borrow) >> w) & 1)
+        for j in range(s):
+            T[j] = (T[j] & keep) | (D[j] & ~keep)
+
+
+@functools.lru_cache(maxsize=64)
+def get_montgomery_context(
+    n: int, w: int, s: int, branch_free: bool = False
+) -> MontgomeryContext:
+    """
+    Get the context of a key, keeping the most recently used ones
+
+    Workloads that switch between keys, like test files with their own
+    key in the header, only set up each key once.
+    """
+
+    return MontgomeryContext(n, w, s, branch_free)
+
+
+def montgomery_modexp(
+    M,
+    e,
+    n,
+    w,
+    s,
+    key_values: RsaKeyValues = None,
+    skip_leading_zeros=False,
+    context: MontgomeryContext = None,
+    lazy_reduction=False,
+    return_skipped=False,
+):
     """
     Perform montgomery exponentiation to find the solution to
     X = M^e mod n
+
+    With skip_leading_zeros the exponent is scanned from its most significant
+    set bit, instead of squaring C_bar for every leading zero. With return_skipped
+    the number of skipped squarings is returned as well, as (X, skipped).
+
+    With lazy_reduction M_bar and C_bar are kept in [0, 2n), and only the
+    conversion out of the montgomery domain does the final subtraction.
+    This needs R = 2^(w * s) > 4n.
+
+    The context of (n, w, s) is looked up if it is not given. key_values is
+    not needed anymore, since the context holds R² mod n.
     """
 
-    k = w * s
+    if context is None:
+        context = get_montgomery_context(n, w, s)
 
-    M_bar = from_limbs(
-        montgomery_monpro_cios(M, key_values.r2_mod_n, w, s, n, key_values.n_0_prime), w
-    )
-    C_bar = from_limbs(
-        montgomery_monpro_cios(1, key_values.r2_mod_n, w, s, n, key_values.n_0_prime), w
-    )
+    k = context.w * context.s
 
-    binary_e = f"{e:b}".zfill(k)
+    if lazy_reduction:
+        if not supports_lazy_reduction(context.modulus, k):
+            raise ValueError(
+                f"Lazy reduction needs R > 4n, n has {context.modulus.bit_length()} "
+                f"bits and R is 2^{k}"
+            )
+        monpro = context.monpro_lazy
+    else:
+        monpro = context.monpro
+
+    set_monpro_kind(MonproKind.TO_MONTGOMERY)
+    M_bar = monpro(context.to_limbs(M), context._r2_mod_n)
+    C_bar = monpro(context.to_limbs(1), context._r2_mod_n)
+
+    skipped = count_skipped_squarings(e, k) if skip_leading_zeros else 0
+    if skip_leading_zeros:
+        binary_e = f"{e:b}"
+        logger.debug(f"Skipped {skipped} leading squarings")
+    else:
+        binary_e = f"{e:b}".zfill(k)
     for bit in binary_e:
         bit = int(bit)
 
-        C_bar = from_limbs(
-            montgomery_monpro_cios(C_bar, C_bar, w, s, n, key_values.n_0_prime), w
-        )
+        set_monpro_kind(MonproKind.SQUARE)
+        monpro(C_bar, C_bar, out=C_bar)
         if bit == 1:
-            C_bar = from_limbs(
-                montgomery_monpro_cios(M_bar, C_bar, w, s, n, key_values.n_0_prime), w
-            )
-    return from_limbs(
-        montgomery_monpro_cios(C_bar, 1, w, s, n, key_values.n_0_prime), w
-    )
+            set_monpro_kind(MonproKind.MULTIPLY)
+            monpro(M_bar, C_bar, out=C_bar)
 
+    set_monpro_kind(MonproKind.FROM_MONTGOMERY)
+    X = context.from_montgomery(C_bar)
+    set_monpro_kind(None)
 
-if __name__ == "__main__":
-    k = 256
-    word_size = 16
-    num_limbs = k // word_size
+    return (X, skipped) if return_skipped else X
+
+
+def montgomery_modexp_constant_time(
+    M, e, n, w, s, mode="ladder", context: MontgomeryContext = None
+):
+    """
+    Perform montgomery exponentiation to find the solution to
+    X = M^e mod n, doing the same montgomery products for every exponent
+
+    The limb version of montgomery.montgomery_modexp_constant_time, see there
+    for the modes. The context of (n, w, s) with the branch free final subtraction
+    is looked up if it is not given.
+    """
+
+    check_constant_time_mode(mode)
 
+    if context is None:
+        context = get_montgomery_context(n, w, s, branch_free=True)
+
+    k = context.w * context.s
+    if e.bit_length() > k:
+        raise ValueError(f"Exponent does not fit in {k} bits")
+
+    set_monpro_kind(MonproKind.TO_MONTGOMERY)
+    M_bar = context.to_montgomery(M)
+    C_bar = context.to_montgomery(1)
+
+    if mode == "ladder":
+        R0, R1 = C_bar, M_bar
+        swapped = 0
+
+        for i in reversed(range(k)):
+            bit = (e >> i) & 1
+
+            # Swap the registers if the bit differs from the previous one
+            mask = np.uint64(-(bit ^ swapped) & context.bitmask) & (R0 ^ R1)
+            R0 ^= mask
+            R1 ^= mask
+            swapped = bit
+
+            set_monpro_kind(MonproKind.MULTIPLY)
+            context.monpro(R0, R1, out=R1)
+            set_monpro_kind(MonproKind.SQUARE)
+            context.monpro(R0, R0, out=R0)
+
+        C_bar = R0 ^ (np.uint64(-swapped & context.bitmask) & (R0 ^ R1))
+    else:
+        product = np.empty(context.s, dtype=np.uint64)
+
+        for i in reversed(range(k)):
+            bit = (e >> i) & 1
+
+            set_monpro_kind(MonproKind.SQUARE)
+            context.monpro(C_bar, C_bar, out=C_bar)
+            set_monpro_kind(MonproKind.MULTIPLY)
+            context.monpro(M_bar, C_bar, out=product)
+            C_bar ^= np.uint64(-bit & context.bitmask) & (C_bar ^ product)
+
+    set_monpro_kind(MonproKind.FROM_MONTGOMERY)
+    X = context.from_montgomery(C_bar)
+    set_monpro_kind(None)
+
+    return X
+
+
+if __name__ == "__main__":
     n = 0x99925173AD65686715385EA800CD28120288FC70A9BC98DD4C90D676F8FF768D
 
+    word_size, num_limbs = select_limbs(n.bit_length(), 16)
+
     rsa_key_values = get_rsa_key_values(n, word_size, num_limbs)
 
     e = 0x0000000000000000000000000000000000000000000000000000000000010001
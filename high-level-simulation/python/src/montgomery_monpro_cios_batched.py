@@ -0,0 +1,144 @@
+import logging
+
+import numpy as np
+
+from generate_rsa_key_values import get_rsa_key_values, select_limbs
+from montgomery_monpro_cios import (
+    MAX_WORD_SIZE,
+    to_limbs,
+    to_limb_matrix,
+    from_limb_matrix,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def conditional_subtract_batched(T: np.ndarray, n: np.ndarray, w: int) -> np.ndarray:
+    """
+    Subtract n from every column of T that is larger than or equal to n
+
+    Arguments:
+        - T: (s + 1, N) limb matrix, one column per message
+        - n: (s,) limbs of the modulus
+        - w: word size
+    """
+
+    s = n.shape[0]
+    width = np.uint64(w)
+
+    # Compare from the most significant limb, T[s] is compared against a zero limb
+    greater_or_equal = np.ones(T.shape[1], dtype=bool)
+    undecided = np.ones(T.shape[1], dtype=bool)
+    for j in range(s, -1, -1):
+        n_j = n[j] if j < s else np.uint64(0)
+
+        greater = undecided & (T[j] > n_j)
+        less = undecided & (T[j] < n_j)
+
+        greater_or_equal[less] = False
+        undecided &= ~(greater | less)
+
+    # Subtract with borrow, only for the columns that needs it
+    borrow = np.zeros(T.shape[1], dtype=np.uint64)
+    for j in range(s):
+        subtrahend = np.where(greater_or_equal, n[j], np.uint64(0)) + borrow
+        next_borrow = (T[j] < subtrahend).astype(np.uint64)
+        T[j] = T[j] + (next_borrow << width) - subtrahend
+        borrow = next_borrow
+    T[s] -= borrow
+
+    return T
+
+
+def montgomery_monpro_cios_batched(a, b, w, s, n, n_prime) -> np.ndarray:
+    """
+    Perform the montgomery mod multiplication using the CIOS algorithm
+    for N messages at once
+
+    a * b * R^(-1) mod n
+
+    Each step of the CIOS algorithm is done as a column operation over all
+    messages, so the Python loops only depend on the number of limbs.
+
+    Arguments:
+        - a: (N, s) limb matrix of input 1
+        - b: (N, s) limb matrix of input 2, or (s,) limbs shared by all messages
+        - w: word size, at most 32 bits
+        - s: number of words
+        - n: modulus shared by all messages
+        - n_prime: n' such that n * n' = -1 mod R
+
+    Returns an (N, s) limb matrix.
+    """
+
+    if w > MAX_WORD_SIZE:
+        raise ValueError(f"Word size can not be larger than {MAX_WORD_SIZE} bits")
+
+    # Store the limbs as rows so each step works on a contiguous row of messages
+    a = np.ascontiguousarray(np.asarray(a, dtype=np.uint64).T)
+    b = np.ascontiguousarray(
+        np.broadcast_to(np.asarray(b, dtype=np.uint64), a.shape[::-1]).T
+    )
+    n = to_limbs(n, s, w).astype(np.uint64)
+    n_0_prime = np.uint64(n_prime & ((1 << w) - 1))
+
+    BITMASK = np.uint64((1 << w) - 1)
+    width = np.uint64(w)
+
+    # Create array T to store all intermediate results
+    T = np.zeros((s + 2, a.shape[1]), dtype=np.uint64)
+
+    for i in range(s):
+        C = np.zeros(a.shape[1], dtype=np.uint64)
+
+        for j in range(s):
+            value = T[j] + a[j] * b[i] + C
+            C = value >> width
+            T[j] = value & BITMASK
+
+        value = T[s] + C
+        T[s + 1] = value >> width
+        T[s] = value & BITMASK
+
+        m = (T[0] * n_0_prime) & BITMASK  # AND instead of modulo 2^w
+
+        C = (T[0] + m * n[0]) >> width
+        for j in range(1, s):
+            value = T[j] + m * n[j] + C
+            C = value >> width
+            T[j - 1] = value & BITMASK
+
+        value = T[s] + C
+        C = value >> width
+        T[s - 1] = value & BITMASK
+        T[s] = T[s + 1] + C
+
+    T = conditional_subtract_batched(T[: s + 1], n, w)
+
+    return np.ascontiguousarray(T[:s].T)
+
+
+if __name__ == "__main__":
+    n = 0x99925173AD65686715385EA800CD28120288FC70A9BC98DD4C90D676F8FF768D
+
+    word_size, num_limbs = select_limbs(n.bit_length())
+
+    rsa_key_values = get_rsa_key_values(n, word_size, num_limbs)
+
+    messages = [
+        0x0000000011111111222222223333333344444444555555556666666677777777,
+        0x8888888899999999AAAAAAAABBBBBBBBCCCCCCCCDDDDDDDDEEEEEEEEFFFFFFFF,
+    ]
+
+    M = to_limb_matrix(messages, num_limbs, word_size)
+    r2_mod_n = to_limbs(rsa_key_values.r2_mod_n, num_limbs, word_size)
+
+    M_bar = montgomery_monpro_cios_batched(
+        M, r2_mod_n, word_size, num_limbs, n, rsa_key_values.n_0_prime
+    )
+
+    for message, m_bar in zip(messages, from_limb_matrix(M_bar, word_size)):
+        print(f"Message: {hex(message)}")
+        print(f"Message in montgomery domain: {hex(m_bar)}")
+
+        assert m_bar == (message * rsa_key_values.r) % n
@@ -2,8 +2,20 @@ import logging
 
 import numpy as np
 
-from generate_rsa_key_values import RsaKeyValues, get_rsa_key_values
-from montgomery_monpro_cios import carry_sum, from_limbs, to_limbs
+from generate_rsa_key_values import (
+    RsaKeyValues,
+    get_rsa_key_values,
+    select_limbs,
+)
+from modexp_cycle_model import NUM_PHASES
+from modexp_schedule import MonproKind, count_skipped_squarings, set_monpro_kind
+from montgomery_monpro_cios import (
+    MontgomeryContext,
+    carry_sum,
+    from_limbs,
+    get_montgomery_context,
+    to_limbs,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -62,7 +74,7 @@ def montgomery_monpro_cios_systolic_array(a, b, w, s, n, n_prime):
     n_prime = to_limbs(n_prime, s, w)
 
     # Create array T to store all intermediate results
-    T = np.zeros(s + 2)
+    T = np.zeros(s + 2, dtype=np.uint64)
 
     for i in range(s):
         C = 0
@@ -86,12 +98,16 @@ def montgomery_monpro_cios_systolic_array(a, b, w, s, n, n_prime):
     return from_limbs(T, w)
 
 
-def montgomery_monpro_cios_systolic_array_nw_16_verbose(a, b, w, s, n, n_prime):
+def montgomery_monpro_cios_systolic_array_verbose(a, b, w, s, n, n_prime):
     """
-    Perform the montgomery mod multiplication using the CIOS algorithm
+    Perform the montgomery mod multiplication using the CIOS algorithm,
+    logging the alpha and gamma module of the systolic array that handles each limb
 
     a * b * R^(-1) mod n
 
+    Every module handles NUM_PHASES limbs. Alpha module j // 3 + 1 handles limb j,
+    while gamma module (j + 1) // 3 + 1 does, since limb 0 is handled by beta.
+
     Arguments:
         - a: input 1
         - b: input 2
@@ -104,49 +120,24 @@ def montgomery_monpro_cios_systolic_array_nw_16_verbose(a, b, w, s, n, n_prime):
     n_prime = to_limbs(n_prime, s, w)
 
     # Create array T to store all intermediate results
-    T = np.zeros(s + 2)
+    T = np.zeros(s + 2, dtype=np.uint64)
 
     for i in range(s):
         C = 0
 
-        C, T[0] = alpha(a[0], b[i], T[0], C, w=w)  # alpha 1
-        C, T[1] = alpha(a[1], b[i], T[1], C, w=w)  # alpha 1
-        C, T[2] = alpha(a[2], b[i], T[2], C, w=w)  # alpha 1
-        C, T[3] = alpha(a[3], b[i], T[3], C, w=w)  # alpha 2
-        C, T[4] = alpha(a[4], b[i], T[4], C, w=w)  # alpha 2
-        C, T[5] = alpha(a[5], b[i], T[5], C, w=w)  # alpha 2
-        C, T[6] = alpha(a[6], b[i], T[6], C, w=w)  # alpha 3
-        C, T[7] = alpha(a[7], b[i], T[7], C, w=w)  # alpha 3
-        C, T[8] = alpha(a[8], b[i], T[8], C, w=w)  # alpha 3
-        C, T[9] = alpha(a[9], b[i], T[9], C, w=w)  # alpha 4
-        C, T[10] = alpha(a[10], b[i], T[10], C, w=w)  # alpha 4
-        C, T[11] = alpha(a[11], b[i], T[11], C, w=w)  # alpha 4
-        C, T[12] = alpha(a[12], b[i], T[12], C, w=w)  # alpha 5
-        C, T[13] = alpha(a[13], b[i], T[13], C, w=w)  # alpha 5
-        C, T[14] = alpha(a[14], b[i], T[14], C, w=w)  # alpha 5
-        C, T[15] = alpha(a[15], b[i], T[15], C, w=w)  # alpha 6
-
-        T[16 + 1], T[16] = alpha_final(C, T[16], w=w)
+        for j in range(s):
+            C, T[j] = alpha(a[j], b[i], T[j], C, w=w)
+            logger.debug(f"i={i}: limb {j} in alpha {j // NUM_PHASES + 1}")
+
+        T[s + 1], T[s] = alpha_final(C, T[s], w=w)
 
         C, m = beta(T[0], n[0], n_prime[0], w=w)
 
-        C, T[1 - 1] = gamma(n[1], m, C, T[1], w=w)  # gamma 1
-        C, T[2 - 1] = gamma(n[2], m, C, T[2], w=w)  # gamma 2
-        C, T[3 - 1] = gamma(n[3], m, C, T[3], w=w)  # gamma 2
-        C, T[4 - 1] = gamma(n[4], m, C, T[4], w=w)  # gamma 2
-        C, T[5 - 1] = gamma(n[5], m, C, T[5], w=w)  # gamma 3
-        C, T[6 - 1] = gamma(n[6], m, C, T[6], w=w)  # gamma 3
-        C, T[7 - 1] = gamma(n[7], m, C, T[7], w=w)  # gamma 3
-        C, T[8 - 1] = gamma(n[8], m, C, T[8], w=w)  # gamma 4
-        C, T[9 - 1] = gamma(n[9], m, C, T[9], w=w)  # gamma 4
-        C, T[10 - 1] = gamma(n[10], m, C, T[10], w=w)  # gamma 4
-        C, T[11 - 1] = gamma(n[11], m, C, T[11], w=w)  # gamma 5
-        C, T[12 - 1] = gamma(n[12], m, C, T[12], w=w)  # gamma 5
-        C, T[13 - 1] = gamma(n[13], m, C, T[13], w=w)  # gamma 5
-        C, T[14 - 1] = gamma(n[14], m, C, T[14], w=w)  # gamma 6
-        C, T[15 - 1] = gamma(n[15], m, C, T[15], w=w)  # gamma 6
-
-        T[16 - 1], T[16] = gamma_final(C, T[16], T[16 + 1], w=w)
+        for j in range(1, s):
+            C, T[j - 1] = gamma(n[j], m, C, T[j], w=w)
+            logger.debug(f"i={i}: limb {j} in gamma {(j + 1) // NUM_PHASES + 1}")
+
+        T[s - 1], T[s] = gamma_final(C, T[s], T[s + 1], w=w)
 
     if from_limbs(T, w) >= from_limbs(n, w):
         T_int = int(from_limbs(T, w)) - from_limbs(n, w)
@@ -155,44 +146,78 @@ def montgomery_monpro_cios_systolic_array_nw_16_verbose(a, b, w, s, n, n_prime):
     return T
 
 
-def montgomery_modexp(M, e, n, w, s, key_values: RsaKeyValues):
+# The verbose monpro used to be unrolled for 16 limbs
+montgomery_monpro_cios_systolic_array_nw_16_verbose = (
+    montgomery_monpro_cios_systolic_array_verbose
+)
+
+
+def montgomery_modexp(
+    M,
+    e,
+    n,
+    w,
+    s,
+    key_values: RsaKeyValues = None,
+    skip_leading_zeros=False,
+    context: MontgomeryContext = None,
+    return_skipped=False,
+):
     """
     Perform montgomery exponentiation to find the solution to
     X = M^e mod n
+
+    With skip_leading_zeros the exponent is scanned from its most significant
+    set bit, instead of squaring C_bar for every leading zero. With return_skipped
+    the number of skipped squarings is returned as well, as (X, skipped).
+
+    The context of (n, w, s) is looked up if it is not given. key_values is
+    not needed anymore, since the context holds n'_0 and R² mod n.
     """
 
+    if context is None:
+        context = get_montgomery_context(n, w, s)
+
+    w, s, n = context.w, context.s, context.modulus
+    n_0_prime = context.n_0_prime
     k = w * s
 
+    set_monpro_kind(MonproKind.TO_MONTGOMERY)
     M_bar = montgomery_monpro_cios_systolic_array(
-        M, key_values.r2_mod_n, w, s, n, key_values.n_0_prime
+        M, context.r2_mod_n, w, s, n, n_0_prime
     )
     C_bar = montgomery_monpro_cios_systolic_array(
-        1, key_values.r2_mod_n, w, s, n, key_values.n_0_prime
+        1, context.r2_mod_n, w, s, n, n_0_prime
     )
 
-    binary_e = f"{e:b}".zfill(k)
+    skipped = count_skipped_squarings(e, k) if skip_leading_zeros else 0
+    if skip_leading_zeros:
+        binary_e = f"{e:b}"
+        logger.debug(f"Skipped {skipped} leading squarings")
+    else:
+        binary_e = f"{e:b}".zfill(k)
     for bit in binary_e:
         bit = int(bit)
 
-        C_bar = montgomery_monpro_cios_systolic_array(
-            C_bar, C_bar, w, s, n, key_values.n_0_prime
-        )
+        set_monpro_kind(MonproKind.SQUARE)
+        C_bar = montgomery_monpro_cios_systolic_array(C_bar, C_bar, w, s, n, n_0_prime)
         if bit == 1:
+            set_monpro_kind(MonproKind.MULTIPLY)
             C_bar = montgomery_monpro_cios_systolic_array(
-                M_bar, C_bar, w, s, n, key_values.n_0_prime
+                M_bar, C_bar, w, s, n, n_0_prime
             )
-    return montgomery_monpro_cios_systolic_array(
-        C_bar, 1, w, s, n, key_values.n_0_prime
-    )
+    set_monpro_kind(MonproKind.FROM_MONTGOMERY)
+    X = montgomery_monpro_cios_systolic_array(C_bar, 1, w, s, n, n_0_prime)
+    set_monpro_kind(None)
 
+    return (X, skipped) if return_skipped else X
 
-if __name__ == "__main__":
-    k = 256
-    word_size = 32
-    num_limbs = k // word_size
 
+if __name__ == "__main__":
     n = 0x99925173AD65686715385EA800CD28120288FC70A9BC98DD4C90D676F8FF768D
 
+    word_size, num_limbs = select_limbs(n.bit_length())
+
     rsa_key_values = get_rsa_key_values(n, word_size, num_limbs)
 
     e = 0x0000000000000000000000000000000000000000000000000000000000010001
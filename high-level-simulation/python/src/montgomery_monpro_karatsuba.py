@@ -0,0 +1,360 @@
+"""
+This module contains a multiply-then-reduce montgomery multiplication on limbs,
+where a * b, m = T * n' mod R and m * n are calculated with Karatsuba
+multiplication, so large keys use O(s^1.58) limb products instead of O(s²).
+"""
+
+import logging
+import functools
+
+import numpy as np
+
+from generate_rsa_key_values import RsaKeyValues, get_rsa_key_values
+from modexp_schedule import count_skipped_squarings
+
+logger = logging.getLogger(__name__)
+
+# Operands of this many limbs or fewer are multiplied with the schoolbook method.
+# Found with the crossover benchmark of benchmark_montgomery.py, using 32-bit limbs
+KARATSUBA_THRESHOLD = 32
+
+
+def to_limb_list(x: int, s: int, w: int) -> list[int]:
+    """Split x to 's' limbs of width 'w', as a list of python integers"""
+
+    bitmask = (1 << w) - 1
+    return [(x >> (w * j)) & bitmask for j in range(s)]
+
+
+def from_limb_list(x: list[int], w: int) -> int:
+    value = 0
+    for limb in reversed(x):
+        value = (value << w) | limb
+
+    return value
+
+
+def _add(x: list[int], y: list[int], w: int) -> list[int]:
+    """x + y of two equally long limb lists, one limb longer than them"""
+
+    bitmask = (1 << w) - 1
+    result = []
+
+    C = 0
+    for x_j, y_j in zip(x, y):
+        t = x_j + y_j + C
+        result.append(t & bitmask)
+        C = t >> w
+    result.append(C)
+
+    return result
+
+
+def _add_into(x: list[int], y: list[int], offset: int, w: int):
+    """
+    Add y into x at limb 'offset', propagating the carry through x
+
+    Limbs of y above the end of x have to be zero, as the sum has to fit in x.
+    """
+
+    bitmask = (1 << w) - 1
+
+    C = 0
+    j = offset
+    for y_j in y[: len(x) - offset]:
+        t = x[j] + y_j + C
+        x[j] = t & bitmask
+        C = t >> w
+        j += 1
+
+    while C and j < len(x):
+        t = x[j] + C
+        x[j] = t & bitmask
+        C = t >> w
+        j += 1
+
+
+def _sub_into(x: list[int], y: list[int], w: int):
+    """Subtract y from x, which must not be smaller than y"""
+
+    bitmask = (1 << w) - 1
+
+    borrow = 0
+    for j, y_j in enumerate(y):
+        t = x[j] - y_j - borrow
+        x[j] = t & bitmask
+        borrow = t < 0
+
+    j = len(y)
+    while borrow:
+        t = x[j] - 1
+        x[j] = t & bitmask
+        borrow = t < 0
+        j += 1
+
+
+def schoolbook_multiply(a: list[int], b: list[int], w: int) -> list[int]:
+    """a * b as len(a) + len(b) limbs, one row of a * b[i] at a time"""
+
+    bitmask = (1 << w) - 1
+    T = [0] * (len(a) + len(b))
+
+    for i, b_i in enumerate(b):
+        C = 0
+        j = i
+        for a_j in a:
+            t = T[j] + a_j * b_i + C
+            T[j] = t & bitmask
+            C = t >> w
+            j += 1
+        T[j] = C
+
+    return T
+
+
+def karatsuba_multiply(
+    a: list[int], b: list[int], w: int, threshold: int = KARATSUBA_THRESHOLD
+) -> list[int]:
+    """
+    a * b of two equally long limb lists, as twice as many limbs
+
+    The operands are split in a low half of h limbs and a high half, and
+    a * b = z2 * 2^(2wh) + (z1 - z2 - z0) * 2^(wh) + z0, with
+    z0 = a_lo * b_lo, z2 = a_hi * b_hi and z1 = (a_lo + a_hi) * (b_lo + b_hi),
+    so three half sized products are needed instead of four.
+    """
+
+    s = len(a)
+    # The sums of the halves have s - h + 1 limbs, which is only shorter than s
+    # for s > 3
+    if s <= max(threshold, 3):
+        return schoolbook_multiply(a, b, w)
+
+    h = s // 2
+
+    z0 = karatsuba_multiply(a[:h], b[:h], w, threshold)
+    z2 = karatsuba_multiply(a[h:], b[h:], w, threshold)
+
+    # a_lo is padded to the length of a_hi, which has one more limb if s is odd
+    padding = [0] * (s - 2 * h)
+    z1 = karatsuba_multiply(
+        _add(a[:h] + padding, a[h:], w), _add(b[:h] + padding, b[h:], w), w, threshold
+    )
+    _sub_into(z1, z0, w)
+    _sub_into(z1, z2, w)
+
+    T = z0 + z2
+    _add_into(T, z1, h, w)
+
+    return T
+
+
+def schoolbook_square(a: list[int], w: int) -> list[int]:
+    """
+    a * a as 2 * len(a) limbs, calculating each product a[i] * a[j] with i < j
+    once and doubling them, before the squares a[i] * a[i] are added
+    """
+
+    bitmask = (1 << w) - 1
+    s = len(a)
+    T = [0] * (2 * s)
+
+    for i in range(s - 1):
+        C = 0
+        a_i = a[i]
+        j = 2 * i + 1
+        for a_j in a[i + 1 :]:
+            t = T[j] + a_j * a_i + C
+            T[j] = t & bitmask
+            C = t >> w
+            j += 1
+        T[j] = C
+
+    C = 0
+    for i, a_i in enumerate(a):
+        t = (T[2 * i] << 1) + a_i * a_i + C
+        T[2 * i] = t & bitmask
+        t = (T[2 * i + 1] << 1) + (t >> w)
+        T[2 * i + 1] = t & bitmask
+        C = t >> w
+
+    return T
+
+
+def karatsuba_square(
+    a: list[int], w: int, threshold: int = KARATSUBA_THRESHOLD
+) -> list[int]:
+    """a * a as 2 * len(a) limbs, where the three products are squares as well"""
+
+    s = len(a)
+    if s <= max(threshold, 3):
+        return schoolbook_square(a, w)
+
+    h = s // 2
+
+    z0 = karatsuba_square(a[:h], w, threshold)
+    z2 = karatsuba_square(a[h:], w, threshold)
+
+    z1 = karatsuba_square(_add(a[:h] + [0] * (s - 2 * h), a[h:], w), w, threshold)
+    _sub_into(z1, z0, w)
+    _sub_into(z1, z2, w)
+
+    T = z0 + z2
+    _add_into(T, z1, h, w)
+
+    return T
+
+
+def schoolbook_multiply_low(a: list[int], b: list[int], w: int) -> list[int]:
+    """a * b mod 2^(w * s) of two limb lists of s limbs, skipping the upper half"""
+
+    bitmask = (1 << w) - 1
+    s = len(a)
+    T = [0] * s
+
+    for i, b_i in enumerate(b):
+        C = 0
+        j = i
+        for a_j in a[: s - i]:
+            t = T[j] + a_j * b_i + C
+            T[j] = t & bitmask
+            C = t >> w
+            j += 1
+
+    return T
+
+
+def karatsuba_multiply_low(
+    a: list[int], b: list[int], w: int, threshold: int = KARATSUBA_THRESHOLD
+) -> list[int]:
+    """
+    a * b mod 2^(w * s) of two limb lists of s limbs
+
+    With the split at h = ceil(s / 2), a_hi * b_hi is above 2^(w * s), and only
+    the lower s - h limbs of a_lo * b_hi and a_hi * b_lo reach below it, so the
+    lower half of a * b is a full product and two lower half products.
+    """
+
+    s = len(a)
+    if s <= max(threshold, 3):
+        return schoolbook_multiply_low(a, b, w)
+
+    h = (s + 1) // 2
+
+    T = karatsuba_multiply(a[:h], b[:h], w, threshold)[:s]
+    _add_into(T, karatsuba_multiply_low(a[: s - h], b[h:], w, threshold), h, w)
+    _add_into(T, karatsuba_multiply_low(a[h:], b[: s - h], w, threshold), h, w)
+
+    return T
+
+
+def monpro_limbs(
+    a: list[int],
+    b: list[int],
+    w: int,
+    n: list[int],
+    n_prime: list[int],
+    threshold: int = KARATSUBA_THRESHOLD,
+) -> list[int]:
+    """
+    Multiply-then-reduce montgomery multiplication of limb lists of s limbs,
+    with n' = -n⁻¹ mod R as s limbs
+
+    u = (T + m * n) / R with T = a * b and m = T * n' mod R, where the lower
+    s limbs of T + m * n are zero, so the division is dropping them.
+    Only the lower half of T * n' is calculated, and a is squared if it is b.
+    """
+
+    s = len(n)
+
+    if a is b:
+        T = karatsuba_square(a, w, threshold)
+    else:
+        T = karatsuba_multiply(a, b, w, threshold)
+    m = karatsuba_multiply_low(T[:s], n_prime, w, threshold)
+
+    T.append(0)
+    _add_into(T, karatsuba_multiply(m, n, w, threshold), 0, w)
+    u = T[s:]
+
+    # Final subtraction if u >= n, comparing from the most significant limb
+    if u[s] or u[s - 1 :: -1] >= n[::-1]:
+        _sub_into(u, n, w)
+
+    return u[:s]
+
+
+def montgomery_monpro_karatsuba(
+    a, b, w, s, n, n_prime, threshold: int = KARATSUBA_THRESHOLD
+):
+    """
+    Perform the montgomery mod multiplication a * b * R^(-1) mod n
+    by multiplying and then reducing, with Karatsuba multiplication
+
+    Arguments like montgomery_monpro_cios, but all s limbs of n' = -n⁻¹ mod R
+    are used, not only n'_0.
+    """
+
+    result = monpro_limbs(
+        to_limb_list(a, s, w),
+        to_limb_list(b, s, w),
+        w,
+        to_limb_list(n, s, w),
+        to_limb_list(n_prime, s, w),
+        threshold,
+    )
+
+    return np.array(result, dtype=np.uint64)
+
+
+def montgomery_modexp(
+    M,
+    e,
+    n,
+    w,
+    s,
+    key_values: RsaKeyValues = None,
+    skip_leading_zeros=False,
+    threshold: int = KARATSUBA_THRESHOLD,
+    return_skipped=False,
+):
+    """
+    Perform montgomery exponentiation to find the solution to
+    X = M^e mod n, with the Karatsuba montgomery multiplication
+
+    With skip_leading_zeros the exponent is scanned from its most significant
+    set bit, instead of squaring C_bar for every leading zero. With return_skipped
+    the number of skipped squarings is returned as well, as (X, skipped).
+    """
+
+    if key_values is None:
+        key_values = get_rsa_key_values(n, w, s)
+
+    k = w * s
+
+    monpro = functools.partial(
+        monpro_limbs,
+        w=w,
+        n=to_limb_list(n, s, w),
+        n_prime=to_limb_list(key_values.n_0_prime, s, w),
+        threshold=threshold,
+    )
+    r2_mod_n = to_limb_list(key_values.r2_mod_n, s, w)
+
+    M_bar = monpro(to_limb_list(M, s, w), r2_mod_n)
+    C_bar = monpro(to_limb_list(1, s, w), r2_mod_n)
+
+    skipped = count_skipped_squarings(e, k) if skip_leading_zeros else 0
+    if skip_leading_zeros:
+        binary_e = f"{e:b}"
+        logger.debug(f"Skipped {skipped} leading squarings")
+    else:
+        binary_e = f"{e:b}".zfill(k)
+    for bit in binary_e:
+        C_bar = monpro(C_bar, C_bar)
+        if bit == "1":
+            C_bar = monpro(M_bar, C_bar)
+
+    X = from_limb_list(monpro(C_bar, to_limb_list(1, s, w)), w)
+
+    return (X, skipped) if return_skipped else X
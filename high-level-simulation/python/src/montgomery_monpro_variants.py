@@ -0,0 +1,401 @@
+"""
+This module contains the SOS, CIOS, FIOS and CIHS variants of montgomery
+multiplication on limbs, as described by Koç, Acar and Kaliski, with a count of
+the word operations, memory accesses and scratch space of each.
+"""
+
+import sys
+import random
+import argparse
+import logging
+from dataclasses import dataclass, fields
+
+import numpy as np
+
+from generate_rsa_key_values import get_rsa_key_values
+from modexp_cycle_model import (
+    CLK_FREQUENCY_HZ,
+    get_num_instructions,
+    get_num_limbs,
+    monpro_cycles,
+    resource_bound_monpro_cycles,
+    NUM_PHASES,
+)
+from montgomery_monpro_cios import to_limbs
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class OpCounts:
+    # Word products, including m = t[0] * n'_0 mod 2^w
+    multiplications: float = 0
+    # Word additions, a + x * y + b is two additions
+    additions: float = 0
+    # Words read from and written to a, b, n and the scratch array t
+    reads: float = 0
+    writes: float = 0
+    # Words of the scratch array t
+    scratch_words: int = 0
+
+
+class _Ops:
+    """Word operations of the variants"""
+
+    def __init__(self, w: int):
+        self.w = w
+        self.bitmask = (1 << w) - 1
+
+    def words(self, values) -> list[int]:
+        return list(values)
+
+    def mac(self, a, x, y, b=None):
+        """(C, S) = a + x * y + b"""
+        t = a + x * y + (b or 0)
+        return t >> self.w, t & self.bitmask
+
+    def add(self, a, b):
+        """(C, S) = a + b"""
+        t = a + b
+        return t >> self.w, t & self.bitmask
+
+    def sub(self, a, b, borrow):
+        """(B, D) = a - b - borrow"""
+        t = a - b - borrow
+        return (t >> self.w) & 1, t & self.bitmask
+
+    def mul_low(self, x, y):
+        """x * y mod 2^w"""
+        return (x * y) & self.bitmask
+
+
+class _Words:
+    """Word array that counts every read and write"""
+
+    def __init__(self, values, counts: OpCounts):
+        self.values = list(values)
+        self.counts = counts
+
+    def __getitem__(self, index):
+        self.counts.reads += 1
+        return self.values[index]
+
+    def __setitem__(self, index, value):
+        self.counts.writes += 1
+        self.values[index] = value
+
+
+class _CountingOps(_Ops):
+    """Word operations that are counted in 'counts'"""
+
+    def __init__(self, w: int, counts: OpCounts):
+        super().__init__(w)
+        self.counts = counts
+
+    def words(self, values) -> _Words:
+        return _Words(values, self.counts)
+
+    def mac(self, a, x, y, b=None):
+        self.counts.multiplications += 1
+        self.counts.additions += 1 if b is None else 2
+        return super().mac(a, x, y, b)
+
+    def add(self, a, b):
+        self.counts.additions += 1
+        return super().add(a, b)
+
+    def sub(self, a, b, borrow):
+        self.counts.additions += 2
+        return super().sub(a, b, borrow)
+
+    def mul_low(self, x, y):
+        self.counts.multiplications += 1
+        return super().mul_low(x, y)
+
+
+def _get_ops(w: int, counts: OpCounts) -> _Ops:
+    return _Ops(w) if counts is None else _CountingOps(w, counts)
+
+
+def _setup(a, b, w, s, n, counts: OpCounts, scratch_words: int):
+    ops = _get_ops(w, counts)
+    if counts is not None:
+        counts.scratch_words = scratch_words
+
+    return (
+        ops,
+        ops.words(to_limbs(a, s, w).tolist()),
+        ops.words(to_limbs(b, s, w).tolist()),
+        ops.words(to_limbs(n, s, w).tolist()),
+        ops.words([0] * scratch_words),
+    )
+
+
+def _propagate(ops: _Ops, t, index: int, C: int):
+    """ADD(t[index], C) of the paper, moving the carry up until it is zero"""
+
+    while C:
+        C, t[index] = ops.add(t[index], C)
+        index += 1
+
+
+def _final_subtraction(ops: _Ops, t, n, s: int, offset: int = 0) -> np.ndarray:
+    """Return the s + 1 words of t from 'offset', minus n if they are at least n"""
+
+    d = ops.words([0] * s)
+
+    borrow = 0
+    for j in range(s):
+        borrow, d[j] = ops.sub(t[offset + j], n[j], borrow)
+    borrow, _ = ops.sub(t[offset + s], 0, borrow)
+
+    if borrow:
+        result = [t[offset + j] for j in range(s)]
+    else:
+        result = [d[j] for j in range(s)]
+
+    return np.array(result, dtype=np.uint64)
+
+
+def montgomery_monpro_sos(a, b, w, s, n, n_prime, counts: OpCounts = None):
+    """
+    Separated Operand Scanning: the full product a * b is calculated into 2s + 1
+    words, before it is reduced one word at a time
+
+    Arguments like montgomery_monpro_cios, with the operations counted in 'counts'.
+    """
+
+    ops, a, b, n, t = _setup(a, b, w, s, n, counts, 2 * s + 1)
+    n_0_prime = n_prime & ops.bitmask
+
+    for i in range(s):
+        C = 0
+        b_i = b[i]
+        for j in range(s):
+            C, t[i + j] = ops.mac(t[i + j], a[j], b_i, C)
+        t[i + s] = C
+
+    for i in range(s):
+        C = 0
+        m = ops.mul_low(t[i], n_0_prime)
+        for j in range(s):
+            C, t[i + j] = ops.mac(t[i + j], m, n[j], C)
+        _propagate(ops, t, i + s, C)
+
+    return _final_subtraction(ops, t, n, s, offset=s)
+
+
+def montgomery_monpro_cios_counted(a, b, w, s, n, n_prime, counts: OpCounts = None):
+    """
+    Coarsely Integrated Operand Scanning: a row of a * b[i] is added, and then
+    reduced by a word, so the scratch array is only s + 2 words
+
+    The same loop as montgomery_monpro_cios, written with the counted operations.
+    """
+
+    ops, a, b, n, t = _setup(a, b, w, s, n, counts, s + 2)
+    n_0_prime = n_prime & ops.bitmask
+
+    for i in range(s):
+        C = 0
+        b_i = b[i]
+        for j in range(s):
+            C, t[j] = ops.mac(t[j], a[j], b_i, C)
+        C, t[s] = ops.add(t[s], C)
+        t[s + 1] = C
+
+        m = ops.mul_low(t[0], n_0_prime)
+        C, _ = ops.mac(t[0], m, n[0])
+        for j in range(1, s):
+            C, t[j - 1] = ops.mac(t[j], m, n[j], C)
+        C, t[s - 1] = ops.add(t[s], C)
+        _, t[s] = ops.add(t[s + 1], C)
+
+    return _final_subtraction(ops, t, n, s)
+
+
+def montgomery_monpro_fios(a, b, w, s, n, n_prime, counts: OpCounts = None):
+    """
+    Finely Integrated Operand Scanning: the multiplication and the reduction
+    share one inner loop, with the carry of the product added into t[j + 1]
+
+    Arguments like montgomery_monpro_cios, with the operations counted in 'counts'.
+    """
+
+    ops, a, b, n, t = _setup(a, b, w, s, n, counts, s + 2)
+    n_0_prime = n_prime & ops.bitmask
+
+    for i in range(s):
+        b_i = b[i]
+
+        C, S = ops.mac(t[0], a[0], b_i)
+        _propagate(ops, t, 1, C)
+        m = ops.mul_low(S, n_0_prime)
+        C, _ = ops.mac(S, m, n[0])
+
+        for j in range(1, s):
+            C, S = ops.mac(t[j], a[j], b_i, C)
+            _propagate(ops, t, j + 1, C)
+            C, t[j - 1] = ops.mac(S, m, n[j])
+
+        C, t[s - 1] = ops.add(t[s], C)
+        _, t[s] = ops.add(t[s + 1], C)
+        t[s + 1] = 0
+
+    return _final_subtraction(ops, t, n, s)
+
+
+def montgomery_monpro_cihs(a, b, w, s, n, n_prime, counts: OpCounts = None):
+    """
+    Coarsely Integrated Hybrid Scanning: the lower half of a * b is calculated
+    first, and the products of the upper half are added at t[s - 1] after each
+    word of the reduction, once they have been shifted down to it
+
+    Arguments like montgomery_monpro_cios, with the operations counted in 'counts'.
+    The lower half of a * b is below s * 2^(w * (s + 1)), so it only fits in the
+    s + 2 words of t with fewer than 2^w limbs.
+    """
+
+    if s >= 1 << w:
+        raise ValueError(f"CIHS needs fewer than {1 << w} limbs of {w} bits")
+
+    ops, a, b, n, t = _setup(a, b, w, s, n, counts, s + 2)
+    n_0_prime = n_prime & ops.bitmask
+
+    # Products a[j] * b[i] with i + j < s
+    for i in range(s):
+        C = 0
+        b_i = b[i]
+        for j in range(s - i):
+            C, t[i + j] = ops.mac(t[i + j], a[j], b_i, C)
+        C, t[s] = ops.add(t[s], C)
+        _, t[s + 1] = ops.add(t[s + 1], C)
+
+    for i in range(s):
+        m = ops.mul_low(t[0], n_0_prime)
+        C, _ = ops.mac(t[0], m, n[0])
+        for j in range(1, s):
+            C, t[j - 1] = ops.mac(t[j], m, n[j], C)
+        C, t[s - 1] = ops.add(t[s], C)
+        C, t[s] = ops.add(t[s + 1], C)
+        # The upper half can carry into t[s + 1], unlike CIOS and FIOS
+        t[s + 1] = C
+
+        # Products a[s + i - j] * b[j] of weight 2^(w * (s + i)), now at t[s - 1]
+        for j in range(i + 1, s):
+            C, t[s - 1] = ops.mac(t[s - 1], b[j], a[s + i - j])
+            C, t[s] = ops.add(t[s], C)
+            _, t[s + 1] = ops.add(t[s + 1], C)
+
+    return _final_subtraction(ops, t, n, s)
+
+
+VARIANTS = {
+    "sos": montgomery_monpro_sos,
+    "cios": montgomery_monpro_cios_counted,
+    "fios": montgomery_monpro_fios,
+    "cihs": montgomery_monpro_cihs,
+}
+
+
+def get_variant(name: str):
+    if name not in VARIANTS:
+        raise ValueError(
+            f"Unknown variant '{name}', valid variants are: {', '.join(VARIANTS)}"
+        )
+
+    return VARIANTS[name]
+
+
+def measure_op_counts(
+    name: str, n: int, w: int, s: int, num_trials: int = 32, seed: int = 4141
+) -> OpCounts:
+    """
+    Mean operation counts of a variant over random operands below n
+
+    The carry propagation of SOS and FIOS and the final subtraction
+    depend on the operands, the rest of the counts do not.
+    """
+
+    monpro = get_variant(name)
+    n_0_prime = get_rsa_key_values(n, w, s).n_0_prime
+    rng = random.Random(seed)
+
+    total = OpCounts()
+    for _ in range(num_trials):
+        counts = OpCounts()
+        monpro(rng.randrange(n), rng.randrange(n), w, s, n, n_0_prime, counts)
+
+        for field in fields(OpCounts):
+            value = getattr(total, field.name) + getattr(counts, field.name)
+            setattr(total, field.name, value)
+
+    return OpCounts(
+        multiplications=total.multiplications / num_trials,
+        additions=total.additions / num_trials,
+        reads=total.reads / num_trials,
+        writes=total.writes / num_trials,
+        scratch_words=counts.scratch_words,
+    )
+
+
+def main():
+    """Run main CLI application"""
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-b", "--block-size", default=256, type=int)
+    parser.add_argument("-w", "--limb-width", default=32, type=int)
+    parser.add_argument(
+        "-m",
+        "--multipliers",
+        default=None,
+        type=int,
+        help="w x w multipliers of the datapath, the same as the systolic array "
+        "if not given",
+    )
+    parser.add_argument("--read-ports", default=2, type=int)
+    parser.add_argument("--write-ports", default=1, type=int)
+    args = parser.parse_args()
+
+    s = -(-args.block_size // args.limb_width)
+    n = random.Random(4141).getrandbits(args.block_size)
+    n |= (1 << (args.block_size - 1)) | 1
+
+    # The systolic array has an alpha and a gamma multiplier in every PE
+    systolic_limbs = get_num_limbs(args.block_size, args.limb_width)
+    systolic_multipliers = 2 * ((systolic_limbs + 1) // NUM_PHASES)
+    systolic_cycles = monpro_cycles(get_num_instructions(systolic_limbs))
+    num_multipliers = args.multipliers or systolic_multipliers
+
+    print(
+        f"{'variant':<8} {'mul':>6} {'add':>8} {'read':>8} {'write':>8} "
+        f"{'scratch':>7} {'cycles':>6} {'bound':>10} {'monpro/s/mul':>12}"
+    )
+    for name in VARIANTS:
+        counts = measure_op_counts(name, n, args.limb_width, s)
+        cycles, bound = resource_bound_monpro_cycles(
+            counts.multiplications,
+            counts.reads,
+            counts.writes,
+            num_multipliers,
+            args.read_ports,
+            args.write_ports,
+        )
+        print(
+            f"{name:<8} {counts.multiplications:>6.0f} {counts.additions:>8.1f} "
+            f"{counts.reads:>8.1f} {counts.writes:>8.1f} {counts.scratch_words:>7} "
+            f"{cycles:>6} {bound:>10} "
+            f"{CLK_FREQUENCY_HZ / cycles / num_multipliers:>12.0f}"
+        )
+
+    print(
+        f"{'systolic':<8} {'':>6} {'':>8} {'':>8} {'':>8} {'':>7} "
+        f"{systolic_cycles:>6} {'schedule':>10} "
+        f"{CLK_FREQUENCY_HZ / systolic_cycles / systolic_multipliers:>12.0f}"
+    )
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
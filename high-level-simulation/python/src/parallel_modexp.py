@@ -0,0 +1,98 @@
+"""
+This module contains code to run modular exponentiation of many blocks
+in a pool of processes, returning the results in the order of the blocks.
+"""
+
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+from modexp_backends import get_backend, run_backend
+from rsa_crt import RsaCrtKeyValues, crt_decrypt
+
+logger = logging.getLogger(__name__)
+
+# Blocks sent to a worker in one task
+SHARD_SIZE = 256
+
+# Set by _init_worker in each worker process, so the modulus, backend and
+# CRT key values are sent once per worker instead of once per shard
+_worker = {}
+
+
+def _init_worker(n: int, backend_name: str, crt_key_values: RsaCrtKeyValues):
+    _worker["n"] = n
+    _worker["backend"] = get_backend(backend_name)
+    _worker["crt_key_values"] = crt_key_values
+
+
+def _crt_modexp(M: int, e: int, n: int, key_values) -> int:
+    """The worker's backend, called like the modexp of crt_decrypt"""
+    return _worker["backend"].modexp(M, e, n)
+
+
+def _run_shard(blocks: list[int], exponent: int) -> list[int]:
+    crt_key_values = _worker["crt_key_values"]
+    if crt_key_values is not None:
+        # The exponents of p and q are taken from the CRT key values
+        return [crt_decrypt(X, crt_key_values, modexp=_crt_modexp) for X in blocks]
+
+    return run_backend(_worker["backend"], blocks, exponent, _worker["n"])
+
+
+class ParallelModexp:
+    """
+    Process pool for one modulus, called like a backend's modexp_many
+
+    The blocks are split into shards of 'shard_size' blocks, and the results are
+    put back together in order, like the tags of exponentiation.vhd.
+    With crt_key_values set, every block is decrypted with crt_decrypt on the
+    backend instead, so the exponent has to be the d the CRT key values were
+    calculated from.
+    """
+
+    def __init__(
+        self,
+        n: int,
+        backend_name: str = "pow",
+        *,
+        num_workers: int = None,
+        shard_size: int = SHARD_SIZE,
+        crt_key_values: RsaCrtKeyValues = None,
+    ):
+        # Look up the backend here, so an unknown name fails before the pool starts
+        get_backend(backend_name)
+
+        self.n = n
+        self.shard_size = shard_size
+        self.crt_key_values = crt_key_values
+        self._executor = ProcessPoolExecutor(
+            max_workers=num_workers,
+            initializer=_init_worker,
+            initargs=(n, backend_name, crt_key_values),
+        )
+
+    def __call__(self, blocks: list[int], exponent: int, n: int) -> list[int]:
+        if n != self.n:
+            raise ValueError("The process pool was started for another modulus")
+        if self.crt_key_values is not None and not (
+            exponent % (self.crt_key_values.p - 1) == self.crt_key_values.d_p
+            and exponent % (self.crt_key_values.q - 1) == self.crt_key_values.d_q
+        ):
+            raise ValueError("The process pool was started for another exponent")
+
+        shards = [
+            blocks[i : i + self.shard_size]
+            for i in range(0, len(blocks), self.shard_size)
+        ]
+        results = self._executor.map(_run_shard, shards, [exponent] * len(shards))
+
+        return [result for shard in results for result in shard]
+
+    def close(self):
+        self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,170 @@
+"""
+This module contains code to decrypt RSA messages using the chinese remainder theorem,
+running two half size montgomery exponentiations instead of one full size.
+"""
+
+import logging
+import functools
+from dataclasses import dataclass
+from datetime import datetime
+
+from generate_rsa_key_values import RsaKeyValues, get_rsa_key_values
+from montgomery import montgomery_modexp
+from montgomery_monpro_cios import montgomery_modexp as montgomery_modexp_cios
+from montgomery_modexp_many import modexp_many
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RsaCrtKeyValues:
+    p: int
+    q: int
+    d_p: int
+    d_q: int
+    q_inv: int
+    p_key_values: RsaKeyValues
+    q_key_values: RsaKeyValues
+
+    def __repr__(self):
+        a = "-" * 50 + "\n"
+        b = f"p: {hex(self.p)}\n"
+        b += f"q: {hex(self.q)}\n"
+        b += f"dP: {hex(self.d_p)}\n"
+        b += f"dQ: {hex(self.d_q)}\n"
+        b += f"q⁻¹ mod p: {hex(self.q_inv)}\n"
+        return a + b + a
+
+
+@functools.lru_cache(maxsize=16)
+def get_rsa_crt_key_values(
+    p: int, q: int, d: int, word_size: int = None, limb_size: int = 1
+) -> RsaCrtKeyValues:
+    """
+    Get the CRT values that can be pre-calculated for the private key
+
+    The montgomery key values of p and q are calculated with
+    R = 2^(word_size * limb_size), by default the word size is the bit length
+    of the largest prime.
+    """
+
+    if word_size is None:
+        word_size = max(p.bit_length(), q.bit_length())
+
+    assert word_size * limb_size >= max(p.bit_length(), q.bit_length())
+
+    return RsaCrtKeyValues(
+        p=p,
+        q=q,
+        d_p=d % (p - 1),
+        d_q=d % (q - 1),
+        q_inv=pow(q, -1, p),
+        p_key_values=get_rsa_key_values(p, word_size, limb_size),
+        q_key_values=get_rsa_key_values(q, word_size, limb_size),
+    )
+
+
+def crt_combine(m_p: int, m_q: int, crt_key_values: RsaCrtKeyValues) -> int:
+    """Recombine the results modulo p and q into the result modulo n = p * q"""
+
+    h = (crt_key_values.q_inv * (m_p - m_q)) % crt_key_values.p
+
+    return m_q + h * crt_key_values.q
+
+
+def crt_decrypt(C: int, crt_key_values: RsaCrtKeyValues, modexp=montgomery_modexp):
+    """
+    Decrypt C using two half size exponentiations
+
+    'modexp' is called as modexp(M, e, n, key_values),
+    like montgomery.montgomery_modexp
+    """
+
+    p = crt_key_values.p
+    q = crt_key_values.q
+
+    m_p = modexp(C % p, crt_key_values.d_p, p, crt_key_values.p_key_values)
+    m_q = modexp(C % q, crt_key_values.d_q, q, crt_key_values.q_key_values)
+
+    return crt_combine(m_p, m_q, crt_key_values)
+
+
+def crt_decrypt_many(
+    ciphertexts,
+    crt_key_values: RsaCrtKeyValues,
+    backend: str = "cios_batched",
+    method_many=None,
+) -> list[int]:
+    """
+    Decrypt a batch of messages using two half size batched exponentiations
+
+    If 'method_many' is given it is called as method_many(messages, e, n),
+    like the modexp_many of a modexp backend, instead of using the monpro 'backend'.
+    """
+
+    ciphertexts = list(ciphertexts)
+    p = crt_key_values.p
+    q = crt_key_values.q
+
+    if method_many is not None:
+        m_p = method_many([C % p for C in ciphertexts], crt_key_values.d_p, p)
+        m_q = method_many([C % q for C in ciphertexts], crt_key_values.d_q, q)
+
+        return [crt_combine(x, y, crt_key_values) for x, y in zip(m_p, m_q)]
+
+    m_p = modexp_many(
+        [C % p for C in ciphertexts],
+        crt_key_values.d_p,
+        crt_key_values.p_key_values,
+        backend=backend,
+    )
+    m_q = modexp_many(
+        [C % q for C in ciphertexts],
+        crt_key_values.d_q,
+        crt_key_values.q_key_values,
+        backend=backend,
+    )
+
+    return [crt_combine(x, y, crt_key_values) for x, y in zip(m_p, m_q)]
+
+
+if __name__ == "__main__":
+    # Mersenne primes 2^127 - 1 and 2^107 - 1
+    p = (1 << 127) - 1
+    q = (1 << 107) - 1
+    n = p * q
+
+    e = 0x10001
+    d = pow(e, -1, (p - 1) * (q - 1))
+
+    word_size = 16
+
+    rsa_key_values = get_rsa_key_values(n, word_size, -(-n.bit_length() // word_size))
+    crt_key_values = get_rsa_crt_key_values(p, q, d, word_size, 8)
+
+    print(crt_key_values)
+
+    def modexp_cios(M, e, n, key_values):
+        s = (key_values.r.bit_length() - 1) // key_values.word_size
+        return montgomery_modexp_cios(M, e, n, key_values.word_size, s, key_values)
+
+    original_message = 0x11111111222222223333333344444444555555556666666677777777
+
+    encoded = montgomery_modexp(original_message, e, n, rsa_key_values)
+
+    start_time = datetime.now()
+    decoded = modexp_cios(encoded, d, n, rsa_key_values)
+    stop_time = datetime.now()
+    full_time = stop_time - start_time
+
+    start_time = datetime.now()
+    decoded_crt = crt_decrypt(encoded, crt_key_values, modexp=modexp_cios)
+    stop_time = datetime.now()
+    crt_time = stop_time - start_time
+
+    print(f"Original message: {hex(original_message)}")
+    print(f"Decoded message: {hex(decoded)}")
+    print(f"Decoded message using CRT: {hex(decoded_crt)}")
+    print(f"Time used: {full_time}, using CRT: {crt_time}")
+
+    assert decoded == decoded_crt == original_message
@@ -0,0 +1,219 @@
+"""
+This module contains code to read and write the test vectors of the RSA accelerator,
+found in rsa_tests/*/inp_messages and rsa_tests/*/otp_messages.
+
+Input files start with a header of '# KEY N', '# KEY E', '# KEY D' and '# COMMAND',
+each followed by its value on the next line, and a blank line. Both input and
+output files then hold one hex block per line, without a newline after the last.
+"""
+
+from enum import IntEnum
+from pathlib import Path
+from dataclasses import dataclass
+from typing import Callable, Iterator
+
+TEST_VECTOR_PATH = (
+    Path(__file__).resolve().parents[3]
+    / "tfe4141_rsa_integration_kit_2025"
+    / "RSA_accelerator"
+    / "testbench"
+    / "rsa_tests"
+)
+
+
+# Blocks read or written at a time by the streaming functions
+BATCH_SIZE = 1024
+
+HEADER_NAMES = {"KEY N": "key_n", "KEY E": "key_e", "KEY D": "key_d"}
+
+
+class Command(IntEnum):
+    DECRYPT = 0
+    ENCRYPT = 1
+
+
+@dataclass(frozen=True)
+class MessageFileHeader:
+    key_n: int
+    key_e: int
+    key_d: int
+    command: Command
+
+    @property
+    def exponent(self) -> int:
+        """The key used by the command, e to encrypt and d to decrypt"""
+        return self.key_e if self.command == Command.ENCRYPT else self.key_d
+
+
+def _parse_header(lines, path) -> MessageFileHeader:
+    """Parse header lines, up to and not including the blank line"""
+
+    values = {}
+    name = None
+
+    for line in lines:
+        if line.startswith("#"):
+            name = line[1:].strip()
+        elif name is not None:
+            values[name] = line
+            name = None
+
+    try:
+        return MessageFileHeader(
+            key_n=int(values["KEY N"], 16),
+            key_e=int(values["KEY E"], 16),
+            key_d=int(values["KEY D"], 16),
+            command=Command(int(values["COMMAND"])),
+        )
+    except KeyError as e:
+        raise ValueError(f"{path} is missing the {e} header") from None
+
+
+def _read_header_lines(f) -> tuple[list[str], list[str]]:
+    """
+    Read the header lines of an open file, returning them together with the
+    lines read past the header. Files without a header have no header lines.
+    """
+
+    header_lines = []
+
+    for line in f:
+        line = line.strip()
+
+        if not line:
+            if header_lines:
+                break
+            continue
+        if not header_lines and not line.startswith("#"):
+            return [], [line]
+
+        header_lines.append(line)
+
+    return header_lines, []
+
+
+def read_header(path) -> MessageFileHeader:
+    """Read the header of an input file"""
+
+    with open(path) as f:
+        header_lines, _ = _read_header_lines(f)
+
+    return _parse_header(header_lines, path)
+
+
+def count_blocks(path) -> int:
+    """Count the message blocks after the header of an input file"""
+
+    with open(path) as f:
+        _, lines = _read_header_lines(f)
+
+        return len(lines) + sum(1 for line in f if line.strip())
+
+
+def read_message_file(path, batch_size: int = BATCH_SIZE) -> Iterator:
+    """
+    Stream the blocks of an input or output file
+
+    The first item is the header, or None for an output file, followed by lists
+    of at most 'batch_size' blocks as integers. Only one batch is held in memory,
+    and each batch can be passed directly to a backend's modexp_many.
+    """
+
+    with open(path) as f:
+        header_lines, batch = _read_header_lines(f)
+
+        yield _parse_header(header_lines, path) if header_lines else None
+
+        batch = [int(line, 16) for line in batch]
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+
+            batch.append(int(line, 16))
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+
+        if batch:
+            yield batch
+
+
+class MessageFileWriter:
+    """
+    Write blocks in the format of the test vectors, one batch at a time
+
+    The header is written first if given, as for an input file. Blocks are
+    zero padded to 'block_size' bits, and no newline follows the last block.
+    """
+
+    def __init__(self, f, header: MessageFileHeader = None, block_size: int = 256):
+        self.f = f
+        self.num_digits = block_size // 4
+        self.num_blocks = 0
+
+        if header is not None:
+            for name, field in HEADER_NAMES.items():
+                f.write(f"# {name}\n{getattr(header, field):0{self.num_digits}x}\n")
+            f.write(f"# COMMAND\n{int(header.command)}\n\n")
+
+    def write(self, blocks: list[int]):
+        if not blocks:
+            return
+
+        if self.num_blocks:
+            self.f.write("\n")
+        self.f.write("\n".join(f"{block:0{self.num_digits}x}" for block in blocks))
+
+        self.num_blocks += len(blocks)
+
+
+def write_message_file(path, batches, header: MessageFileHeader = None) -> int:
+    """Write batches of blocks to a file, returning the number of blocks"""
+
+    with open(path, "w") as f:
+        writer = MessageFileWriter(f, header)
+        for batch in batches:
+            writer.write(batch)
+
+    return writer.num_blocks
+
+
+def run_message_file(
+    path, method_many: Callable, batch_size: int = BATCH_SIZE
+) -> Iterator[list[int]]:
+    """
+    Run the command in the header of an input file on every block,
+    yielding the results one batch at a time
+
+    'method_many' is called as method_many(blocks, exponent, n), like the
+    modexp_many of a backend.
+    """
+
+    batches = read_message_file(path, batch_size)
+
+    header = next(batches)
+    if header is None:
+        raise ValueError(f"{path} has no header")
+
+    for batch in batches:
+        yield method_many(batch, header.exponent, header.key_n)
+
+
+def find_input_files(path=TEST_VECTOR_PATH) -> list[Path]:
+    """Find the input files of all test suites below 'path'"""
+    return sorted(Path(path).glob("*/inp_messages/*_in.txt"))
+
+
+def get_output_path(path) -> Path:
+    """
+    Get the expected output file of an input file,
+    inp_messages/*.hex_pt0_in.txt is encrypted into otp_messages/*.hex_ct0_out.txt
+    """
+
+    path = Path(path)
+    prefix, kind = path.name.removesuffix("_in.txt").rsplit("_", 1)
+    kind = {"pt": "ct", "ct": "pt"}[kind[:2]] + kind[2:]
+
+    name = f"{prefix}_{kind}_out.txt".replace("inp_messages", "otp_messages")
+    return path.parent.parent / "otp_messages" / name
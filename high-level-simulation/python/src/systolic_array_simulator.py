@@ -0,0 +1,604 @@
+"""
+This module contains a cycle accurate model of montgomery_monpro_cios_systolic_array.vhd,
+executing the mux selections of the generated instruction ROM one clock cycle at a time.
+"""
+
+import re
+import sys
+import random
+import logging
+import argparse
+from enum import IntEnum
+from pathlib import Path
+from datetime import datetime
+from dataclasses import dataclass
+from typing import NamedTuple
+
+from generate_rsa_key_values import get_rsa_key_values, get_n_0_prime
+from modexp_cycle_model import BLOCK_SIZE, LIMB_WIDTH, NUM_PHASES, get_num_limbs
+
+logger = logging.getLogger(__name__)
+
+INSTRUCTION_PKG_PATH = (
+    Path(__file__).resolve().parents[3]
+    / "tfe4141_rsa_integration_kit_2025"
+    / "Exponentiation"
+    / "source"
+    / "instruction_pkg.vhd"
+)
+
+# C_NUM_LIMBS and C_NUM_ALPHA (= C_NUM_GAMMA) in montgomery_pkg.vhd
+NUM_LIMBS = get_num_limbs(BLOCK_SIZE, LIMB_WIDTH)
+NUM_PE = (NUM_LIMBS + 1) // NUM_PHASES
+
+
+def instruction_fields(num_pe: int = NUM_PE) -> dict[str, tuple[int, int]]:
+    """
+    Bit ranges (high, low) of each mux selection, the subtypes of the instruction
+    in montgomery_monpro_cios_systolic_array.vhd for 'num_pe' alpha and gamma modules
+    """
+
+    fields = {}
+    bit = 0
+
+    def add(name, width):
+        nonlocal bit
+        fields[name] = (bit + width - 1, bit)
+        bit += width
+
+    for k in range(1, num_pe + 1):
+        add(f"alpha_{k}_carry", 1)
+        add(f"alpha_{k}_sum", 2)
+    add("alpha_final_sum", 1)
+    for k in range(2, num_pe + 1):
+        add(f"gamma_{k}_carry", 1)
+        add(f"gamma_{k}_sum", 1)
+    add("alpha_a", 2)
+    add("gamma_n", 2)
+
+    return fields
+
+
+def get_num_pe(instruction_length: int) -> int:
+    """Number of alpha and gamma modules for an instruction of the given length"""
+
+    num_pe, remainder = divmod(instruction_length - 3, 5)
+    if remainder or num_pe < 1:
+        raise ValueError(f"Invalid instruction length {instruction_length}")
+
+    return num_pe
+
+
+class DecodedInstruction(NamedTuple):
+    alpha_carry: tuple[int, ...]
+    alpha_sum: tuple[int, ...]
+    alpha_final_sum: int
+    # Gamma module 2 and up, the first gamma module has no muxes
+    gamma_carry: tuple[int, ...]
+    gamma_sum: tuple[int, ...]
+    alpha_a: int
+    gamma_n: int
+
+
+class State(IntEnum):
+    """T_FSM, in declaration order since the capture process compares states"""
+
+    IDLE = 0
+    CALC = 1
+    CHECK_RESULT = 2
+    HOLD = 3
+
+
+def decode_instruction(instruction: int, num_pe: int = NUM_PE) -> DecodedInstruction:
+    """Split an instruction word into the selection of every mux"""
+
+    values = {
+        name: (instruction >> low) & ((1 << (high - low + 1)) - 1)
+        for name, (high, low) in instruction_fields(num_pe).items()
+    }
+
+    return DecodedInstruction(
+        alpha_carry=tuple(values[f"alpha_{k}_carry"] for k in range(1, num_pe + 1)),
+        alpha_sum=tuple(values[f"alpha_{k}_sum"] for k in range(1, num_pe + 1)),
+        alpha_final_sum=values["alpha_final_sum"],
+        gamma_carry=tuple(values[f"gamma_{k}_carry"] for k in range(2, num_pe + 1)),
+        gamma_sum=tuple(values[f"gamma_{k}_sum"] for k in range(2, num_pe + 1)),
+        alpha_a=values["alpha_a"],
+        gamma_n=values["gamma_n"],
+    )
+
+
+def parse_instruction_rom(instructions, num_pe: int = None) -> list[DecodedInstruction]:
+    """
+    Decode a list of instruction words, given as integers or bit strings
+
+    The number of processing elements is found from the length of bit strings,
+    like the ones written by generate_instruction_set.py, if it is not given.
+    """
+
+    instructions = list(instructions)
+
+    if num_pe is None:
+        if not isinstance(instructions[0], str):
+            raise ValueError("num_pe must be given for integer instructions")
+        num_pe = get_num_pe(len(instructions[0]))
+
+    return [
+        decode_instruction(int(x, 2) if isinstance(x, str) else int(x), num_pe)
+        for x in instructions
+    ]
+
+
+def load_instruction_rom(path=INSTRUCTION_PKG_PATH) -> list[DecodedInstruction]:
+    """Read C_INSTRUCTION_SET from a generated instruction_pkg.vhd"""
+
+    with open(path, "r") as file:
+        content = file.read()
+
+    instructions = re.findall(r'b"([01]+)"', content)
+    if not instructions:
+        raise ValueError(f"No instructions found in {path}")
+
+    logger.debug(f"Loaded {len(instructions)} instructions from {path}")
+
+    return parse_instruction_rom(instructions)
+
+
+@dataclass
+class SystolicArrayRegisters:
+    """Every register of the systolic array, updated on the rising edge of clk"""
+
+    # Loaded input values
+    s_a: list[int]
+    s_b: list[int]
+    s_n: list[int]
+
+    # Control
+    instruction: DecodedInstruction
+    alpha_b_counter: list[int]
+    gamma_beta_m_counter: list[int]
+    beta_m: list[int]
+
+    # Processing element outputs
+    alpha_carry: list[int]
+    alpha_sum: list[int]
+    gamma_carry: list[int]
+    gamma_sum: list[int]
+
+    # Output capture
+    t: list[int]
+
+    state: State = State.IDLE
+    in_ready: int = 0
+    out_valid: int = 0
+    u: int = 0
+
+    s_n_whole: int = 0
+    s_n_prime: int = 0
+
+    instruction_counter: int = 0
+    active_beta_counter: int = 0
+
+    beta_m_out: int = 0
+    beta_carry: int = 0
+    alpha_final_carry: int = 0
+    alpha_final_sum: int = 0
+    gamma_final_sum_1: int = 0
+    gamma_final_sum_2: int = 0
+    previous_gamma_final_sum_2: int = 0
+
+    capture: int = 0
+    capture_counter: int = 0
+
+    @classmethod
+    def zeros(cls, num_limbs: int, num_pe: int) -> "SystolicArrayRegisters":
+        """Registers after reset"""
+        return cls(
+            s_a=[0] * num_limbs,
+            s_b=[0] * num_limbs,
+            s_n=[0] * num_limbs,
+            instruction=decode_instruction(0, num_pe),
+            alpha_b_counter=[0] * num_pe,
+            gamma_beta_m_counter=[0] * num_pe,
+            beta_m=[0] * num_limbs,
+            alpha_carry=[0] * num_pe,
+            alpha_sum=[0] * num_pe,
+            gamma_carry=[0] * num_pe,
+            gamma_sum=[0] * num_pe,
+            t=[0] * (num_limbs + 2),
+        )
+
+    def snapshot(self) -> dict:
+        """Copy of the register values, lists are copied so they are not shared"""
+        return {
+            key: list(value) if isinstance(value, list) else value
+            for key, value in vars(self).items()
+        }
+
+
+@dataclass
+class MonproResult:
+    u: int
+    # Clock cycles from the edge that accepts in_valid until out_valid is high
+    cycles: int
+    trace: list[dict] = None
+
+
+class SystolicArraySimulator:
+    """
+    Cycle accurate model of montgomery_monpro_cios_systolic_array
+
+    Every call to step() is one rising edge of clk. The processing elements run
+    every clock cycle, just like in hardware, so results left in the pipeline by
+    a previous monpro affect the next one the same way.
+
+    The number of alpha and gamma modules is given by the instruction ROM. By
+    default the array has NUM_PHASES * num_pe - 1 limbs, like the schedules
+    made by generate_instruction_set.py.
+    """
+
+    def __init__(
+        self,
+        instruction_rom=None,
+        limb_width: int = LIMB_WIDTH,
+        num_limbs: int = None,
+    ):
+        if instruction_rom is None:
+            instruction_rom = load_instruction_rom()
+
+        instruction_rom = list(instruction_rom)
+        if not isinstance(instruction_rom[0], DecodedInstruction):
+            instruction_rom = parse_instruction_rom(instruction_rom)
+
+        self.instruction_rom = instruction_rom
+        self.num_pe = len(instruction_rom[0].alpha_carry)
+        self.num_limbs = (
+            NUM_PHASES * self.num_pe - 1 if num_limbs is None else num_limbs
+        )
+        self.limb_width = limb_width
+        self.bitmask = (1 << limb_width) - 1
+        self.num_cycles = 0
+
+        self.reset()
+
+    @property
+    def num_instructions(self) -> int:
+        return len(self.instruction_rom)
+
+    @property
+    def data_width(self) -> int:
+        return self.limb_width * self.num_limbs
+
+    def reset(self):
+        """Asynchronous reset, rst_n = '0'"""
+        self.registers = SystolicArrayRegisters.zeros(self.num_limbs, self.num_pe)
+
+    def _limb(self, limbs: list[int], index: int) -> int:
+        """Limb 'index', or zero for the mux inputs that are not connected"""
+        return limbs[index] if 0 <= index < self.num_limbs else 0
+
+    def step(
+        self,
+        in_valid: bool = False,
+        out_ready: bool = False,
+        a: int = 0,
+        b: int = 0,
+        n: int = 0,
+        n_prime: int = 0,
+    ):
+        """Run one clock cycle with the given input ports"""
+
+        w = self.limb_width
+        bitmask = self.bitmask
+        num_pe = self.num_pe
+        num_limbs = self.num_limbs
+        reg = self.registers
+        nxt = SystolicArrayRegisters(**reg.snapshot())
+
+        instruction = reg.instruction
+        last = num_pe - 1
+
+        # --------------------------------------------------
+        # Processing elements, with the input muxes being combinational
+        # from the current register values
+        # --------------------------------------------------
+        for k in range(num_pe):
+            if instruction.alpha_a < NUM_PHASES:
+                alpha_a = self._limb(reg.s_a, NUM_PHASES * k + instruction.alpha_a)
+            else:
+                alpha_a = 0
+            alpha_b = reg.s_b[reg.alpha_b_counter[k]]
+
+            if k == 0:
+                alpha_carry_in = reg.alpha_carry[0] if instruction.alpha_carry[0] else 0
+            else:
+                alpha_carry_in = reg.alpha_carry[
+                    k if instruction.alpha_carry[k] else k - 1
+                ]
+
+            alpha_sum_select = instruction.alpha_sum[k]
+            if alpha_sum_select == 1:
+                alpha_sum_in = reg.gamma_sum[k]
+            elif alpha_sum_select == 2:
+                alpha_sum_in = (
+                    reg.gamma_sum[k + 1] if k < last else reg.gamma_final_sum_1
+                )
+            else:
+                alpha_sum_in = 0
+
+            result = alpha_carry_in + alpha_a * alpha_b + alpha_sum_in
+            nxt.alpha_carry[k] = (result >> w) & bitmask
+            nxt.alpha_sum[k] = result & bitmask
+
+        m = (reg.alpha_sum[0] * reg.s_n_prime) & bitmask
+        nxt.beta_m_out = m
+        nxt.beta_carry = ((reg.alpha_sum[0] + reg.s_n[0] * m) >> w) & bitmask
+
+        for k in range(num_pe):
+            if k == 0:
+                # The first gamma module is always connected to beta and alpha 1
+                gamma_n = self._limb(reg.s_n, 1)
+                gamma_m = reg.beta_m_out
+                gamma_carry_in = reg.beta_carry
+                gamma_sum_in = reg.alpha_sum[0]
+            else:
+                if instruction.gamma_n < NUM_PHASES:
+                    gamma_n = self._limb(
+                        reg.s_n, NUM_PHASES * k - 1 + instruction.gamma_n
+                    )
+                else:
+                    gamma_n = 0
+                gamma_m = reg.beta_m[reg.gamma_beta_m_counter[k]]
+                gamma_carry_in = reg.gamma_carry[
+                    k if instruction.gamma_carry[k - 1] else k - 1
+                ]
+                gamma_sum_in = reg.alpha_sum[
+                    k if instruction.gamma_sum[k - 1] else k - 1
+                ]
+
+            result = gamma_sum_in + gamma_n * gamma_m + gamma_carry_in
+            nxt.gamma_carry[k] = (result >> w) & bitmask
+            nxt.gamma_sum[k] = result & bitmask
+
+        alpha_final_sum_in = (
+            reg.previous_gamma_final_sum_2 if instruction.alpha_final_sum else 0
+        )
+        result = reg.alpha_carry[last] + alpha_final_sum_in
+        nxt.alpha_final_carry = (result >> w) & bitmask
+        nxt.alpha_final_sum = result & bitmask
+
+        result = reg.alpha_final_sum + reg.gamma_carry[last]
+        nxt.gamma_final_sum_1 = result & bitmask
+        nxt.gamma_final_sum_2 = ((result >> w) + reg.alpha_final_carry) & bitmask
+
+        # --------------------------------------------------
+        # Main process
+        # --------------------------------------------------
+        nxt.previous_gamma_final_sum_2 = reg.gamma_final_sum_2
+
+        out_valid = 0
+        in_ready = 0
+        capture = 0
+
+        counter = reg.instruction_counter
+
+        if reg.state == State.IDLE:
+            in_ready = 1
+
+            if in_valid:
+                nxt.s_a = [(a >> (i * w)) & bitmask for i in range(num_limbs)]
+                nxt.s_b = [(b >> (i * w)) & bitmask for i in range(num_limbs)]
+                nxt.s_n = [(n >> (i * w)) & bitmask for i in range(num_limbs)]
+                nxt.s_n_whole = n & ((1 << self.data_width) - 1)
+                nxt.s_n_prime = n_prime & bitmask
+
+                nxt.instruction_counter = 1
+                nxt.alpha_b_counter = [0] * num_pe
+                nxt.active_beta_counter = 0
+                nxt.gamma_beta_m_counter = [0] * num_pe
+
+                nxt.instruction = self.instruction_rom[0]
+
+                in_ready = 0
+                nxt.state = State.CALC
+
+        elif reg.state == State.CALC:
+            nxt.instruction = self.instruction_rom[counter]
+
+            if counter >= self.num_instructions - 1:
+                nxt.state = State.CHECK_RESULT
+                nxt.instruction_counter = 0
+            else:
+                nxt.instruction_counter = counter + 1
+
+            if counter % NUM_PHASES == 0 and counter != 0:
+                b_counter = reg.alpha_b_counter
+                if b_counter[0] < num_limbs - 1:
+                    nxt.alpha_b_counter[0] = b_counter[0] + 1
+                for k in range(1, num_pe):
+                    if b_counter[k - 1] >= 1 and b_counter[k] < num_limbs - 1:
+                        nxt.alpha_b_counter[k] = b_counter[k] + 1
+
+                if reg.active_beta_counter <= num_limbs - 1:
+                    nxt.beta_m[reg.active_beta_counter] = reg.beta_m_out
+                    nxt.active_beta_counter = reg.active_beta_counter + 1
+
+            if counter % NUM_PHASES == 0:
+                m_counter = reg.gamma_beta_m_counter
+                if m_counter[0] < num_limbs - 1:
+                    nxt.gamma_beta_m_counter[0] = m_counter[0] + 1
+                for k in range(1, num_pe):
+                    if m_counter[k - 1] >= 1 and m_counter[k] < num_limbs - 1:
+                        nxt.gamma_beta_m_counter[k] = m_counter[k] + 1
+
+            # The num_limbs + 1 words of the result are captured at the end
+            if counter >= self.num_instructions - (num_limbs + 1):
+                capture = 1
+
+        elif reg.state == State.CHECK_RESULT:
+            s_u = sum(reg.t[i] << (i * w) for i in range(num_limbs))
+
+            # Only the most significant limb is compared against n
+            if reg.t[num_limbs - 1] > reg.s_n[num_limbs - 1]:
+                nxt.u = (s_u - reg.s_n_whole) % (1 << self.data_width)
+            else:
+                nxt.u = s_u
+
+            out_valid = 1
+            nxt.state = State.HOLD
+
+        elif reg.state == State.HOLD:
+            out_valid = 1
+
+            if out_ready:
+                nxt.state = State.IDLE
+                in_ready = 1
+                out_valid = 0
+
+        nxt.out_valid = out_valid
+        nxt.in_ready = in_ready
+        nxt.capture = capture
+
+        # --------------------------------------------------
+        # Capture output, word j of the result comes from the gamma module
+        # handling limb j + 1
+        # --------------------------------------------------
+        if reg.state <= State.CALC:
+            j = reg.capture_counter
+
+            if j < num_limbs:
+                gamma_index = (j + 2) // NUM_PHASES
+                if gamma_index < num_pe:
+                    nxt.t[j] = reg.gamma_sum[gamma_index]
+                else:
+                    nxt.t[j] = reg.gamma_final_sum_1
+                    nxt.t[j + 1] = reg.gamma_final_sum_2
+
+            if reg.capture:
+                nxt.capture_counter = j + 1
+            if j > num_limbs - 1:
+                nxt.capture_counter = 0
+
+        self.registers = nxt
+        self.num_cycles += 1
+
+    def monpro(
+        self, a: int, b: int, n: int, n_prime: int, trace: bool = False
+    ) -> MonproResult:
+        """
+        Drive the in_valid/out_ready handshake like montgomery_modexp2 does,
+        and run until the result is valid
+        """
+
+        snapshots = [] if trace else None
+
+        def step(**kwargs):
+            self.step(**kwargs)
+            if trace:
+                snapshots.append(self.registers.snapshot())
+
+        while self.registers.state != State.IDLE:
+            step(out_ready=True)
+
+        step(in_valid=True, a=a, b=b, n=n, n_prime=n_prime)
+
+        cycles = 0
+        while not self.registers.out_valid:
+            step()
+            cycles += 1
+
+        u = self.registers.u
+        step(out_ready=True)
+
+        return MonproResult(u=u, cycles=cycles, trace=snapshots)
+
+
+def run_random_operands(
+    n: int,
+    num_operands: int,
+    seed: int = None,
+    simulator: SystolicArraySimulator = None,
+    limb_width: int = LIMB_WIDTH,
+):
+    """
+    Run random operands back to back through the simulator, comparing every result
+    with a * b * R^(-1) mod n
+
+    Returns the number of mismatches and the clock cycles per monpro.
+    """
+
+    if simulator is None:
+        simulator = SystolicArraySimulator(limb_width=limb_width)
+
+    rng = random.Random(seed)
+    key_values = get_rsa_key_values(n, simulator.limb_width, simulator.num_limbs)
+    n_prime = get_n_0_prime(n, simulator.limb_width)
+
+    start_cycles = simulator.num_cycles
+    mismatches = []
+
+    for _ in range(num_operands):
+        a = rng.randrange(n)
+        b = rng.randrange(n)
+
+        expected = (a * b * key_values.r_inv) % n
+        result = simulator.monpro(a, b, n, n_prime)
+
+        if result.u != expected:
+            logger.warning(
+                f"Mismatch for a={hex(a)}, b={hex(b)}: "
+                f"got {hex(result.u)}, expected {hex(expected)}"
+            )
+            mismatches.append((a, b, result.u, expected))
+
+    cycles_per_monpro = (simulator.num_cycles - start_cycles) / num_operands
+
+    return mismatches, cycles_per_monpro
+
+
+def hex_to_int(x):
+    """Converts a hexadecimal string to an integer."""
+    return int(x, 16)
+
+
+def main():
+    """Run main CLI application"""
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-n",
+        "--key-n",
+        type=hex_to_int,
+        default=0x99925173AD65686715385EA800CD28120288FC70A9BC98DD4C90D676F8FF768D,
+        help="Modulus n in hex",
+    )
+    parser.add_argument("-i", "--instruction-pkg", default=INSTRUCTION_PKG_PATH)
+    parser.add_argument("-w", "--limb-width", default=LIMB_WIDTH, type=int)
+    parser.add_argument("-c", "--count", default=1000, type=int)
+    parser.add_argument("-f", "--frequency", default=100e6, type=float)
+    parser.add_argument("-s", "--seed", default=None, type=int)
+    args = parser.parse_args()
+
+    simulator = SystolicArraySimulator(
+        load_instruction_rom(args.instruction_pkg), args.limb_width
+    )
+
+    start_time = datetime.now()
+    mismatches, cycles_per_monpro = run_random_operands(
+        args.key_n, args.count, args.seed, simulator
+    )
+    stop_time = datetime.now()
+
+    print(f"Alpha and gamma modules: {simulator.num_pe}")
+    print(f"Limbs: {simulator.num_limbs} of {simulator.limb_width} bits")
+    print(f"Instructions: {simulator.num_instructions}")
+    print(f"Mismatches: {len(mismatches)} of {args.count}")
+    print(f"Clock cycles per monpro: {cycles_per_monpro:.2f}")
+    print(f"Monpro per second: {args.frequency / cycles_per_monpro:.0f}")
+    print(f"Time used: {stop_time - start_time}")
+
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
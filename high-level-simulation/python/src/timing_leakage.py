@@ -0,0 +1,201 @@
+"""
+This module contains a dudect style timing leakage test of the modexp backends,
+timing a fixed and a random class of inputs and comparing them with Welch's t-test.
+"""
+
+import sys
+import time
+import random
+import argparse
+import logging
+from dataclasses import dataclass
+
+import numpy as np
+
+from modexp_backends import BACKENDS, get_backend
+from modexp_cycle_model import (
+    CLK_FREQUENCY_HZ,
+    constant_time_modexp_cycles,
+    modexp_cycles,
+)
+
+from key_values import KEY_N, KEY_D
+
+logger = logging.getLogger(__name__)
+
+# |t| above this is taken as a timing leak, the threshold used by dudect
+T_THRESHOLD = 4.5
+
+# The measurements are also tested after removing everything above these
+# percentiles, as the long tail from interrupts hides small differences
+CROP_PERCENTILES = (50, 75, 90, 95, 99)
+
+SECRETS = ("exponent", "message")
+
+
+@dataclass(frozen=True)
+class LeakageResult:
+    name: str
+    # The input that differs between the fixed and the random class
+    secret: str
+    num_measurements: int
+    # Largest |t| of the uncropped and cropped measurements
+    t: float
+    # Seconds per modexp of the fixed and the random class
+    mean_fixed: float
+    mean_random: float
+
+    @property
+    def leaks(self) -> bool:
+        return self.t > T_THRESHOLD
+
+    @property
+    def modexps_per_second(self) -> float:
+        return 2 / (self.mean_fixed + self.mean_random)
+
+    def __repr__(self):
+        a = "-" * 50 + "\n"
+        b = f"Backend: {self.name}\n"
+        b += f"Secret: {self.secret}\n"
+        b += f"Measurements: {self.num_measurements}\n"
+        b += f"Max |t|: {self.t:.2f} ({'leaks' if self.leaks else 'no leak found'})\n"
+        b += f"Mean fixed: {self.mean_fixed * 1e6:.1f} us\n"
+        b += f"Mean random: {self.mean_random * 1e6:.1f} us\n"
+        b += f"Throughput: {self.modexps_per_second:.1f} modexp/s\n"
+        return a + b + a
+
+
+def welch_t(x: np.ndarray, y: np.ndarray) -> float:
+    """Welch's t statistic of two samples with unequal variances"""
+
+    if len(x) < 2 or len(y) < 2:
+        return 0.0
+
+    var = np.var(x, ddof=1) / len(x) + np.var(y, ddof=1) / len(y)
+    if var == 0:
+        return 0.0
+
+    return float((np.mean(x) - np.mean(y)) / np.sqrt(var))
+
+
+def max_cropped_t(x: np.ndarray, y: np.ndarray, percentiles=CROP_PERCENTILES) -> float:
+    """Largest |t| of the measurements, also after cropping them at each percentile"""
+
+    t = abs(welch_t(x, y))
+
+    both = np.concatenate([x, y])
+    for percentile in percentiles:
+        threshold = np.percentile(both, percentile)
+        t = max(t, abs(welch_t(x[x <= threshold], y[y <= threshold])))
+
+    return t
+
+
+def measure_leakage(
+    backend_name: str,
+    secret: str = "exponent",
+    n: int = KEY_N,
+    fixed: int = None,
+    num_measurements: int = 2000,
+    batch_size: int = 100,
+    seed: int = 4141,
+) -> LeakageResult:
+    """
+    Time a backend on a fixed and a random class of inputs, in random order
+
+    With secret="exponent" the fixed class uses 'fixed' as exponent, by default the
+    exponent with only the top bit set, and the random class uses random exponents
+    of the same length. With secret="message" the exponent is d, and the message is
+    'fixed' or random. The inputs of each batch are drawn before it is timed.
+    """
+
+    if secret not in SECRETS:
+        raise ValueError(
+            f"Unknown secret '{secret}', valid secrets are: {', '.join(SECRETS)}"
+        )
+
+    modexp = get_backend(backend_name).modexp
+    rng = random.Random(seed)
+    k = n.bit_length()
+
+    if fixed is None:
+        fixed = 1 << (k - 1) if secret == "exponent" else rng.randrange(n)
+
+    times = ([], [])
+
+    for _ in range(-(-num_measurements // batch_size)):
+        batch = []
+        for _ in range(batch_size):
+            is_random = rng.getrandbits(1)
+            if secret == "exponent":
+                e = rng.getrandbits(k - 1) | (1 << (k - 1)) if is_random else fixed
+                batch.append((is_random, rng.randrange(n), e))
+            else:
+                M = rng.randrange(n) if is_random else fixed
+                batch.append((is_random, M, KEY_D))
+
+        for is_random, M, e in batch:
+            start_time = time.perf_counter()
+            modexp(M, e, n)
+            times[is_random].append(time.perf_counter() - start_time)
+
+    fixed_times, random_times = (np.array(t) for t in times)
+
+    return LeakageResult(
+        name=backend_name,
+        secret=secret,
+        num_measurements=len(fixed_times) + len(random_times),
+        t=max_cropped_t(fixed_times, random_times),
+        mean_fixed=float(np.mean(fixed_times)),
+        mean_random=float(np.mean(random_times)),
+    )
+
+
+def main():
+    """Run main CLI application"""
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-b",
+        "--backends",
+        nargs="+",
+        choices=list(BACKENDS),
+        default=["montgomery", "montgomery_ladder", "montgomery_always_multiply"],
+    )
+    parser.add_argument("-s", "--secret", choices=SECRETS, default="exponent")
+    parser.add_argument("-n", "--num-measurements", default=2000, type=int)
+    parser.add_argument("--batch-size", default=100, type=int)
+    args = parser.parse_args()
+
+    results = [
+        measure_leakage(
+            name,
+            args.secret,
+            num_measurements=args.num_measurements,
+            batch_size=args.batch_size,
+        )
+        for name in args.backends
+    ]
+
+    print(f"{'backend':<28} {'|t|':>8} {'leak':>5} {'modexp/s':>10} {'cost':>6}")
+    for result in results:
+        print(
+            f"{result.name:<28} {result.t:>8.2f} {'yes' if result.leaks else 'no':>5} "
+            f"{result.modexps_per_second:>10.1f} "
+            f"{results[0].modexps_per_second / result.modexps_per_second:>5.2f}x"
+        )
+
+    # The same comparison for the hardware, using the cycle model
+    binary = modexp_cycles(KEY_D)
+    constant_time = constant_time_modexp_cycles(KEY_N.bit_length())
+    print(
+        f"Hardware modexp with d: {binary} cycles binary, {constant_time} cycles "
+        f"constant time ({constant_time / binary:.2f}x), "
+        f"{CLK_FREQUENCY_HZ / constant_time:.0f} modexp/s per core"
+    )
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,164 @@
+"""
+This module contains a CLI to verify the expected outputs of the RSA accelerator
+test vectors, or regenerate them, without running the VHDL testbench.
+"""
+
+import sys
+import argparse
+import itertools
+import functools
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+
+from modexp_backends import BACKENDS, get_backend, run_backend
+from rsa_test_vectors import (
+    TEST_VECTOR_PATH,
+    find_input_files,
+    get_output_path,
+    read_message_file,
+    run_message_file,
+    write_message_file,
+)
+
+logger = logging.getLogger(__name__)
+
+# Mismatching blocks listed per file
+MAX_REPORTED_MISMATCHES = 10
+
+
+@dataclass
+class FileResult:
+    path: Path
+    num_blocks: int = 0
+    seconds: float = 0.0
+    # Line numbers of the mismatching blocks, counted from the first block
+    mismatches: list[int] = field(default_factory=list)
+    num_mismatches: int = 0
+    missing: bool = False
+
+    @property
+    def passed(self) -> bool:
+        return not self.missing and self.num_mismatches == 0
+
+
+def verify_file(path, backend_name: str = "pow", regenerate: bool = False):
+    """
+    Run an input file through a backend and compare with its expected output,
+    or write the expected output if 'regenerate' is set
+    """
+
+    backend = get_backend(backend_name)
+    output_path = get_output_path(path)
+    result = FileResult(Path(path))
+
+    start_time = datetime.now()
+
+    batches = run_message_file(path, functools.partial(run_backend, backend))
+
+    if regenerate:
+        result.num_blocks = write_message_file(output_path, batches)
+    elif not output_path.exists():
+        result.missing = True
+    else:
+        expected = read_message_file(output_path)
+        next(expected)
+
+        for i, (block, expected_block) in enumerate(
+            itertools.zip_longest(
+                itertools.chain.from_iterable(batches),
+                itertools.chain.from_iterable(expected),
+            )
+        ):
+            if block is not None:
+                result.num_blocks += 1
+            if block != expected_block:
+                result.num_mismatches += 1
+                if len(result.mismatches) < MAX_REPORTED_MISMATCHES:
+                    result.mismatches.append(i)
+
+    result.seconds = (datetime.now() - start_time).total_seconds()
+
+    return result
+
+
+def verify_files(
+    paths,
+    backend_name: str = "pow",
+    regenerate: bool = False,
+    max_workers: int = None,
+) -> list[FileResult]:
+    """Verify every file in a pool of processes, keeping the order of the files"""
+
+    verify = functools.partial(
+        verify_file, backend_name=backend_name, regenerate=regenerate
+    )
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(verify, paths))
+
+
+def main():
+    """Run main CLI application"""
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "path",
+        nargs="?",
+        default=TEST_VECTOR_PATH,
+        help="Directory with the short_tests and long_tests test suites",
+    )
+    parser.add_argument(
+        "-b",
+        "--backend",
+        choices=list(BACKENDS),
+        default="pow",
+        help="Modular exponentiation implementation to use, pow is the fastest",
+    )
+    parser.add_argument("-j", "--jobs", default=None, type=int)
+    parser.add_argument(
+        "-r",
+        "--regenerate",
+        action="store_true",
+        help="Write the expected outputs instead of comparing with them",
+    )
+    args = parser.parse_args()
+
+    paths = find_input_files(args.path)
+    if not paths:
+        print(f"No input files found in {args.path}")
+        return 1
+
+    start_time = datetime.now()
+    results = verify_files(paths, args.backend, args.regenerate, args.jobs)
+    seconds = (datetime.now() - start_time).total_seconds()
+
+    for result in results:
+        if args.regenerate:
+            status = "WROTE"
+        elif result.missing:
+            status = "MISSING"
+        else:
+            status = "OK" if result.passed else "FAIL"
+
+        print(
+            f"{status:<7} {result.path.name:<45} {result.num_blocks:>5} blocks "
+            f"{result.seconds:.3f} s"
+        )
+        if result.num_mismatches:
+            lines = ", ".join(str(i) for i in result.mismatches)
+            print(f"        {result.num_mismatches} mismatching blocks: {lines}")
+
+    num_blocks = sum(result.num_blocks for result in results)
+    print(
+        f"{num_blocks} blocks in {seconds:.3f} s, "
+        f"{num_blocks / seconds if seconds > 0 else float('inf'):.0f} blocks/s"
+    )
+
+    return 0 if all(result.passed for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
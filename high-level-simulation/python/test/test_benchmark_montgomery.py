@@ -0,0 +1,97 @@
+import json
+import logging
+import dataclasses
+
+from benchmark_montgomery import (
+    BenchmarkResult,
+    find_crossover,
+    find_regressions,
+    from_json,
+    get_benchmarks,
+    run_benchmarks,
+    run_crossover,
+    to_json,
+)
+
+from montgomery_monpro_cios import from_limbs
+
+logger = logging.getLogger(__name__)
+
+
+def test_benchmarks_agree():
+    """Every single message monpro of the benchmark works on the same operands"""
+
+    results = set()
+    for w in (0, 32, 16):
+        for name, _, _, batch_size, func in get_benchmarks(256, w, 0x10001):
+            if not name.startswith("monpro/") or batch_size > 1:
+                continue
+
+            result = func()
+            if not isinstance(result, int):
+                result = from_limbs(result, w)
+
+            results.add(result)
+
+    assert len(results) == 1
+
+
+def test_run_benchmarks_json():
+    results = run_benchmarks(
+        [256], [32], min_time=0.001, repeat=2, name_filter="monpro"
+    )
+
+    assert {result.name for result in results} == {
+        "monpro/montgomery",
+        "monpro/cios",
+        "monpro/cios_systolic_array",
+        "monpro/cios_context",
+        "monpro/cios_batched",
+        "monpro/karatsuba",
+        "monpro/sos",
+        "monpro/fios",
+        "monpro/cihs",
+    }
+    assert all(result.mean > 0 for result in results)
+
+    data = json.loads(json.dumps(to_json(results, 0x10001)))
+
+    assert from_json(data) == results
+
+
+def test_find_regressions():
+    results = run_benchmarks([256], [], min_time=0.001, repeat=2)
+
+    assert find_regressions(results, results) == []
+
+    slower = [dataclasses.replace(results[0], minimum=results[0].minimum * 2)]
+
+    assert find_regressions(slower, results) == [(slower[0], 2.0)]
+
+
+def test_run_crossover():
+    results = run_crossover([4, 8], min_time=0.001, repeat=2)
+
+    assert {result.s for result in results} == {4, 8}
+    assert {result.name for result in results} >= {
+        "crossover/karatsuba",
+        "crossover/karatsuba_square",
+        "crossover/cios_context",
+    }
+
+
+def test_find_crossover():
+    results = [
+        BenchmarkResult("crossover/karatsuba", 32 * s, 32, s, 1, 1, t, t, 0.0)
+        for s, t in ((8, 3.0), (16, 1.0), (32, 3.0), (64, 1.0), (128, 1.0))
+    ] + [
+        BenchmarkResult("crossover/cios_context", 32 * s, 32, s, 1, 1, 2.0, 2.0, 0.0)
+        for s in (8, 16, 32, 64, 128)
+    ]
+
+    assert (
+        find_crossover(results, "crossover/karatsuba", "crossover/cios_context") == 64
+    )
+    assert (
+        find_crossover(results, "crossover/cios_context", "crossover/karatsuba") is None
+    )
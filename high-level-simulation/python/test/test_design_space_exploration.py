@@ -0,0 +1,72 @@
+import logging
+
+import pytest
+
+from design_space_exploration import (
+    DesignPoint,
+    evaluate_design_point,
+    explore,
+    load_exponent_stats,
+)
+from modexp_cycle_model import (
+    NUM_MONPRO_INSTRUCTIONS,
+    get_num_instructions,
+    get_num_limbs,
+    modexp_cycles,
+    window_modexp_cycles,
+)
+
+from key_values import KEY_E, KEY_D
+
+logger = logging.getLogger(__name__)
+
+
+@pytest.fixture(scope="module")
+def exponent_stats() -> dict[int, int]:
+    yield load_exponent_stats()
+
+
+def test_load_exponent_stats(exponent_stats):
+    """Half of the test vectors are encrypted and half decrypted"""
+
+    assert exponent_stats == {KEY_E: 975, KEY_D: 975}
+
+
+@pytest.mark.parametrize(
+    "block_size, limb_width, num_limbs",
+    [(256, 32, 8), (256, 16, 17), (256, 64, 5), (512, 32, 17), (96, 32, 5)],
+)
+def test_get_num_limbs(block_size, limb_width, num_limbs):
+    assert get_num_limbs(block_size, limb_width) == num_limbs
+    assert (num_limbs + 1) % 3 == 0
+
+
+def test_cycle_model_hardware_configuration():
+    assert get_num_instructions(get_num_limbs()) == NUM_MONPRO_INSTRUCTIONS
+    assert window_modexp_cycles(KEY_D, 1) == modexp_cycles(KEY_D)
+
+
+def test_evaluate_design_point():
+    """The configuration in exponentiation.vhd is limited by the cores"""
+
+    result = evaluate_design_point(DesignPoint(7, 32), {KEY_E: 1})
+
+    assert result.num_pe == 3
+    assert result.monpro_cycles == NUM_MONPRO_INSTRUCTIONS + 3
+    assert result.modexp_cycles == modexp_cycles(KEY_E)
+    assert result.bound == "cores"
+
+    # Enough cores for e = 65537 saturate the 32-bit input stream
+    result = evaluate_design_point(DesignPoint(200, 32), {KEY_E: 1})
+
+    assert result.bound == "stream"
+    assert result.messages_per_second == pytest.approx(100e6 / 8)
+
+
+def test_explore(exponent_stats):
+    points = [DesignPoint(c, w, W) for c in (1, 7) for w in (16, 32) for W in (1, 4)]
+
+    results = explore(points, exponent_stats, max_workers=2)
+
+    assert [result.point for result in results] == points
+    assert results == [evaluate_design_point(p, exponent_stats) for p in points]
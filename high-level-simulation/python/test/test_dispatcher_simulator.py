@@ -0,0 +1,100 @@
+import logging
+
+import pytest
+
+from dispatcher_simulator import (
+    DispatcherSimulator,
+    message_latencies,
+    simulate_dispatcher,
+)
+from modexp_cycle_model import modexp_cycles
+from rsa_test_vectors import find_input_files
+
+from key_values import KEY_E, KEY_D
+
+logger = logging.getLogger(__name__)
+
+
+def test_dispatcher_single_core():
+    """One core handles one message at a time, with the hand-off cycles in between"""
+
+    simulator = DispatcherSimulator(num_cores=1)
+    timings = simulator.run([100] * 4)
+
+    assert [timing.core for timing in timings] == [0] * 4
+    # valid_in, the modexp, storing the result, and the core is ready a cycle later
+    assert [timing.start for timing in timings] == [9, 112, 215, 318]
+    assert all(timing.output == timing.done for timing in timings)
+
+
+def test_dispatcher_round_robin():
+    timings = DispatcherSimulator(num_cores=3).run([1000] * 7)
+
+    assert [timing.core for timing in timings] == [0, 1, 2, 0, 1, 2, 0]
+    assert [timing.tag for timing in timings] == list(range(7))
+
+
+def test_dispatcher_output_order():
+    """A short message finishing first is held until the long one before it is out"""
+
+    timings = DispatcherSimulator(num_cores=2).run([1000, 10])
+
+    assert timings[1].done < timings[0].done
+    assert timings[1].output == timings[0].output + 8
+
+
+def test_dispatcher_stream_bound():
+    """With enough cores the 32-bit input stream limits the throughput"""
+
+    report = simulate_dispatcher([100] * 1000, num_cores=32)
+
+    assert report.messages_per_second == pytest.approx(100e6 / 8, rel=0.02)
+    assert report.max_reorder_occupancy <= 2
+
+
+def test_dispatcher_head_of_line_blocking():
+    """Mixing d and e messages leaves cores holding results for the slow ones"""
+
+    latency_e = modexp_cycles(KEY_E)
+    latency_d = modexp_cycles(KEY_D)
+
+    sorted_report = simulate_dispatcher([latency_d] * 70 + [latency_e] * 70)
+    mixed_report = simulate_dispatcher([latency_d, latency_e] * 70)
+
+    assert sorted_report.max_reorder_occupancy == 1
+    assert mixed_report.max_reorder_occupancy > 1
+    assert mixed_report.messages_per_second < sorted_report.messages_per_second
+    assert max(mixed_report.core_blocked) > max(sorted_report.core_blocked)
+
+
+def test_dispatcher_no_messages(tmp_path):
+    """An empty input gives an all-zero report instead of failing"""
+
+    header = find_input_files()[0].read_text().split("\n\n")[0]
+    path = tmp_path / "header_only.inp_messages.hex_in.txt"
+    path.write_text(header + "\n\n")
+
+    assert message_latencies([path]) == []
+
+    report = simulate_dispatcher(message_latencies([path]), num_cores=3)
+
+    assert report.num_messages == report.cycles == 0
+    assert report.messages_per_second == 0
+    assert report.core_utilization == report.core_blocked == [0.0] * 3
+    assert report.max_reorder_occupancy == 0
+    assert set(report.latency_percentiles.values()) == {0.0}
+    assert "Messages: 0" in repr(report)
+
+
+def test_message_latencies():
+    paths = [path for path in find_input_files() if "short_test" in path.name][:2]
+    latency_d, latency_e = modexp_cycles(KEY_D), modexp_cycles(KEY_E)
+
+    assert message_latencies(paths) == [latency_d] * 8
+    assert (
+        message_latencies(paths[-1:] + paths[:1], interleave=False) == [latency_d] * 8
+    )
+
+    paths = [paths[0], find_input_files()[-1]]
+
+    assert message_latencies(paths, interleave=True) == [latency_d, latency_e] * 4
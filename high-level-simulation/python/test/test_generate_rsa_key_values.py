@@ -0,0 +1,97 @@
+import logging
+import random
+
+import pytest
+
+from generate_rsa_key_values import (
+    gcd_extended,
+    generate_rsa_key_set,
+    get_n_0_prime,
+    get_rsa_key_values,
+    is_probable_prime,
+    select_limbs,
+)
+
+from key_values import KEY_N
+
+logger = logging.getLogger(__name__)
+
+
+def test_gcd_extended():
+    gcd, x, y = gcd_extended(240, 46)
+
+    assert gcd == 2
+    assert 240 * x + 46 * y == gcd
+
+
+def test_lab_n_0_prime():
+    """n'_0 for 32 bit limbs, as used by the systolic array testbench"""
+
+    assert get_n_0_prime(KEY_N, 32) == 0x8833C3BB
+    assert get_rsa_key_values(KEY_N, 32, 8).n_0_prime & 0xFFFFFFFF == 0x8833C3BB
+
+
+@pytest.mark.parametrize("k", [256, 2048, 4096])
+@pytest.mark.parametrize("w", [16, 32, 64])
+def test_rsa_key_values_large_keys(k, w):
+    """Key values can be derived for large keys without hitting the recursion limit"""
+
+    random.seed(k + w)
+    n = random.getrandbits(k) | (1 << (k - 1)) | 1
+
+    key_values = get_rsa_key_values(n, w, k // w)
+
+    assert 0 <= key_values.n_0_prime < key_values.r
+    assert (n * key_values.n_0_prime + 1) % key_values.r == 0
+    assert 0 <= key_values.r_inv < n
+    assert (key_values.r * key_values.r_inv) % n == 1
+    assert key_values.n_0_prime % (1 << w) == get_n_0_prime(n, w)
+
+
+def test_rsa_key_values_cached():
+    assert get_rsa_key_values(KEY_N, 32, 8) is get_rsa_key_values(KEY_N, 32, 8)
+
+
+def test_is_probable_prime():
+    primes = [x for x in range(2000) if is_probable_prime(x)]
+
+    assert primes[:10] == [2, 3, 5, 7, 11, 13, 17, 19, 23, 29]
+    assert len(primes) == 303
+
+    # Carmichael numbers and a Mersenne prime
+    assert not is_probable_prime(561 * 1009)
+    assert not is_probable_prime(41041 * 101 * 103)
+    assert is_probable_prime((1 << 127) - 1)
+
+
+@pytest.mark.parametrize("key_size", [16, 33, 256, 512, 1024])
+def test_generate_rsa_key_set(key_size):
+    key_set = generate_rsa_key_set(key_size, seed=key_size)
+
+    assert key_set.key_size == key_size
+    assert key_set.n == key_set.p * key_set.q
+    assert is_probable_prime(key_set.p) and is_probable_prime(key_set.q)
+    assert (key_set.e * key_set.d) % ((key_set.p - 1) * (key_set.q - 1)) == 1
+
+    message = random.Random(key_size).randrange(key_set.n)
+    encrypted = pow(message, key_set.e, key_set.n)
+
+    assert pow(encrypted, key_set.d, key_set.n) == message
+
+
+def test_generate_rsa_key_set_seeded():
+    assert generate_rsa_key_set(256, seed=1) == generate_rsa_key_set(256, seed=1)
+    assert generate_rsa_key_set(256, seed=1) != generate_rsa_key_set(256, seed=2)
+
+    with pytest.raises(ValueError):
+        generate_rsa_key_set(8)
+
+
+def test_select_limbs():
+    assert select_limbs(256) == (32, 8)
+    assert select_limbs(4096) == (32, 128)
+    assert select_limbs(1000) == (32, 32)
+    assert select_limbs(256, 16) == (16, 16)
+    # R > 4n needs two more bits
+    assert select_limbs(256, lazy_reduction=True) == (32, 9)
+    assert select_limbs(254, lazy_reduction=True) == (32, 8)
@@ -0,0 +1,63 @@
+import logging
+
+import pytest
+
+from key_size_scaling import (
+    get_key_set,
+    profile_backend,
+    profile_hardware,
+    scaling_exponent,
+)
+from modexp_cycle_model import modexp_cycles
+
+from key_values import KEY_E
+
+logger = logging.getLogger(__name__)
+
+
+@pytest.mark.parametrize(
+    "name, limbs",
+    [
+        ("pow", (0, 0)),
+        ("montgomery", (0, 0)),
+        ("cios", (32, 4)),
+        # Two more bits for R > 4n
+        ("cios_lazy", (32, 5)),
+        ("karatsuba", (32, 4)),
+    ],
+)
+def test_profile_backend(name, limbs):
+    """The limbs reported are the ones the backend uses, if it uses limbs"""
+
+    key_set = get_key_set(128)
+
+    result = profile_backend(name, key_set, repeat=2)
+
+    assert result.key_size == 128
+    assert (result.w, result.s) == limbs
+    assert result.latency > 0
+    assert result.peak_memory > 0
+
+
+def test_profile_hardware():
+    """The LAB sized key uses the 8 limbs and 33 instructions of the hardware"""
+
+    results = [profile_hardware(get_key_set(key_size)) for key_size in (256, 512)]
+
+    assert results[0].num_limbs == 8
+    assert results[0].num_pe == 3
+    assert results[0].modexp_cycles == modexp_cycles(KEY_E)
+    assert results[1].num_limbs == 17
+    assert results[1].modexp_cycles > results[0].modexp_cycles
+    assert results[1].latency > results[0].latency
+
+
+def test_scaling_exponent():
+    key_sizes = [512, 1024, 2048]
+
+    assert scaling_exponent(key_sizes, [k**2 * 1e-9 for k in key_sizes]) == (
+        pytest.approx(2)
+    )
+    assert scaling_exponent(key_sizes, [k**3 * 1e-9 for k in key_sizes]) == (
+        pytest.approx(3)
+    )
@@ -0,0 +1,197 @@
+import io
+import logging
+
+import pytest
+
+import main
+from main import (
+    calculate_rsa_keypair,
+    get_block_sizes,
+    encrypt_blocks,
+    decrypt_blocks,
+    encrypt_stream,
+    decrypt_stream,
+    encrypt_from_bytearray,
+    decrypt_from_bytearray,
+    transform_blocks,
+)
+from modexp_backends import ModexpBackend
+
+from key_values import KEY_N, KEY_D, KEY_E, LAB_MESSAGE, EXPECTED_ENCODED
+
+logger = logging.getLogger(__name__)
+
+MESSAGE = b"Hey, how are you doing this lovely evening?" * 5
+
+
+def rsa_pow(X: int, e: int, n: int):
+    return pow(X, e, n)
+
+
+def test_get_block_sizes():
+    """Plaintext blocks must be smaller than n, ciphertext blocks must hold n"""
+
+    assert get_block_sizes(KEY_N) == (31, 32)
+    assert get_block_sizes(61 * 53) == (1, 2)
+
+
+def test_encrypt_blocks_lab_message():
+    """A 256-bit block is encrypted the same way as in the hardware"""
+
+    message = LAB_MESSAGE.to_bytes(32, byteorder="little")
+
+    secret_message = transform_blocks(message, KEY_E, KEY_N, 32, 32, method=rsa_pow)
+
+    assert secret_message == EXPECTED_ENCODED.to_bytes(32, byteorder="little")
+
+
+@pytest.mark.parametrize("block_size", [32, 33])
+def test_encrypt_blocks_too_large(block_size):
+    """Blocks that can be larger than n would be reduced mod n"""
+
+    with pytest.raises(ValueError):
+        encrypt_blocks(MESSAGE, KEY_E, KEY_N, block_size=block_size, method=rsa_pow)
+
+    with pytest.raises(ValueError):
+        decrypt_blocks(bytes(64), KEY_D, KEY_N, block_size=block_size, method=rsa_pow)
+
+    with pytest.raises(ValueError):
+        transform_blocks(b"\xff" * 32, KEY_E, KEY_N, 32, 32, method=rsa_pow)
+
+
+def test_main_num_bits_too_large():
+    """A -k larger than the 8 bits of a block below n = 3233 is rejected"""
+
+    with pytest.raises(ValueError):
+        main.main(61, 53, 16, MESSAGE)
+
+
+@pytest.mark.parametrize("block_size", [None, 4, 31])
+def test_encrypt_decrypt_blocks(block_size):
+    """Encrypt and decrypt a message using blocks"""
+
+    secret_message = encrypt_blocks(
+        MESSAGE, KEY_E, KEY_N, block_size=block_size, method=rsa_pow
+    )
+    recovered_message = decrypt_blocks(
+        secret_message,
+        KEY_D,
+        KEY_N,
+        length=len(MESSAGE),
+        block_size=block_size,
+        method=rsa_pow,
+    )
+
+    assert len(secret_message) % 32 == 0
+    assert recovered_message == MESSAGE
+
+
+def test_encrypt_decrypt_stream():
+    """Encrypt and decrypt a stream, reading a few blocks at a time"""
+
+    secret_stream = io.BytesIO()
+    encrypt_stream(
+        io.BytesIO(MESSAGE),
+        secret_stream,
+        KEY_E,
+        KEY_N,
+        blocks_per_read=3,
+        method=rsa_pow,
+    )
+
+    recovered_stream = io.BytesIO()
+    decrypt_stream(
+        io.BytesIO(secret_stream.getvalue()),
+        recovered_stream,
+        KEY_D,
+        KEY_N,
+        blocks_per_read=2,
+        method=rsa_pow,
+    )
+
+    assert secret_stream.getvalue() == encrypt_blocks(
+        MESSAGE, KEY_E, KEY_N, method=rsa_pow
+    )
+    assert recovered_stream.getvalue()[: len(MESSAGE)] == MESSAGE
+
+
+class ShortReader(io.RawIOBase):
+    """A raw stream that returns at most 'chunk_size' bytes per read, like a pipe"""
+
+    def __init__(self, data: bytes, chunk_size: int):
+        self.data = io.BytesIO(data)
+        self.chunk_size = chunk_size
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        chunk = self.data.read(min(len(buffer), self.chunk_size))
+        buffer[: len(chunk)] = chunk
+        return len(chunk)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 5, 31, 40])
+def test_encrypt_decrypt_stream_short_reads(chunk_size):
+    """Blocks split over several reads are put together before the RSA"""
+
+    secret_stream = io.BytesIO()
+    num_bytes = encrypt_stream(
+        ShortReader(MESSAGE, chunk_size),
+        secret_stream,
+        KEY_E,
+        KEY_N,
+        blocks_per_read=3,
+        method=rsa_pow,
+    )
+
+    recovered_stream = io.BytesIO()
+    decrypt_stream(
+        ShortReader(secret_stream.getvalue(), chunk_size),
+        recovered_stream,
+        KEY_D,
+        KEY_N,
+        blocks_per_read=2,
+        method=rsa_pow,
+    )
+
+    assert num_bytes == len(MESSAGE)
+    assert secret_stream.getvalue() == encrypt_blocks(
+        MESSAGE, KEY_E, KEY_N, method=rsa_pow
+    )
+    assert recovered_stream.getvalue()[: len(MESSAGE)] == MESSAGE
+
+
+def test_encrypt_decrypt_from_bytearray():
+    """Encrypt and decrypt one byte at a time"""
+
+    n, e, d = calculate_rsa_keypair(61, 53)
+
+    secret_message = encrypt_from_bytearray(MESSAGE, e, n, method=rsa_pow)
+    recovered_message = decrypt_from_bytearray(secret_message, d, n, method=rsa_pow)
+
+    assert len(secret_message) == 2 * len(MESSAGE)
+    assert recovered_message == MESSAGE
+
+
+@pytest.mark.parametrize("batching", [False, True])
+def test_main_crt_uses_backend(monkeypatch, batching):
+    """With CRT the half size modexps are run by the selected backend"""
+
+    moduli = []
+
+    def modexp(M, e, n):
+        moduli.append(n)
+        return pow(M, e, n)
+
+    def modexp_many(messages, e, n):
+        return [modexp(M, e, n) for M in messages]
+
+    backend = ModexpBackend(
+        name="spy", modexp=modexp, modexp_many=modexp_many if batching else None
+    )
+    monkeypatch.setattr(main, "get_backend", lambda name: backend)
+
+    main.main(61, 53, None, MESSAGE, "spy", use_crt=True)
+
+    assert 61 in moduli and 53 in moduli
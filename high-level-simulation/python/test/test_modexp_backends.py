@@ -0,0 +1,100 @@
+import logging
+
+import pytest
+
+from generate_rsa_key_values import generate_rsa_key_set
+from main import encrypt_blocks, decrypt_blocks
+from modexp_backends import (
+    BACKENDS,
+    ModexpBackend,
+    get_backend,
+    register_backend,
+    run_backend,
+)
+
+from key_values import KEY_N, KEY_D, KEY_E, LAB_MESSAGE, EXPECTED_ENCODED
+
+logger = logging.getLogger(__name__)
+
+SECOND_MESSAGE = 0x8888888899999999AAAAAAAABBBBBBBBCCCCCCCCDDDDDDDDEEEEEEEEFFFFFFFF
+SECOND_EXPECTED_ENCODED = (
+    0x4DD5E8DFDA5DA31A8881B3FDD37DD9F3A5009F1354CD078E5C2C49B54CCB5F3F
+)
+
+
+@pytest.mark.parametrize("name", list(BACKENDS))
+def test_backend_lab_message(name):
+    """Every backend encrypts the lab message to the expected value"""
+
+    backend = get_backend(name)
+
+    assert backend.modexp(LAB_MESSAGE, KEY_E, KEY_N) == EXPECTED_ENCODED
+
+
+@pytest.mark.parametrize("name", list(BACKENDS))
+def test_run_backend(name):
+    """A batch gives the same result as one message at a time"""
+
+    backend = get_backend(name)
+
+    encoded = run_backend(backend, [LAB_MESSAGE, SECOND_MESSAGE], KEY_E, KEY_N)
+
+    assert encoded == [EXPECTED_ENCODED, SECOND_EXPECTED_ENCODED]
+
+
+@pytest.mark.parametrize("name", list(BACKENDS))
+@pytest.mark.parametrize("key_size", [512, 1024])
+def test_backend_random_key(name, key_size):
+    """Every backend works with keys bigger than the LAB key"""
+
+    key_set = generate_rsa_key_set(key_size, seed=key_size)
+    message = key_set.n // 3
+
+    encrypted = get_backend(name).modexp(message, key_set.e, key_set.n)
+
+    assert encrypted == pow(message, key_set.e, key_set.n)
+
+
+def test_batched_backend_decrypt():
+    backend = get_backend("cios_batched")
+
+    assert backend.supports_batching
+
+    decoded = run_backend(
+        backend, [EXPECTED_ENCODED, SECOND_EXPECTED_ENCODED], KEY_D, KEY_N
+    )
+
+    assert decoded == [LAB_MESSAGE, SECOND_MESSAGE]
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        get_backend("unknown")
+
+
+def test_register_duplicate_backend():
+    with pytest.raises(ValueError):
+        register_backend(ModexpBackend(name="pow", modexp=pow))
+
+
+def test_encrypt_blocks_batched():
+    """The block codec hands all blocks to a batching backend at once"""
+
+    backend = get_backend("cios_batched")
+    message = b"Hey, how are you doing this lovely evening?" * 3
+
+    secret_message = encrypt_blocks(
+        message, KEY_E, KEY_N, method=backend.modexp, method_many=backend.modexp_many
+    )
+
+    assert secret_message == encrypt_blocks(message, KEY_E, KEY_N)
+
+    recovered_message = decrypt_blocks(
+        secret_message,
+        KEY_D,
+        KEY_N,
+        length=len(message),
+        method_many=backend.modexp_many,
+    )
+
+    assert recovered_message == message
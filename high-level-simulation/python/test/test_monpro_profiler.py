@@ -0,0 +1,147 @@
+import logging
+import pstats
+
+import pytest
+
+import montgomery
+import montgomery_monpro_cios
+from generate_rsa_key_values import get_rsa_key_values
+from modexp_backends import get_backend
+from modexp_schedule import binary_monpro_count, constant_time_monpro_count
+from monpro_profiler import MonproKind, MonproProfiler
+
+from key_values import KEY_N, KEY_D, KEY_E, LAB_MESSAGE
+
+logger = logging.getLogger(__name__)
+
+
+@pytest.mark.parametrize("backend_name", ["montgomery", "cios", "cios_systolic_array"])
+@pytest.mark.parametrize("e", [KEY_E, KEY_D])
+def test_profiler_monpro_counts(backend_name, e):
+    """The monpros match the schedule of montgomery_modexp2"""
+
+    expected = binary_monpro_count(e, 256, skip_leading_zeros=True)
+
+    with MonproProfiler() as profiler:
+        get_backend(backend_name).modexp(LAB_MESSAGE, e, KEY_N)
+
+    counts = profiler.monpro_counts
+
+    assert counts[MonproKind.SQUARE] == expected["squarings"]
+    assert counts[MonproKind.MULTIPLY] == expected["multiplications"]
+    assert counts[MonproKind.TO_MONTGOMERY] == 2
+    assert counts[MonproKind.FROM_MONTGOMERY] == 1
+    assert 0 < profiler.counters["final_subtractions"] < sum(counts.values())
+
+
+@pytest.mark.parametrize("backend_name", ["montgomery", "cios", "cios_systolic_array"])
+def test_profiler_monpro_counts_message_one(backend_name):
+    """
+    With M = 1, M_bar equals C_bar after the first multiplication, which looks
+    like a squaring, and monpro(M_bar, C_bar) looks like the conversion out of
+    the montgomery domain at the start, so the kind has to come from the loop
+    """
+
+    expected = binary_monpro_count(KEY_E, 256, skip_leading_zeros=True)
+
+    with MonproProfiler() as profiler:
+        assert get_backend(backend_name).modexp(1, KEY_E, KEY_N) == 1
+
+    counts = profiler.monpro_counts
+
+    assert counts[MonproKind.SQUARE] == expected["squarings"] == 17
+    assert counts[MonproKind.MULTIPLY] == expected["multiplications"] == 2
+    assert counts[MonproKind.TO_MONTGOMERY] == 2
+    assert counts[MonproKind.FROM_MONTGOMERY] == 1
+    assert profiler.counters["unknown_kind_monpros"] == 0
+
+
+def test_profiler_monpro_outside_modexp():
+    """A monpro called on its own does not belong to any state of the modexp"""
+
+    key_values = get_rsa_key_values(KEY_N, 256)
+
+    with MonproProfiler() as profiler:
+        montgomery.montgomery_modexp(LAB_MESSAGE, KEY_E, KEY_N, key_values)
+        montgomery.montgomery_monpro(LAB_MESSAGE, LAB_MESSAGE, key_values)
+
+    assert profiler.counters["unknown_kind_monpros"] == 1
+    assert profiler.monpro_counts[MonproKind.SQUARE] == 256
+
+
+@pytest.mark.parametrize(
+    "backend_name, limb_macs_per_monpro",
+    [
+        # 2 carry_sum per limb of the outer and inner loop, and 2 for the top limbs
+        ("cios", 2 * 8 * 8 + 2 * 8),
+        # alpha, gamma, two in beta, alpha_final and gamma_final per outer loop
+        ("cios_systolic_array", (2 * 8 + 3) * 8),
+    ],
+)
+def test_profiler_limb_macs(backend_name, limb_macs_per_monpro):
+    with MonproProfiler() as profiler:
+        get_backend(backend_name).modexp(LAB_MESSAGE, KEY_E, KEY_N)
+
+    num_monpros = sum(profiler.monpro_counts.values())
+
+    assert profiler.counters["limb_macs"] == num_monpros * limb_macs_per_monpro
+
+
+@pytest.mark.parametrize(
+    "backend_name", ["montgomery_ladder", "montgomery_always_multiply", "cios_ladder"]
+)
+def test_profiler_constant_time(backend_name):
+    """The constant time modes do the same monpros for every exponent"""
+
+    expected = constant_time_monpro_count(256)
+
+    for e in (KEY_E, KEY_D, 0):
+        with MonproProfiler() as profiler:
+            get_backend(backend_name).modexp(LAB_MESSAGE, e, KEY_N)
+
+        assert sum(profiler.monpro_counts.values()) == expected["total"]
+
+
+@pytest.mark.parametrize("backend_name", ["montgomery_lazy", "cios_lazy"])
+def test_profiler_lazy_reduction(backend_name):
+    """Only the conversion out of the montgomery domain compares with n"""
+
+    with MonproProfiler() as profiler:
+        get_backend(backend_name).modexp(LAB_MESSAGE, KEY_D, KEY_N)
+
+    num_monpros = sum(profiler.monpro_counts.values())
+
+    assert profiler.counters["lazy_monpros"] == num_monpros - 1
+    assert profiler.counters["final_subtractions"] <= 1
+
+
+def test_profiler_disabled():
+    """The original functions are put back, so nothing is counted when disabled"""
+
+    carry_sum = montgomery_monpro_cios.carry_sum
+    profiler = MonproProfiler()
+
+    with profiler:
+        assert montgomery_monpro_cios.carry_sum is not carry_sum
+
+    assert montgomery_monpro_cios.carry_sum is carry_sum
+
+    get_backend("cios").modexp(LAB_MESSAGE, KEY_E, KEY_N)
+
+    assert not profiler.counters
+    assert not profiler.stats
+
+
+def test_profiler_pstats(tmp_path):
+    with MonproProfiler() as profiler:
+        get_backend("cios_systolic_array").modexp(LAB_MESSAGE, KEY_E, KEY_N)
+
+    profiler.dump_stats(tmp_path / "modexp.prof")
+    stats = pstats.Stats(str(tmp_path / "modexp.prof"))
+
+    calls = {function: values[1] for (_, _, function), values in stats.stats.items()}
+
+    assert calls["montgomery_monpro_cios_systolic_array"] == 22
+    assert calls["alpha"] == 22 * 8 * 8
+    assert stats.total_calls == sum(s.calls for s in profiler.stats.values())
+    assert "final subtractions" in profiler.report()
@@ -3,14 +3,35 @@ import logging
 import pytest
 import numpy as np
 
-from generate_rsa_key_values import get_rsa_key_values, RsaKeyValues
-from montgomery import montgomery_monpro
-from montgomery_monpro_cios import to_limbs, from_limbs, montgomery_monpro_cios
-from montgomery_monpro_cios_systolic_array import montgomery_monpro_cios_systolic_array
+from generate_rsa_key_values import (
+    generate_rsa_key_set,
+    get_rsa_key_values,
+    RsaKeyValues,
+)
+from montgomery import (
+    montgomery_monpro,
+    montgomery_monpro_branch_free,
+    montgomery_monpro_lazy,
+)
+from montgomery_monpro_cios import (
+    MontgomeryContext,
+    get_montgomery_context,
+    to_limbs,
+    from_limbs,
+    to_limb_matrix,
+    from_limb_matrix,
+    bytes_to_limb_matrix,
+    limb_matrix_to_bytes,
+    montgomery_monpro_cios,
+)
+from montgomery_monpro_cios_batched import montgomery_monpro_cios_batched
+from montgomery_monpro_cios_systolic_array import (
+    montgomery_monpro_cios_systolic_array,
+    montgomery_monpro_cios_systolic_array_verbose,
+)
 
 from key_values import KEY_N, KEY_D, KEY_E, LAB_MESSAGE, EXPECTED_ENCODED
 
-
 logger = logging.getLogger(__name__)
 
 
@@ -114,6 +135,8 @@ def test_montgomery_monpro(a, b, key_values):
         (LAB_MESSAGE, EXPECTED_ENCODED, 8, 32),
         (LAB_MESSAGE, EXPECTED_ENCODED, 4, 64),
         (LAB_MESSAGE, EXPECTED_ENCODED, 2, 128),
+        (LAB_MESSAGE, EXPECTED_ENCODED, 32, 8),
+        (KEY_N - 1, KEY_N - 2, 32, 8),
     ],
 )
 def test_montgomery_monpro_cios(a, b, w, s):
@@ -185,3 +208,259 @@ def test_compare_monpro_methods(a, b, w, s):
     logger.info(f"Expected answer: {hex(expected_ans)}")
 
     assert expected_ans == ans == ans_cios
+
+
+@pytest.mark.parametrize(
+    "w, s",
+    [
+        (32, 8),
+        (16, 16),
+        (8, 32),
+        (4, 64),
+    ],
+)
+def test_montgomery_monpro_cios_batched(w, s):
+    """Compare the batched CIOS implementation against standard montgomery monpro"""
+    assert w * s == 256
+
+    key_values = get_rsa_key_values(KEY_N, 256)
+    key_values_cios = get_rsa_key_values(KEY_N, w, s)
+
+    a = [
+        0xBADEBABE,
+        0xDEAD,
+        LAB_MESSAGE,
+        EXPECTED_ENCODED,
+        0x73D53F95B4325E7CFAD52F428ECA37D8ACDF13C0DCA05CCAEA42DB7051457988,
+        KEY_N - 1,
+    ]
+    b = a[::-1]
+
+    ans = montgomery_monpro_cios_batched(
+        to_limb_matrix(a, s, w),
+        to_limb_matrix(b, s, w),
+        w,
+        s,
+        key_values_cios.n,
+        key_values_cios.n_0_prime,
+    )
+
+    assert ans.shape == (len(a), s)
+
+    expected_ans = [montgomery_monpro(x, y, key_values) for x, y in zip(a, b)]
+
+    assert from_limb_matrix(ans, w) == expected_ans
+
+
+def test_montgomery_monpro_cios_batched_shared_operand():
+    """Check that a single limb vector can be used as operand for the whole batch"""
+
+    key_values = get_rsa_key_values(KEY_N, 32, 8)
+
+    a = [LAB_MESSAGE, EXPECTED_ENCODED, 0xDEADBEEF]
+
+    ans = montgomery_monpro_cios_batched(
+        to_limb_matrix(a, 8, 32),
+        to_limbs(key_values.r2_mod_n, 8, 32),
+        32,
+        8,
+        key_values.n,
+        key_values.n_0_prime,
+    )
+
+    assert from_limb_matrix(ans, 32) == [(x * key_values.r) % KEY_N for x in a]
+
+
+@pytest.mark.parametrize("w, s", [(32, 8), (27, 10), (16, 16), (8, 32)])
+def test_montgomery_context(w, s):
+    """Monpro using pre-split limbs of n and reused scratch buffers"""
+
+    key_values = get_rsa_key_values(KEY_N, w, s)
+    context = MontgomeryContext.from_key_values(key_values)
+
+    assert context.n.dtype == np.uint64
+    assert context.n_0_prime == key_values.n_0_prime % (1 << w)
+
+    out = np.empty(s, dtype=np.uint64)
+    for a, b in [
+        (LAB_MESSAGE, EXPECTED_ENCODED),
+        (KEY_N - 1, KEY_N - 1),
+        (0xDEADBEEF, 0),
+    ]:
+        ans = context.monpro(context.to_limbs(a), context.to_limbs(b), out=out)
+
+        assert ans is out
+        assert context.from_limbs(ans) == (a * b * key_values.r_inv) % KEY_N
+
+
+def test_montgomery_context_word_size():
+    with pytest.raises(ValueError):
+        MontgomeryContext(KEY_N, 64, 4)
+
+
+@pytest.mark.parametrize("w, s", [(32, 8), (16, 16), (8, 33)])
+def test_montgomery_context_domain(w, s):
+    """Conversion into and out of the montgomery domain"""
+
+    key_values = get_rsa_key_values(KEY_N, w, s)
+    context = get_montgomery_context(KEY_N, w, s)
+
+    assert context.r_mod_n == key_values.r % KEY_N
+    assert context.r2_mod_n == key_values.r2_mod_n
+    assert context.key_values == key_values
+
+    M_bar = context.to_montgomery(LAB_MESSAGE)
+
+    assert context.from_limbs(M_bar) == LAB_MESSAGE * key_values.r % KEY_N
+    assert context.from_limbs(context.to_montgomery(1)) == context.r_mod_n
+    assert context.from_montgomery(M_bar) == LAB_MESSAGE
+
+
+def test_montgomery_monpro_branch_free(key_values):
+    """The branch free final subtraction gives the same result as the branch"""
+
+    context = get_montgomery_context(KEY_N, 32, 8)
+    context_branch_free = get_montgomery_context(KEY_N, 32, 8, branch_free=True)
+
+    assert context_branch_free.branch_free and not context.branch_free
+
+    # The last pair needs the final subtraction, the second one does not
+    for a, b in [
+        (LAB_MESSAGE, EXPECTED_ENCODED),
+        (0, KEY_N - 1),
+        (1, 1),
+        (KEY_N - 1, KEY_N - 1),
+        (KEY_N - 1, key_values.r2_mod_n),
+    ]:
+        expected = montgomery_monpro(a, b, key_values)
+
+        assert montgomery_monpro_branch_free(a, b, key_values) == expected
+        assert context_branch_free.from_limbs(
+            context_branch_free.monpro(
+                context_branch_free.to_limbs(a), context_branch_free.to_limbs(b)
+            )
+        ) == context.from_limbs(
+            context.monpro(context.to_limbs(a), context.to_limbs(b))
+        )
+
+
+@pytest.mark.parametrize("w, s", [(32, 9), (16, 17)])
+def test_montgomery_monpro_lazy(w, s):
+    """Without the final subtraction inputs below 2n give results below 2n"""
+
+    key_values = get_rsa_key_values(KEY_N, w, s)
+    context = get_montgomery_context(KEY_N, w, s)
+
+    for a, b in [
+        (LAB_MESSAGE, EXPECTED_ENCODED),
+        (2 * KEY_N - 1, 2 * KEY_N - 1),
+        (2 * KEY_N - 1, key_values.r2_mod_n),
+        (0, KEY_N),
+    ]:
+        expected = a * b * key_values.r_inv % KEY_N
+
+        ans = montgomery_monpro_lazy(a, b, key_values)
+        ans_limbs = context.from_limbs(
+            context.monpro_lazy(context.to_limbs(a), context.to_limbs(b))
+        )
+
+        assert ans == ans_limbs
+        assert ans < 2 * KEY_N
+        assert ans % KEY_N == expected
+
+
+def test_montgomery_context_cache():
+    """Contexts are shared by key, and the least recently used ones are evicted"""
+
+    get_montgomery_context.cache_clear()
+
+    context = get_montgomery_context(KEY_N, 32, 8)
+
+    assert get_montgomery_context(KEY_N, 32, 8) is context
+    assert get_montgomery_context(KEY_N, 16, 16) is not context
+    assert MontgomeryContext.from_key_values(get_rsa_key_values(KEY_N, 32, 8)) is (
+        context
+    )
+
+    maxsize = get_montgomery_context.cache_info().maxsize
+    for i in range(maxsize):
+        get_montgomery_context(KEY_N + 2 * (i + 1), 32, 8)
+
+    assert get_montgomery_context.cache_info().currsize == maxsize
+    assert get_montgomery_context(KEY_N, 32, 8) is not context
+
+
+@pytest.mark.parametrize("w, s", [(32, 8), (16, 16), (8, 32), (4, 64), (64, 4)])
+def test_limb_matrix(w, s):
+    """Check that a list of integers is converted to an (N, s) matrix and back"""
+
+    values = [LAB_MESSAGE, EXPECTED_ENCODED, KEY_N, 0, 0xDEAD]
+
+    limbs = to_limb_matrix(values, s, w)
+
+    assert limbs.shape == (len(values), s)
+    assert limbs.dtype == np.uint64
+    assert limbs[0, 0] == LAB_MESSAGE & (2**w - 1)
+    assert from_limb_matrix(limbs, w) == values
+
+
+@pytest.mark.parametrize("byteorder", ["big", "little"])
+def test_bytes_to_limb_matrix(byteorder):
+    """Blocks of 256-bit in a byte buffer are split into 32-bit limbs"""
+
+    values = [LAB_MESSAGE, EXPECTED_ENCODED, KEY_N]
+    data = b"".join(x.to_bytes(32, byteorder=byteorder) for x in values)
+
+    limbs = bytes_to_limb_matrix(data, 32, 32, byteorder=byteorder)
+
+    assert limbs.shape == (3, 8)
+    assert from_limb_matrix(limbs, 32) == values
+    assert limb_matrix_to_bytes(limbs, 32, byteorder=byteorder) == data
+
+
+def test_bytes_to_limb_matrix_invalid():
+    with pytest.raises(ValueError):
+        bytes_to_limb_matrix(bytes(33), 32, 32)
+
+    with pytest.raises(ValueError):
+        bytes_to_limb_matrix(bytes(32), 12, 32)
+
+
+@pytest.mark.parametrize("w, s", [(16, 16), (32, 17)])
+def test_systolic_array_verbose(w, s):
+    """The verbose monpro is not limited to the 16 limbs it was unrolled for"""
+
+    key_set = generate_rsa_key_set(w * s, seed=s)
+    key_values = get_rsa_key_values(key_set.n, w, s)
+    a, b = key_set.n // 3, key_set.n // 5
+
+    result = montgomery_monpro_cios_systolic_array_verbose(
+        a, b, w, s, key_set.n, key_values.n_0_prime
+    )
+
+    assert from_limbs(result, w) == a * b * key_values.r_inv % key_set.n
+
+
+@pytest.mark.parametrize("w, s", [(32, 8), (32, 9)])
+def test_systolic_array_all_ones(w, s):
+    """All-ones 32-bit limbs keep every bit, as T holds unsigned integers"""
+
+    n = (1 << (w * s)) - 1
+    key_values = get_rsa_key_values(n, w, s)
+    a = b = n - 1
+
+    expected = a * b * key_values.r_inv % n
+
+    assert (
+        montgomery_monpro_cios_systolic_array(a, b, w, s, n, key_values.n_0_prime)
+        == expected
+    )
+    assert (
+        from_limbs(
+            montgomery_monpro_cios_systolic_array_verbose(
+                a, b, w, s, n, key_values.n_0_prime
+            ),
+            w,
+        )
+        == expected
+    )
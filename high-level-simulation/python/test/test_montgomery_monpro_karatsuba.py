@@ -0,0 +1,79 @@
+import random
+import logging
+
+import pytest
+
+from generate_rsa_key_values import get_rsa_key_values
+from montgomery_monpro_cios import from_limbs
+from montgomery_monpro_karatsuba import (
+    from_limb_list,
+    karatsuba_multiply,
+    karatsuba_multiply_low,
+    karatsuba_square,
+    montgomery_modexp,
+    montgomery_monpro_karatsuba,
+    to_limb_list,
+)
+
+from key_values import KEY_N, KEY_E, KEY_D, LAB_MESSAGE, EXPECTED_ENCODED
+
+logger = logging.getLogger(__name__)
+
+
+@pytest.mark.parametrize("w", [32, 16, 3])
+@pytest.mark.parametrize("s", [1, 2, 3, 4, 5, 7, 16, 33, 64])
+@pytest.mark.parametrize("threshold", [1, 4, 32])
+def test_karatsuba_multiply(w, s, threshold):
+    rng = random.Random(4141 + s)
+    top = (1 << (w * s)) - 1
+
+    for a, b in [(top, top), (rng.getrandbits(w * s), rng.getrandbits(w * s))]:
+        a_limbs, b_limbs = to_limb_list(a, s, w), to_limb_list(b, s, w)
+
+        product = karatsuba_multiply(a_limbs, b_limbs, w, threshold)
+        square = karatsuba_square(a_limbs, w, threshold)
+        low = karatsuba_multiply_low(a_limbs, b_limbs, w, threshold)
+
+        assert len(product) == len(square) == 2 * s
+        assert len(low) == s
+        assert from_limb_list(product, w) == a * b
+        assert from_limb_list(square, w) == a * a
+        assert from_limb_list(low, w) == a * b & top
+
+
+@pytest.mark.parametrize("w, s", [(32, 8), (16, 16), (8, 33), (4, 64), (3, 86)])
+@pytest.mark.parametrize("threshold", [1, 8, 32])
+def test_karatsuba_monpro(w, s, threshold):
+    key_values = get_rsa_key_values(KEY_N, w, s)
+    r_inv = pow(key_values.r, -1, KEY_N)
+    rng = random.Random(4141)
+
+    for a, b in [(KEY_N - 1, KEY_N - 1)] + [
+        (rng.randrange(KEY_N), rng.randrange(KEY_N)) for _ in range(4)
+    ]:
+        result = montgomery_monpro_karatsuba(
+            a, b, w, s, KEY_N, key_values.n_0_prime, threshold
+        )
+
+        assert from_limbs(result, w) == a * b * r_inv % KEY_N
+
+
+@pytest.mark.parametrize("threshold", [1, 32])
+def test_karatsuba_modexp(threshold):
+    encoded = montgomery_modexp(
+        LAB_MESSAGE, KEY_E, KEY_N, 32, 8, skip_leading_zeros=True, threshold=threshold
+    )
+    decoded = montgomery_modexp(encoded, KEY_D, KEY_N, 32, 8, threshold=threshold)
+
+    assert encoded == EXPECTED_ENCODED
+    assert decoded == LAB_MESSAGE
+
+
+def test_karatsuba_modexp_large_key():
+    """Above the threshold, a 2048-bit key splits its products"""
+
+    rng = random.Random(4141)
+    n = rng.getrandbits(2048) | (1 << 2047) | 1
+    M = rng.randrange(n)
+
+    assert montgomery_modexp(M, 0x10001, n, 32, 64) == pow(M, 0x10001, n)
@@ -0,0 +1,92 @@
+import random
+import logging
+
+import pytest
+
+from generate_rsa_key_values import get_rsa_key_values
+from modexp_cycle_model import MONPRO_HANDSHAKE_CYCLES, resource_bound_monpro_cycles
+from montgomery_monpro_cios import from_limbs
+from montgomery_monpro_variants import (
+    OpCounts,
+    VARIANTS,
+    get_variant,
+    measure_op_counts,
+    montgomery_monpro_cihs,
+)
+
+from key_values import KEY_N
+
+logger = logging.getLogger(__name__)
+
+
+@pytest.mark.parametrize("name", list(VARIANTS))
+@pytest.mark.parametrize("w, s", [(32, 8), (16, 16), (8, 33), (4, 64), (3, 86)])
+def test_variant_monpro(name, w, s):
+    """Every variant gives a * b * r^-1 mod n"""
+
+    if name == "cihs" and s >= 1 << w:
+        pytest.skip("CIHS needs fewer than 2^w limbs")
+
+    monpro = get_variant(name)
+    key_values = get_rsa_key_values(KEY_N, w, s)
+    r_inv = pow(key_values.r, -1, KEY_N)
+    rng = random.Random(4141)
+
+    for a, b in [(0, 0), (KEY_N - 1, KEY_N - 1)] + [
+        (rng.randrange(KEY_N), rng.randrange(KEY_N)) for _ in range(8)
+    ]:
+        result = monpro(a, b, w, s, KEY_N, key_values.n_0_prime)
+
+        assert from_limbs(result, w) == a * b * r_inv % KEY_N
+
+
+@pytest.mark.parametrize(
+    "name, scratch_words", [("sos", 2 * 8 + 1), ("cios", 8 + 2), ("fios", 8 + 2)]
+)
+def test_variant_op_counts(name, scratch_words):
+    """All variants do s^2 products of a * b, s^2 of m * n and s for m"""
+
+    s = 8
+    counts = measure_op_counts(name, KEY_N, 32, s, num_trials=4)
+
+    assert counts.multiplications == 2 * s**2 + s
+    assert counts.scratch_words == scratch_words
+    assert counts.reads > counts.multiplications
+    assert counts.writes > 0
+
+
+def test_variant_counts_accumulate():
+    key_values = get_rsa_key_values(KEY_N, 32, 8)
+    counts = OpCounts()
+
+    for _ in range(2):
+        get_variant("cios")(1, 2, 32, 8, KEY_N, key_values.n_0_prime, counts)
+
+    assert counts.multiplications == 2 * (2 * 8**2 + 8)
+
+
+def test_cihs_too_many_limbs():
+    key_values = get_rsa_key_values(KEY_N, 2, 128)
+
+    with pytest.raises(ValueError):
+        montgomery_monpro_cihs(1, 2, 2, 128, KEY_N, key_values.n_0_prime)
+
+
+def test_unknown_variant():
+    with pytest.raises(ValueError):
+        get_variant("karatsuba")
+
+
+def test_resource_bound_monpro_cycles():
+    assert resource_bound_monpro_cycles(136, 60, 30, 4) == (
+        34 + MONPRO_HANDSHAKE_CYCLES,
+        "multiplier",
+    )
+    assert resource_bound_monpro_cycles(136, 400, 50, 4) == (
+        200 + MONPRO_HANDSHAKE_CYCLES,
+        "read",
+    )
+    assert resource_bound_monpro_cycles(136, 40, 51, 136, write_ports=2) == (
+        26 + MONPRO_HANDSHAKE_CYCLES,
+        "write",
+    )
@@ -0,0 +1,121 @@
+import logging
+
+import pytest
+
+import parallel_modexp
+from main import (
+    calculate_rsa_keypair,
+    encrypt_blocks,
+    decrypt_blocks,
+    encrypt_from_bytearray,
+    decrypt_from_bytearray,
+)
+from modexp_backends import ModexpBackend
+from parallel_modexp import ParallelModexp, _init_worker, _run_shard
+from rsa_crt import get_rsa_crt_key_values
+
+from key_values import KEY_N, KEY_D, KEY_E
+
+logger = logging.getLogger(__name__)
+
+MESSAGE = b"Hey, how are you doing this lovely evening?" * 50
+
+
+@pytest.fixture(scope="module")
+def pool() -> ParallelModexp:
+    with ParallelModexp(KEY_N, num_workers=2, shard_size=7) as pool:
+        yield pool
+
+
+def test_parallel_modexp_order(pool):
+    """Results come back in the order of the blocks, not the order they finish"""
+
+    blocks = list(range(100))
+
+    assert pool(blocks, KEY_E, KEY_N) == [pow(X, KEY_E, KEY_N) for X in blocks]
+    assert pool([], KEY_E, KEY_N) == []
+
+
+def test_parallel_modexp_other_modulus(pool):
+    with pytest.raises(ValueError):
+        pool([1], KEY_E, KEY_N - 2)
+
+
+def test_parallel_encrypt_decrypt_blocks(pool):
+    secret_message = encrypt_blocks(MESSAGE, KEY_E, KEY_N, method_many=pool)
+    recovered_message = decrypt_blocks(
+        secret_message, KEY_D, KEY_N, length=len(MESSAGE), method_many=pool
+    )
+
+    assert secret_message == encrypt_blocks(MESSAGE, KEY_E, KEY_N)
+    assert recovered_message == MESSAGE
+
+
+@pytest.mark.parametrize("backend_name", ["pow", "cios_batched"])
+def test_parallel_encrypt_decrypt_from_bytearray(backend_name):
+    n, e, d = calculate_rsa_keypair(61, 53)
+
+    with ParallelModexp(n, backend_name, num_workers=2, shard_size=16) as pool:
+        secret_message = encrypt_from_bytearray(MESSAGE, e, n, method_many=pool)
+        recovered_message = decrypt_from_bytearray(
+            secret_message, d, n, method_many=pool
+        )
+
+    assert secret_message == encrypt_from_bytearray(MESSAGE, e, n)
+    assert recovered_message == MESSAGE
+
+
+def test_parallel_crt_decrypt():
+    p, q = 61, 53
+    n, e, d = calculate_rsa_keypair(p, q)
+
+    secret_message = encrypt_from_bytearray(MESSAGE, e, n)
+
+    crt_key_values = get_rsa_crt_key_values(p, q, d)
+    with ParallelModexp(n, num_workers=2, crt_key_values=crt_key_values) as pool:
+        recovered_message = decrypt_from_bytearray(
+            secret_message, d, n, method_many=pool
+        )
+
+    assert recovered_message == MESSAGE
+
+
+def test_parallel_crt_backend(monkeypatch):
+    """A CRT shard runs its half size modexps on the worker's backend"""
+
+    p, q = 61, 53
+    n, e, d = calculate_rsa_keypair(p, q)
+    moduli = set()
+
+    def modexp(M, e, n):
+        moduli.add(n)
+        return pow(M, e, n)
+
+    monkeypatch.setattr(
+        parallel_modexp,
+        "get_backend",
+        lambda name: ModexpBackend(name="spy", modexp=modexp),
+    )
+    monkeypatch.setattr(parallel_modexp, "_worker", {})
+
+    _init_worker(n, "spy", get_rsa_crt_key_values(p, q, d))
+
+    blocks = [pow(M, e, n) for M in range(100)]
+
+    assert _run_shard(blocks, d) == list(range(100))
+    assert moduli == {p, q}
+
+
+def test_parallel_crt_other_exponent():
+    p, q = 61, 53
+    n, _, d = calculate_rsa_keypair(p, q)
+
+    crt_key_values = get_rsa_crt_key_values(p, q, d)
+    with ParallelModexp(n, num_workers=1, crt_key_values=crt_key_values) as pool:
+        with pytest.raises(ValueError):
+            pool([1], d + 1, n)
+
+
+def test_parallel_modexp_unknown_backend():
+    with pytest.raises(ValueError):
+        ParallelModexp(KEY_N, "unknown")
@@ -1,12 +1,39 @@
 import logging
 
+import pytest
+
 from generate_rsa_key_values import get_rsa_key_values
 
-from montgomery import montgomery_modexp
-from montgomery_monpro_cios import montgomery_modexp as montgomery_modexp_cios
+from montgomery import (
+    montgomery_modexp,
+    montgomery_modexp_constant_time,
+    montgomery_modexp_window,
+)
+from modexp_schedule import (
+    binary_monpro_count,
+    constant_time_monpro_count,
+    lazy_reduction_count,
+    window_monpro_count,
+    count_skipped_squarings,
+)
+from modexp_cycle_model import (
+    constant_time_modexp_cycles,
+    lazy_modexp_cycles,
+    modexp_cycles,
+    monpro_cycles,
+)
+from montgomery_monpro_cios import (
+    get_montgomery_context,
+    montgomery_modexp as montgomery_modexp_cios,
+    montgomery_modexp_constant_time as montgomery_modexp_constant_time_cios,
+)
 from montgomery_monpro_cios_systolic_array import (
     montgomery_modexp as montgomery_modexp_cios_systolic_array,
 )
+from montgomery_monpro_karatsuba import (
+    montgomery_modexp as montgomery_modexp_karatsuba,
+)
+from montgomery_modexp_many import modexp_many
 
 logger = logging.getLogger(__name__)
 
@@ -19,6 +46,12 @@ KEY_D = 0x0CEA1651EF44BE1F1F1476B7539BED10D73E3AAC782BD9999A1E5A790932BFE9
 LAB_MESSAGE = 0x0000000011111111222222223333333344444444555555556666666677777777
 EXPECTED_ENCODED = 0x23026C469918F5EA097F843DC5D5259192F9D3510415841CE834324F4C237AC7
 
+# Message and expected result used in the cocotb testbench of the modexp
+SECOND_MESSAGE = 0x8888888899999999AAAAAAAABBBBBBBBCCCCCCCCDDDDDDDDEEEEEEEEFFFFFFFF
+SECOND_EXPECTED_ENCODED = (
+    0x4DD5E8DFDA5DA31A8881B3FDD37DD9F3A5009F1354CD078E5C2C49B54CCB5F3F
+)
+
 
 def test_rsa_montgomery():
     """Test RSA with montgomery modexp algorithm
@@ -97,3 +130,255 @@ def test_rsa_montgomery_cios_systolic_array():
     # Then the expected encrypted message is:
     assert encoded == EXPECTED_ENCODED
     assert original_message == decoded
+
+
+@pytest.mark.parametrize(
+    "modexp",
+    [
+        lambda M, e, context: montgomery_modexp(M, e, KEY_N, context=context),
+        lambda M, e, context: montgomery_modexp_cios(
+            M, e, KEY_N, context.w, context.s, context=context
+        ),
+        lambda M, e, context: montgomery_modexp_cios_systolic_array(
+            M, e, KEY_N, context.w, context.s, context=context
+        ),
+    ],
+    ids=["montgomery", "cios", "cios_systolic_array"],
+)
+def test_rsa_montgomery_context(modexp):
+    """Every modexp module should take the key from a montgomery context"""
+
+    context = get_montgomery_context(KEY_N, 32, 8)
+
+    encoded = modexp(LAB_MESSAGE, KEY_E, context)
+    decoded = modexp(encoded, KEY_D, context)
+
+    assert encoded == EXPECTED_ENCODED
+    assert decoded == LAB_MESSAGE
+
+
+@pytest.mark.parametrize(
+    "backend, w, s",
+    [
+        ("montgomery", 256, 1),
+        ("cios", 16, 16),
+        ("cios_systolic_array", 32, 8),
+        ("cios_batched", 32, 8),
+        ("cios_batched", 16, 16),
+    ],
+)
+def test_rsa_modexp_many(backend, w, s):
+    """Test RSA on a batch of messages sharing the same exponent"""
+
+    rsa_key_values = get_rsa_key_values(KEY_N, w, s)
+
+    original_messages = [LAB_MESSAGE, SECOND_MESSAGE, LAB_MESSAGE]
+
+    encoded = modexp_many(original_messages, KEY_E, rsa_key_values, backend=backend)
+    decoded = modexp_many(encoded, KEY_D, rsa_key_values, backend=backend)
+
+    logger.info(f"Encoded messages: {[hex(x) for x in encoded]}")
+
+    assert encoded == [EXPECTED_ENCODED, SECOND_EXPECTED_ENCODED, EXPECTED_ENCODED]
+    assert decoded == original_messages
+
+
+def test_rsa_modexp_many_unknown_backend():
+    """Check that an unknown backend is reported"""
+
+    rsa_key_values = get_rsa_key_values(KEY_N, 256)
+
+    with pytest.raises(ValueError):
+        modexp_many([LAB_MESSAGE], KEY_E, rsa_key_values, backend="does-not-exist")
+
+
+@pytest.mark.parametrize("mode", ["sliding", "fixed"])
+@pytest.mark.parametrize("window_size", [None, 1, 2, 4, 5])
+def test_rsa_montgomery_window(mode, window_size):
+    """Test RSA with the window montgomery modexp algorithm"""
+
+    rsa_key_values = get_rsa_key_values(KEY_N, word_size=256)
+
+    encoded = montgomery_modexp_window(
+        LAB_MESSAGE, KEY_E, KEY_N, rsa_key_values, window_size, mode
+    )
+    decoded = montgomery_modexp_window(
+        encoded, KEY_D, KEY_N, rsa_key_values, window_size, mode
+    )
+
+    assert encoded == EXPECTED_ENCODED
+    assert decoded == LAB_MESSAGE
+
+
+def test_window_monpro_count():
+    """The window method should use fewer monpros than binary for decryption"""
+
+    binary = binary_monpro_count(KEY_D, 256)
+    window = window_monpro_count(KEY_D)
+
+    logger.info(f"Binary: {binary}")
+    logger.info(f"Window: {window}")
+
+    assert window["total"] < binary["total"]
+    assert window["multiplications"] < binary["multiplications"]
+
+
+def test_rsa_skip_leading_zeros():
+    """Starting at the most significant set bit should not change the result"""
+
+    rsa_key_values = get_rsa_key_values(KEY_N, 16, 16)
+
+    encoded = montgomery_modexp(
+        LAB_MESSAGE, KEY_E, KEY_N, rsa_key_values, skip_leading_zeros=True
+    )
+    encoded_cios = montgomery_modexp_cios(
+        LAB_MESSAGE, KEY_E, KEY_N, 16, 16, rsa_key_values, skip_leading_zeros=True
+    )
+    encoded_many = modexp_many(
+        [LAB_MESSAGE], KEY_E, rsa_key_values, skip_leading_zeros=True
+    )
+
+    assert encoded == encoded_cios == EXPECTED_ENCODED
+    assert encoded_many == [EXPECTED_ENCODED]
+
+    assert count_skipped_squarings(KEY_E, 256) == 239
+
+
+@pytest.mark.parametrize(
+    "modexp",
+    [
+        lambda w, s, **kwargs: montgomery_modexp(
+            LAB_MESSAGE, KEY_E, KEY_N, get_rsa_key_values(KEY_N, w, s), **kwargs
+        ),
+        lambda w, s, **kwargs: montgomery_modexp_cios(
+            LAB_MESSAGE, KEY_E, KEY_N, w, s, **kwargs
+        ),
+        lambda w, s, **kwargs: montgomery_modexp_cios_systolic_array(
+            LAB_MESSAGE, KEY_E, KEY_N, w, s, **kwargs
+        ),
+        lambda w, s, **kwargs: montgomery_modexp_karatsuba(
+            LAB_MESSAGE, KEY_E, KEY_N, w, s, **kwargs
+        ),
+    ],
+)
+@pytest.mark.parametrize("w, s, skipped", [(32, 8, 239), (32, 9, 271)])
+def test_rsa_skipped_squarings(modexp, w, s, skipped):
+    """The skipped squarings are returned, counted from R = 2^(w * s)"""
+
+    assert modexp(w, s, skip_leading_zeros=True, return_skipped=True) == (
+        EXPECTED_ENCODED,
+        skipped,
+    )
+    assert modexp(w, s, return_skipped=True) == (EXPECTED_ENCODED, 0)
+
+
+def test_modexp_cycle_model():
+    """The cycle model should follow the monpro count of montgomery_modexp2"""
+
+    # Two conversions, 17 squarings, 2 multiplications and one conversion back
+    assert modexp_cycles(KEY_E) == 1 + (3 + 17 + 2) * monpro_cycles()
+
+    assert (
+        modexp_cycles(KEY_E, skip_leading_zeros=False) - modexp_cycles(KEY_E)
+        == 239 * monpro_cycles()
+    )
+
+
+@pytest.mark.parametrize("mode", ["ladder", "always_multiply"])
+@pytest.mark.parametrize(
+    "modexp",
+    [
+        lambda M, e, mode: montgomery_modexp_constant_time(
+            M, e, KEY_N, get_rsa_key_values(KEY_N, 256), mode
+        ),
+        lambda M, e, mode: montgomery_modexp_constant_time_cios(
+            M, e, KEY_N, 32, 8, mode
+        ),
+        lambda M, e, mode: montgomery_modexp_constant_time_cios(
+            M, e, KEY_N, 8, 33, mode
+        ),
+    ],
+    ids=["montgomery", "cios", "cios_8_33"],
+)
+def test_rsa_montgomery_constant_time(modexp, mode):
+    """Test RSA with the montgomery ladder and square and always multiply"""
+
+    encoded = modexp(LAB_MESSAGE, KEY_E, mode)
+    decoded = modexp(encoded, KEY_D, mode)
+
+    assert encoded == EXPECTED_ENCODED
+    assert decoded == LAB_MESSAGE
+
+    assert modexp(LAB_MESSAGE, 0, mode) == 1
+    assert modexp(LAB_MESSAGE, 1, mode) == LAB_MESSAGE
+
+
+def test_rsa_montgomery_constant_time_invalid():
+    rsa_key_values = get_rsa_key_values(KEY_N, 256)
+
+    with pytest.raises(ValueError):
+        montgomery_modexp_constant_time(
+            LAB_MESSAGE, KEY_E, KEY_N, rsa_key_values, mode="does-not-exist"
+        )
+    with pytest.raises(ValueError):
+        montgomery_modexp_constant_time(LAB_MESSAGE, 1 << 256, KEY_N, rsa_key_values)
+
+
+def test_constant_time_modexp_cycles():
+    """Every bit of the key costs a squaring and a multiplication"""
+
+    assert constant_time_monpro_count(256)["total"] == 2 * 256 + 3
+    assert constant_time_modexp_cycles(256) == 1 + (2 * 256 + 3) * monpro_cycles()
+    assert constant_time_modexp_cycles(256) > modexp_cycles(KEY_D)
+
+
+@pytest.mark.parametrize(
+    "modexp",
+    [
+        lambda M, e, k: montgomery_modexp(
+            M, e, KEY_N, get_rsa_key_values(KEY_N, k), lazy_reduction=True
+        ),
+        lambda M, e, k: montgomery_modexp_cios(
+            M, e, KEY_N, 16, k // 16, lazy_reduction=True
+        ),
+    ],
+    ids=["montgomery", "cios"],
+)
+@pytest.mark.parametrize("k", [272, 288])
+def test_rsa_montgomery_lazy_reduction(modexp, k):
+    """Keeping the intermediate results in [0, 2n) should not change the result"""
+
+    encoded = modexp(LAB_MESSAGE, KEY_E, k)
+    decoded = modexp(encoded, KEY_D, k)
+
+    assert encoded == EXPECTED_ENCODED
+    assert decoded == LAB_MESSAGE
+
+    assert modexp(0, KEY_E, k) == 0
+    assert modexp(KEY_N - 1, KEY_D, k) == pow(KEY_N - 1, KEY_D, KEY_N)
+
+
+def test_rsa_montgomery_lazy_reduction_invalid():
+    """R = 2^256 is not larger than 4n for the 256 bit LAB key"""
+
+    with pytest.raises(ValueError):
+        montgomery_modexp(
+            LAB_MESSAGE,
+            KEY_E,
+            KEY_N,
+            get_rsa_key_values(KEY_N, 256),
+            lazy_reduction=True,
+        )
+    with pytest.raises(ValueError):
+        montgomery_modexp_cios(LAB_MESSAGE, KEY_E, KEY_N, 32, 8, lazy_reduction=True)
+
+
+def test_lazy_modexp_cycles():
+    counts = lazy_reduction_count(KEY_E, 256, skip_leading_zeros=True)
+
+    assert counts == {"compares": 22, "lazy_compares": 1, "eliminated": 21}
+
+    # 258 bits need 11 limbs of 32 bits, instead of 8, which costs more than
+    # the cycle saved in every monpro
+    assert lazy_modexp_cycles(KEY_E) == 1 + 22 * (4 * 11 + 1 + 2) + 1
+    assert lazy_modexp_cycles(KEY_E) > modexp_cycles(KEY_E)
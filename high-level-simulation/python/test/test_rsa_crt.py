@@ -0,0 +1,79 @@
+import logging
+
+import pytest
+
+from generate_rsa_key_values import get_rsa_key_values
+from montgomery import montgomery_modexp
+from rsa_crt import get_rsa_crt_key_values, crt_decrypt, crt_decrypt_many
+
+logger = logging.getLogger(__name__)
+
+
+# Mersenne primes 2^127 - 1 and 2^107 - 1
+PRIME_P = (1 << 127) - 1
+PRIME_Q = (1 << 107) - 1
+
+KEY_N = PRIME_P * PRIME_Q
+KEY_E = 0x10001
+KEY_D = pow(KEY_E, -1, (PRIME_P - 1) * (PRIME_Q - 1))
+
+MESSAGES = [
+    0x11111111222222223333333344444444555555556666666677777777,
+    0x8888888899999999AAAAAAAABBBBBBBBCCCCCCCCDDDDDDDDEEEEEEEE,
+    0xDEADBEEF,
+    0,
+    1,
+]
+
+
+@pytest.mark.parametrize("message", MESSAGES)
+def test_rsa_crt_decrypt(message):
+    """Decrypting with CRT should give the same result as the full size modexp"""
+
+    rsa_key_values = get_rsa_key_values(KEY_N, KEY_N.bit_length())
+    crt_key_values = get_rsa_crt_key_values(PRIME_P, PRIME_Q, KEY_D)
+
+    encoded = montgomery_modexp(message, KEY_E, KEY_N, rsa_key_values)
+    decoded = crt_decrypt(encoded, crt_key_values)
+
+    logger.info(f"Encoded message: {hex(encoded)}")
+    logger.info(f"Decoded message: {hex(decoded)}")
+
+    assert decoded == message
+
+
+@pytest.mark.parametrize("backend", ["montgomery", "cios_batched"])
+def test_rsa_crt_decrypt_many(backend):
+    """Decrypt a batch of messages with CRT"""
+
+    crt_key_values = get_rsa_crt_key_values(PRIME_P, PRIME_Q, KEY_D, 32, 4)
+
+    encoded = [pow(message, KEY_E, KEY_N) for message in MESSAGES]
+
+    assert crt_decrypt_many(encoded, crt_key_values, backend=backend) == MESSAGES
+
+
+def test_rsa_crt_decrypt_many_modexp_many():
+    """A modexp backend can run the two half size batches"""
+
+    crt_key_values = get_rsa_crt_key_values(PRIME_P, PRIME_Q, KEY_D)
+    moduli = set()
+
+    def modexp_many(messages, e, n):
+        moduli.add(n)
+        return [pow(M, e, n) for M in messages]
+
+    encoded = [pow(message, KEY_E, KEY_N) for message in MESSAGES]
+
+    assert crt_decrypt_many(encoded, crt_key_values, method_many=modexp_many) == (
+        MESSAGES
+    )
+    assert moduli == {PRIME_P, PRIME_Q}
+
+
+def test_rsa_crt_key_values_are_cached():
+    """The CRT values should only be calculated once per key"""
+
+    assert get_rsa_crt_key_values(PRIME_P, PRIME_Q, KEY_D) is get_rsa_crt_key_values(
+        PRIME_P, PRIME_Q, KEY_D
+    )
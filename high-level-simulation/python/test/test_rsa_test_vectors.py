@@ -0,0 +1,111 @@
+import io
+import logging
+
+import pytest
+
+from modexp_backends import get_backend
+from rsa_test_vectors import (
+    Command,
+    MessageFileHeader,
+    MessageFileWriter,
+    count_blocks,
+    find_input_files,
+    get_output_path,
+    read_header,
+    read_message_file,
+    run_message_file,
+    write_message_file,
+)
+
+from key_values import KEY_N, KEY_E, KEY_D
+
+logger = logging.getLogger(__name__)
+
+INPUT_FILES = find_input_files()
+SHORT_INPUT_FILES = [path for path in INPUT_FILES if "short_test" in path.name]
+
+
+def test_read_header():
+    assert len(INPUT_FILES) == 12
+
+    header = read_header(SHORT_INPUT_FILES[-1])
+
+    assert (header.key_n, header.key_e, header.key_d) == (KEY_N, KEY_E, KEY_D)
+    assert header.command == Command.ENCRYPT
+    assert header.exponent == KEY_E
+    assert count_blocks(SHORT_INPUT_FILES[-1]) == 4
+
+
+def test_read_header_missing(tmp_path):
+    path = tmp_path / "test_in.txt"
+    path.write_text("# KEY N\n99\n# COMMAND\n1\n\n00\n")
+
+    with pytest.raises(ValueError):
+        read_header(path)
+
+
+def test_get_output_path():
+    path = get_output_path(SHORT_INPUT_FILES[-1])
+
+    assert path.name == "short_test.otp_messages.hex_ct2_out.txt"
+    assert path.exists()
+
+
+@pytest.mark.parametrize("batch_size", [1, 3, 1024])
+def test_read_message_file(batch_size):
+    path = SHORT_INPUT_FILES[0]
+    batches = list(read_message_file(path, batch_size))
+
+    assert batches[0] == read_header(path)
+    assert all(len(batch) <= batch_size for batch in batches[1:])
+    assert sum(len(batch) for batch in batches[1:]) == count_blocks(path)
+
+    # Output files have no header
+    batches = list(read_message_file(get_output_path(path), batch_size))
+
+    assert batches[0] is None
+    assert sum(len(batch) for batch in batches[1:]) == count_blocks(path)
+
+
+@pytest.mark.parametrize("path", INPUT_FILES[:1] + SHORT_INPUT_FILES)
+def test_write_message_file(tmp_path, path):
+    """Reading and writing a file gives the same bytes back"""
+
+    batches = read_message_file(path, 5)
+    header = next(batches)
+
+    write_message_file(tmp_path / "test_in.txt", batches, header)
+
+    assert (tmp_path / "test_in.txt").read_bytes() == path.read_bytes()
+
+
+def test_message_file_writer():
+    f = io.StringIO()
+    header = MessageFileHeader(KEY_N, KEY_E, KEY_D, Command.DECRYPT)
+
+    writer = MessageFileWriter(f, header)
+    writer.write([1, 2])
+    writer.write([])
+    writer.write([KEY_N])
+
+    lines = f.getvalue().split("\n")
+
+    assert lines[:2] == ["# KEY N", f"{KEY_N:064x}"]
+    assert lines[6:9] == ["# COMMAND", "0", ""]
+    assert lines[9:] == [f"{1:064x}", f"{2:064x}", f"{KEY_N:064x}"]
+    assert writer.num_blocks == 3
+
+
+@pytest.mark.parametrize("path", SHORT_INPUT_FILES)
+def test_run_message_file(path):
+    """The batched backend gives the expected output of the hardware testbench"""
+
+    backend = get_backend("cios_batched")
+
+    results = run_message_file(path, backend.modexp_many, batch_size=3)
+    expected = read_message_file(get_output_path(path))
+    next(expected)
+
+    assert [x for batch in results for x in batch] == [
+        x for batch in expected for x in batch
+    ]
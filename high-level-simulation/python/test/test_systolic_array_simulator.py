@@ -0,0 +1,263 @@
+import sys
+import random
+import logging
+import subprocess
+import importlib.util
+
+import pytest
+
+from systolic_array_simulator import (
+    INSTRUCTION_PKG_PATH,
+    NUM_LIMBS,
+    NUM_PE,
+    SystolicArraySimulator,
+    State,
+    decode_instruction,
+    load_instruction_rom,
+    run_random_operands,
+)
+import modexp_cycle_model
+from modexp_cycle_model import (
+    NUM_MONPRO_INSTRUCTIONS,
+    get_num_instructions,
+    get_num_limbs,
+)
+
+from generate_rsa_key_values import (
+    generate_rsa_key_set,
+    get_n_0_prime,
+    get_rsa_key_values,
+)
+
+from key_values import KEY_N
+
+logger = logging.getLogger(__name__)
+
+GENERATE_INSTRUCTION_SET_PATH = (
+    INSTRUCTION_PKG_PATH.parents[2] / "scripts" / "generate_instruction_set.py"
+)
+
+# Values from montgomery_monpro_systolic_array_tb.py
+LAB_KEY_N_PRIME = 0x8833C3BB
+LAB_INPUT_A = 0x0000000011111111222222223333333344444444555555556666666677777777
+LAB_INPUT_B = 0x56DDF8B43061AD3DBCD1757244D1A19E2E8C849DDE4817E55BB29D1C20C06364
+LAB_EXPECTED_RESULT = 0x8ABE76B2CF6E603497A8BA867EDDC580B943F5690777E388FAE627E05449851A
+
+EXPECTED_BETA_M = [
+    0x150EA394,
+    0x5257A149,
+    0x3F146A58,
+    0x907D544E,
+    0x195752EE,
+    0xBF39F894,
+    0x1162587E,
+    0xE748676F,
+]
+
+
+@pytest.fixture(scope="module")
+def simulator() -> SystolicArraySimulator:
+    yield SystolicArraySimulator()
+
+
+def test_load_instruction_rom():
+    rom = load_instruction_rom()
+
+    assert len(rom) == NUM_MONPRO_INSTRUCTIONS
+    assert rom[1] == decode_instruction(0b010111110001001001)
+    assert rom[1].alpha_a == 1
+    assert rom[1].gamma_n == 1
+
+
+def test_simulator_configuration(simulator):
+    """The simulator is set up like the cycle model and the instruction ROM"""
+
+    assert NUM_LIMBS == get_num_limbs() == simulator.num_limbs == 8
+    assert NUM_PE == simulator.num_pe == 3
+
+
+def test_simulator_lab_values(simulator):
+    """Same result and beta m values as the cocotb testbench expects"""
+
+    result = simulator.monpro(
+        LAB_INPUT_A, LAB_INPUT_B, KEY_N, LAB_KEY_N_PRIME, trace=True
+    )
+
+    assert result.u == LAB_EXPECTED_RESULT
+    assert result.cycles == NUM_MONPRO_INSTRUCTIONS
+    assert result.trace[-1]["beta_m"] == EXPECTED_BETA_M
+    assert result.trace[-1]["state"] == State.IDLE
+
+
+@pytest.mark.parametrize(
+    "a, b, expected",
+    [
+        (
+            0x8ABE76B2CF6E603497A8BA867EDDC580B943F5690777E388FAE627E05449851A,
+            0x61DD65C6CF9D5CDAC7A55013F065678E4580B069817FA98DBB772EDA623B92FC,
+            0x6261B7082F228B5C46106884D6ED9D3177D09D2DE0CA87FAE1E80AA5A0966312,
+        ),
+        (
+            0x6261B7082F228B5C46106884D6ED9D3177D09D2DE0CA87FAE1E80AA5A0966312,
+            0x1,
+            0x23026C469918F5EA097F843DC5D5259192F9D3510415841CE834324F4C237AC7,
+        ),
+    ],
+)
+def test_simulator_back_to_back(simulator, a, b, expected):
+    """Values left in the pipeline by the previous monpro do not affect the result"""
+
+    assert simulator.monpro(a, b, KEY_N, LAB_KEY_N_PRIME).u == expected
+
+
+def test_simulator_random_operands():
+    mismatches, cycles_per_monpro = run_random_operands(KEY_N, 200, seed=4141)
+
+    assert mismatches == []
+    assert cycles_per_monpro == NUM_MONPRO_INSTRUCTIONS + 2
+
+
+def simulator_modexp(simulator, M, e, n):
+    """Left-to-right binary modexp from the leftmost one, like montgomery_modexp2"""
+
+    key_values = get_rsa_key_values(n, simulator.limb_width, simulator.num_limbs)
+    n_prime = get_n_0_prime(n, simulator.limb_width)
+
+    def monpro(a, b):
+        return simulator.monpro(a, b, n, n_prime).u
+
+    M_bar = monpro(M, key_values.r2_mod_n)
+    C_bar = monpro(1, key_values.r2_mod_n)
+    for bit in f"{e:b}":
+        C_bar = monpro(C_bar, C_bar)
+        if bit == "1":
+            C_bar = monpro(M_bar, C_bar)
+
+    return monpro(C_bar, 1)
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+@pytest.mark.parametrize(
+    "narrower_bits",
+    [
+        pytest.param(
+            0,
+            marks=pytest.mark.xfail(
+                strict=True,
+                reason="ST_CHECK_RESULT only compares the most significant limb "
+                "against n, which misses the final subtraction for n above R / 2",
+            ),
+        ),
+        1,
+    ],
+)
+def test_simulator_random_keys(simulator, seed, narrower_bits):
+    """
+    The random keys of test_random_keys and test_random_keys_below_half_r
+    in montgomery_modexp_tb.py
+    """
+
+    key_set = generate_rsa_key_set(simulator.data_width - narrower_bits, seed=seed)
+    message = random.Random(seed).randrange(2, key_set.n)
+    encrypted = pow(message, key_set.e, key_set.n)
+
+    assert simulator_modexp(simulator, message, key_set.e, key_set.n) == encrypted
+    assert simulator_modexp(simulator, encrypted, key_set.d, key_set.n) == message
+
+
+def load_generator():
+    """Import generate_instruction_set.py, which is a script outside of src"""
+
+    spec = importlib.util.spec_from_file_location(
+        "generate_instruction_set", GENERATE_INSTRUCTION_SET_PATH
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    return module
+
+
+def test_generator_matches_cycle_model():
+    """The generator defines the hardware parameters itself, they have to agree"""
+
+    generator = load_generator()
+
+    for name in ("BLOCK_SIZE", "LIMB_WIDTH", "MONPRO_HANDSHAKE_CYCLES", "NUM_PHASES"):
+        assert getattr(generator, name) == getattr(modexp_cycle_model, name), name
+
+    for num_limbs in range(1, 65):
+        assert generator.get_num_pe(num_limbs) == modexp_cycle_model.get_num_pe(
+            num_limbs
+        )
+        assert generator.get_num_instructions(
+            num_limbs
+        ) == modexp_cycle_model.get_num_instructions(num_limbs)
+
+    for block_size in (64, 256, 512, 1024):
+        for limb_width in (8, 16, 24, 32):
+            _, num_limbs = generator.get_configuration(block_size, limb_width)
+            assert num_limbs == get_num_limbs(block_size, limb_width)
+
+
+@pytest.mark.parametrize("num_pe", [1, 2, 3, 4, 6])
+def test_generated_num_instructions(tmp_path, num_pe):
+    """The cycle model counts the instructions the generator writes"""
+
+    num_limbs = 3 * num_pe - 1
+    path = tmp_path / "instruction_pkg.vhd"
+
+    result = subprocess.run(
+        [
+            sys.executable,
+            GENERATE_INSTRUCTION_SET_PATH,
+            "--block-size",
+            str(num_limbs * 32),
+            "--output",
+            path,
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+
+    assert len(load_instruction_rom(path)) == get_num_instructions(num_limbs)
+    assert f"Instructions: {get_num_instructions(num_limbs)}" in result.stdout
+
+
+@pytest.mark.parametrize("num_pe, limb_width", [(1, 32), (2, 32), (4, 24), (6, 16)])
+def test_simulator_generated_schedule(tmp_path, num_pe, limb_width):
+    """Schedules made by generate_instruction_set.py for other array sizes"""
+
+    num_limbs = 3 * num_pe - 1
+    path = tmp_path / "instruction_pkg.vhd"
+
+    subprocess.run(
+        [
+            sys.executable,
+            GENERATE_INSTRUCTION_SET_PATH,
+            "--block-size",
+            str(num_limbs * limb_width),
+            "--limb-width",
+            str(limb_width),
+            "--output",
+            path,
+        ],
+        check=True,
+        capture_output=True,
+    )
+
+    simulator = SystolicArraySimulator(load_instruction_rom(path), limb_width)
+
+    assert simulator.num_pe == num_pe
+    assert simulator.num_limbs == num_limbs
+    assert simulator.num_instructions == 4 * num_limbs + 1
+
+    # Keep n below R / 2, the result is only compared to n in the top limb
+    random.seed(num_pe)
+    n = random.getrandbits(simulator.data_width - 2) | (
+        1 << (simulator.data_width - 2) | 1
+    )
+
+    mismatches, _ = run_random_operands(n, 100, seed=num_pe, simulator=simulator)
+
+    assert mismatches == []
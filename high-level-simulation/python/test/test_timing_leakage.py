@@ -0,0 +1,54 @@
+import logging
+
+import numpy as np
+import pytest
+
+from timing_leakage import T_THRESHOLD, max_cropped_t, measure_leakage, welch_t
+
+logger = logging.getLogger(__name__)
+
+
+def test_welch_t():
+    rng = np.random.default_rng(4141)
+
+    x = rng.normal(1.0, 0.1, 1000)
+    y = rng.normal(1.0, 0.1, 1000)
+
+    assert abs(welch_t(x, y)) < T_THRESHOLD
+    assert welch_t(x + 0.05, y) > T_THRESHOLD
+    assert welch_t(x, x) == 0.0
+    assert welch_t(x[:1], y) == 0.0
+
+
+def test_max_cropped_t():
+    """A small difference hidden by a long tail is found after cropping"""
+
+    rng = np.random.default_rng(4141)
+
+    x = rng.normal(1.0, 0.01, 2000)
+    y = rng.normal(1.01, 0.01, 2000)
+    x[::10] += rng.exponential(100.0, 200)
+    y[::10] += rng.exponential(100.0, 200)
+
+    assert abs(welch_t(x, y)) < T_THRESHOLD
+    assert max_cropped_t(x, y) > T_THRESHOLD
+
+
+def test_measure_leakage():
+    """The binary method leaks the exponent, the ladder should leak much less"""
+
+    binary = measure_leakage("montgomery", num_measurements=200, batch_size=50)
+    ladder = measure_leakage("montgomery_ladder", num_measurements=200, batch_size=50)
+
+    logger.info(binary)
+    logger.info(ladder)
+
+    assert binary.num_measurements == ladder.num_measurements == 200
+    assert binary.leaks
+    assert ladder.t < binary.t
+    assert ladder.modexps_per_second < binary.modexps_per_second
+
+
+def test_measure_leakage_unknown_secret():
+    with pytest.raises(ValueError):
+        measure_leakage("pow", secret="does-not-exist")
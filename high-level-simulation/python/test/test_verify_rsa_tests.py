@@ -0,0 +1,59 @@
+import shutil
+import logging
+
+import pytest
+
+from rsa_test_vectors import TEST_VECTOR_PATH, find_input_files, get_output_path
+from verify_rsa_tests import verify_file, verify_files
+
+logger = logging.getLogger(__name__)
+
+
+@pytest.fixture
+def short_tests(tmp_path):
+    """A copy of the short test suite that can be modified"""
+
+    shutil.copytree(TEST_VECTOR_PATH / "short_tests", tmp_path / "short_tests")
+    yield find_input_files(tmp_path)
+
+
+@pytest.mark.parametrize("backend_name", ["pow", "cios_batched"])
+def test_verify_files(short_tests, backend_name):
+    results = verify_files(short_tests, backend_name, max_workers=2)
+
+    assert [result.path for result in results] == short_tests
+    assert all(result.passed for result in results)
+    assert sum(result.num_blocks for result in results) == 24
+
+
+def test_verify_file_mismatch(short_tests):
+    output_path = get_output_path(short_tests[0])
+    lines = output_path.read_text().split("\n")
+    output_path.write_text("\n".join([lines[0], lines[0]] + lines[2:]))
+
+    result = verify_file(short_tests[0])
+
+    assert not result.passed
+    assert result.mismatches == [1]
+
+    # One block too few is reported as well
+    output_path.write_text("\n".join(lines[:-1]))
+
+    assert verify_file(short_tests[0]).mismatches == [3]
+
+
+def test_verify_file_missing(short_tests):
+    get_output_path(short_tests[0]).unlink()
+
+    assert verify_file(short_tests[0]).missing
+
+
+def test_verify_file_regenerate(short_tests):
+    output_path = get_output_path(short_tests[0])
+    expected = output_path.read_bytes()
+    output_path.unlink()
+
+    result = verify_file(short_tests[0], regenerate=True)
+
+    assert result.num_blocks == 4
+    assert output_path.read_bytes() == expected
@@ -1,17 +1,24 @@
 """CocoTB testbench for montgomery modexp implementation"""
 
+import random
 import logging
 
 import cocotb
 from cocotb.clock import Clock
 from cocotb.triggers import RisingEdge
 
+from generate_rsa_key_values import generate_rsa_key_set, get_rsa_key_values
+from modexp_cycle_model import get_num_limbs
+
 logger = logging.getLogger(__name__)
 
 CLK_FREQUENCY_HZ = 100e6
 CLK_PERIOD_S = 1 / CLK_FREQUENCY_HZ
 CLK_PERIOD_NS = CLK_PERIOD_S * 1e9
 
+# GC_LIMB_WIDTH of montgomery_modexp2
+LIMB_WIDTH = 32
+
 # Values used during testing in the LAB
 LAB_MESSAGE = 0x0000000011111111222222223333333344444444555555556666666677777777
 LAB_KEY_ENCRYPT = 0x0000000000000000000000000000000000000000000000000000000000010001
@@ -79,3 +86,83 @@ async def test_encryptdecrypt(dut, test_data):
     dut.ready_out.value = 1
     await RisingEdge(dut.clk)
     dut.ready_out.value = 0
+
+
+# Known bug of the systolic array. The LAB key is above R / 2 as well,
+# its values just never hit it
+CHECK_RESULT_TOP_LIMB_BUG = (
+    "ST_CHECK_RESULT only compares the most significant limb against n, "
+    "which misses the final subtraction for n above R / 2"
+)
+
+
+async def run_random_key(dut, key_bits: int, seed: int):
+    """Encrypt and decrypt a random message with a random key of 'key_bits' bits"""
+
+    cocotb.start_soon(Clock(dut.clk, CLK_PERIOD_NS, unit="ns").start())
+
+    block_size = len(dut.n.value)
+    key_set = generate_rsa_key_set(key_bits, seed=seed)
+    # R = 2^(w * s), with the limbs the systolic array is padded to
+    key_values = get_rsa_key_values(
+        key_set.n, LIMB_WIDTH, get_num_limbs(block_size, LIMB_WIDTH)
+    )
+
+    message = random.Random(seed).randrange(2, key_set.n)
+    encrypted = pow(message, key_set.e, key_set.n)
+
+    await RisingEdge(dut.clk)
+    dut.reset_n.value = 1
+    await RisingEdge(dut.clk)
+
+    for key, input_message, expected_message in (
+        (key_set.e, message, encrypted),
+        (key_set.d, encrypted, message),
+    ):
+        dut.message.value = input_message
+        dut.key.value = key
+        dut.n.value = key_set.n
+        dut.n_prime.value = key_values.n_0_prime & ((1 << block_size) - 1)
+        dut.r_stuff.value = key_values.r2_mod_n
+
+        while int(dut.ready_in.value) == 0:
+            await RisingEdge(dut.clk)
+
+        dut.valid_in.value = 1
+        await RisingEdge(dut.clk)
+        dut.valid_in.value = 0
+
+        await RisingEdge(dut.clk)
+
+        await RisingEdge(dut.valid_out)
+
+        dut._log.info("Output value: 0x%X", dut.result.value)
+        dut._log.info("Expected output value: 0x%X", expected_message)
+
+        assert dut.result.value == expected_message
+
+        dut.ready_out.value = 1
+        await RisingEdge(dut.clk)
+        dut.ready_out.value = 0
+
+
+@cocotb.test(expect_fail=True)
+@cocotb.parametrize(seed=[0, 1, 2])
+async def test_random_keys(dut, seed):
+    """
+    Encrypt and decrypt with a random key as wide as the n input of the DUT
+
+    Expected to fail, see CHECK_RESULT_TOP_LIMB_BUG.
+    """
+
+    dut._log.info("Expected failure: %s", CHECK_RESULT_TOP_LIMB_BUG)
+
+    await run_random_key(dut, len(dut.n.value), seed)
+
+
+@cocotb.test()
+@cocotb.parametrize(seed=[0, 1, 2])
+async def test_random_keys_below_half_r(dut, seed):
+    """Encrypt and decrypt with a random key one bit narrower than n"""
+
+    await run_random_key(dut, len(dut.n.value) - 1, seed)
@@ -5,6 +5,7 @@ import logging
 import cocotb
 from cocotb.clock import Clock
 from cocotb.triggers import RisingEdge, Timer
+from modexp_cycle_model import get_num_instructions
 from montgomery_monpro_cios import to_limbs
 
 logger = logging.getLogger(__name__)
@@ -56,11 +57,13 @@ async def test_loading_input(dut):
 
     await RisingEdge(dut.clk)
 
+    num_limbs = len(dut.s_a.value)
+
     s_a = [hex(int(val)) for val in dut.s_a.value]
-    s_a_expected = [hex(int(val)) for val in to_limbs(LAB_INPUT_A, 8, 32)]
+    s_a_expected = [hex(int(val)) for val in to_limbs(LAB_INPUT_A, num_limbs, 32)]
 
     s_b = [hex(int(val)) for val in dut.s_b.value]
-    s_b_expected = [hex(int(val)) for val in to_limbs(LAB_INPUT_B, 8, 32)]
+    s_b_expected = [hex(int(val)) for val in to_limbs(LAB_INPUT_B, num_limbs, 32)]
 
     assert s_a == s_a_expected, "Input not loaded successfully"
     assert s_b == s_b_expected, "Input not loaded successfully"
@@ -119,7 +122,8 @@ async def test_lab_results(dut, test_data):
     # Input has been loaded
     await RisingEdge(dut.clk)
 
-    for _ in range(34):
+    # One clock cycle per instruction of the schedule, and one for the result
+    for _ in range(get_num_instructions(len(dut.s_a.value)) + 1):
         await RisingEdge(dut.clk)
 
     dut._log.info("Output value: \t\t 0x%X", dut.u.value)
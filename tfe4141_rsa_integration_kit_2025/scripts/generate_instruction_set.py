@@ -4,13 +4,26 @@ systolic array implementation of montgomery monpro CIOS.
 """
 
 import sys
+import math
+import argparse
 from enum import IntEnum
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 PACKAGE_NAME = "instruction_pkg"
 
-# Expected number of clock cycles to perform the entire algorithm
-NUM_CLOCK_CYCLES = 33
+# Default configuration, C_DATA_WIDTH and C_LIMB_WIDTH in montgomery_pkg.vhd.
+# These and the formulas below have to match the python models in
+# high-level-simulation/python/src/modexp_cycle_model.py, which is tested there.
+BLOCK_SIZE = 256
+LIMB_WIDTH = 32
+
+# Clock cycles used by montgomery_modexp2 around each monpro
+MONPRO_HANDSHAKE_CYCLES = 3
+
+# An alpha result is used by gamma one clock cycle later, and the gamma result is
+# used by the alpha handling the next limb one clock cycle after that, so each
+# processing element handles the limbs of three consecutive clock cycles
+NUM_PHASES = 3
 
 
 @dataclass
@@ -30,8 +43,11 @@ class InstructionWord:
         return "".join(str(x) for x in self.instruction_word)
 
 
+@dataclass
 class InstructionSet:
-    instruction_set: list[InstructionWord] = []
+    num_limbs: int
+    num_pe: int
+    instruction_set: list[InstructionWord] = field(default_factory=list)
 
     def __iter__(self):
         return iter(self.instruction_set)
@@ -39,6 +55,9 @@ class InstructionSet:
     def __getitem__(self, key):
         return self.instruction_set[key]
 
+    def __len__(self):
+        return len(self.instruction_set)
+
 
 @dataclass
 class AlphaMux:
@@ -85,44 +104,6 @@ class AlphaAMux:
         return f"{self.a_input}"
 
 
-class Alpha1Carry(IntEnum):
-    zero = 0
-    alpha_1 = 1
-
-
-class Alpha1Sum(IntEnum):
-    zero = 0
-    gamma_1 = 1
-    gamma_2 = 2
-
-
-class Alpha2Carry(IntEnum):
-    alpha_1 = 0
-    alpha_2 = 1
-
-
-class Alpha2Sum(IntEnum):
-    zero = 0
-    gamma_2 = 1
-    gamma_3 = 2
-
-
-class Alpha3Carry(IntEnum):
-    alpha_2 = 0
-    alpha_3 = 1
-
-
-class Alpha3Sum(IntEnum):
-    zero = 0
-    gamma_3 = 1
-    gamma_final = 2
-
-
-class AlphaFinalSum(IntEnum):
-    zero = 0
-    gamma_final = 1
-
-
 # Gamma
 @dataclass
 class GammaMux:
@@ -155,112 +136,146 @@ class GammaNMux:
         return f"{self.n_input}"
 
 
-@dataclass
-class Gamma2Sum(IntEnum):
-    alpha_1 = 0
-    alpha_2 = 1
+class AlphaFinalSum(IntEnum):
+    zero = 0
+    gamma_final = 1
 
 
-@dataclass
-class Gamma2Carry(IntEnum):
-    gamma_1 = 0
-    gamma_2 = 1
+def _gamma_name(index: int, num_pe: int) -> str:
+    return "gamma_final" if index > num_pe else f"gamma_{index}"
 
 
-@dataclass
-class Gamma3Sum(IntEnum):
-    alpha_2 = 0
-    alpha_3 = 1
+def alpha_carry_enum(index: int) -> IntEnum:
+    """Mux selecting the carry input of alpha module 'index' (starting at 1)"""
 
+    if index == 1:
+        return IntEnum("Alpha1Carry", [("zero", 0), ("alpha_1", 1)])
 
-@dataclass
-class Gamma3Carry(IntEnum):
-    gamma_2 = 0
-    gamma_3 = 1
+    return IntEnum(
+        f"Alpha{index}Carry", [(f"alpha_{index - 1}", 0), (f"alpha_{index}", 1)]
+    )
 
 
-def main():
-    instruction_set = InstructionSet()
+def alpha_sum_enum(index: int, num_pe: int) -> IntEnum:
+    """Mux selecting the sum input of alpha module 'index' (starting at 1)"""
 
-    for clock_cycle in range(NUM_CLOCK_CYCLES):
-        a_input = clock_cycle % 3
-        n_input = clock_cycle % 3
+    return IntEnum(
+        f"Alpha{index}Sum",
+        [
+            ("zero", 0),
+            (_gamma_name(index, num_pe), 1),
+            (_gamma_name(index + 1, num_pe), 2),
+        ],
+    )
 
-        # Alpha modules
-        if clock_cycle % 3 == 0:
-            # The start of each "block"
-            alpha_1_sum_instruction = Alpha1Sum.gamma_1
-            alpha_1_carry_instruction = Alpha1Carry.zero
 
-            alpha_2_sum_instruction = Alpha2Sum.gamma_2
-            alpha_2_carry_instruction = Alpha2Carry.alpha_1
+def gamma_sum_enum(index: int) -> IntEnum:
+    """Mux selecting the sum input of gamma module 'index' (starting at 2)"""
 
-            alpha_3_sum_instruction = Alpha3Sum.gamma_3
-            alpha_3_carry_instruction = Alpha3Carry.alpha_2
+    return IntEnum(
+        f"Gamma{index}Sum", [(f"alpha_{index - 1}", 0), (f"alpha_{index}", 1)]
+    )
 
-        else:
-            alpha_1_sum_instruction = Alpha1Sum.gamma_2
-            alpha_1_carry_instruction = Alpha1Carry.alpha_1
-
-            alpha_2_sum_instruction = Alpha2Sum.gamma_3
-            alpha_2_carry_instruction = Alpha2Carry.alpha_2
-
-            alpha_3_sum_instruction = Alpha3Sum.gamma_final
-            alpha_3_carry_instruction = Alpha3Carry.alpha_3
-
-        # For the first 3 clock cycles for each module, the sum is zero
-        if clock_cycle <= 2:
-            alpha_1_sum_instruction = Alpha1Sum.zero
-        if clock_cycle <= 5:
-            alpha_2_sum_instruction = Alpha2Sum.zero
-        if clock_cycle <= 7:
-            alpha_3_sum_instruction = Alpha3Sum.zero
-        if clock_cycle <= 8:
-            alpha_final_sum = AlphaFinalSum.zero
-        else:
-            alpha_final_sum = AlphaFinalSum.gamma_final
 
-        alpha_1 = AlphaMux(
-            carry_instruction=alpha_1_carry_instruction,
-            sum_instruction=alpha_1_sum_instruction,
-        )
+def gamma_carry_enum(index: int) -> IntEnum:
+    """Mux selecting the carry input of gamma module 'index' (starting at 2)"""
 
-        alpha_2 = AlphaMux(
-            carry_instruction=alpha_2_carry_instruction,
-            sum_instruction=alpha_2_sum_instruction,
-        )
+    return IntEnum(
+        f"Gamma{index}Carry", [(f"gamma_{index - 1}", 0), (f"gamma_{index}", 1)]
+    )
 
-        alpha_3 = AlphaMux(
-            carry_instruction=alpha_3_carry_instruction,
-            sum_instruction=alpha_3_sum_instruction,
-        )
 
-        alpha_final = AlphaFinalMux(sum_instruction=alpha_final_sum)
+def get_num_pe(num_limbs: int) -> int:
+    """
+    Number of alpha (and gamma) modules needed for 'num_limbs' limbs
+
+    The alpha modules handle limb 0 to num_limbs, where the last position adds
+    the carry to the most significant word of the intermediate result.
+    """
+
+    return math.ceil((num_limbs + 1) / NUM_PHASES)
+
+
+def get_schedule_num_limbs(num_pe: int) -> int:
+    """Number of limbs the schedule of 'num_pe' modules is made for"""
+
+    return NUM_PHASES * num_pe - 1
+
+
+def get_num_instructions(num_limbs: int) -> int:
+    """
+    Number of instructions, and clock cycles in ST_CALC, for one monpro
+
+    The first word of the result is ready NUM_PHASES * num_limbs clock cycles
+    after the start, and the num_limbs + 1 words of the result are captured
+    one per clock cycle after that.
+    """
 
-        # Gamma modules
+    return NUM_PHASES * num_limbs + num_limbs + 1
 
-        if clock_cycle % 3 == 0:
-            gamma_2_sum_instruction = Gamma2Sum.alpha_1
-            gamma_2_carry_instruction = Gamma2Carry.gamma_1
 
-            gamma_3_sum_instruction = Gamma3Sum.alpha_2
-            gamma_3_carry_instruction = Gamma3Carry.gamma_2
+def generate_instruction_set(num_pe: int) -> InstructionSet:
+    """Generate the instruction for every clock cycle of a monpro"""
+
+    num_limbs = get_schedule_num_limbs(num_pe)
+    num_clock_cycles = get_num_instructions(num_limbs)
+
+    instruction_set = InstructionSet(num_limbs=num_limbs, num_pe=num_pe)
+
+    alpha_carry = [alpha_carry_enum(k) for k in range(1, num_pe + 1)]
+    alpha_sum = [alpha_sum_enum(k, num_pe) for k in range(1, num_pe + 1)]
+    gamma_carry = [gamma_carry_enum(k) for k in range(2, num_pe + 1)]
+    gamma_sum = [gamma_sum_enum(k) for k in range(2, num_pe + 1)]
+
+    for clock_cycle in range(num_clock_cycles):
+        phase = clock_cycle % NUM_PHASES
+
+        a_input = phase
+        n_input = phase
+
+        # Alpha modules
+        alpha_muxes = []
+        for k in range(num_pe):
+            if phase == 0:
+                # The start of each "block", the carry comes from the previous
+                # module and the sum from the gamma module below
+                carry_instruction = alpha_carry[k](0)
+                sum_instruction = alpha_sum[k](1)
+            else:
+                carry_instruction = alpha_carry[k](1)
+                sum_instruction = alpha_sum[k](2)
+
+            # The sum is zero until the module has handled its first block,
+            # the last module only has NUM_PHASES - 1 limbs of a
+            num_limbs_k = min(NUM_PHASES, num_limbs - NUM_PHASES * k)
+            if clock_cycle <= NUM_PHASES * k + num_limbs_k - 1:
+                sum_instruction = alpha_sum[k].zero
+
+            alpha_muxes.append(
+                AlphaMux(
+                    carry_instruction=carry_instruction,
+                    sum_instruction=sum_instruction,
+                )
+            )
+
+        if clock_cycle <= NUM_PHASES * num_pe - 1:
+            alpha_final_sum = AlphaFinalSum.zero
         else:
-            gamma_2_sum_instruction = Gamma2Sum.alpha_2
-            gamma_2_carry_instruction = Gamma2Carry.gamma_2
+            alpha_final_sum = AlphaFinalSum.gamma_final
 
-            gamma_3_sum_instruction = Gamma3Sum.alpha_3
-            gamma_3_carry_instruction = Gamma3Carry.gamma_3
+        alpha_final = AlphaFinalMux(sum_instruction=alpha_final_sum)
 
-        gamma_2 = GammaMux(
-            carry_instruction=gamma_2_carry_instruction,
-            sum_instruction=gamma_2_sum_instruction,
-        )
+        # Gamma modules, the first gamma module has no muxes
+        gamma_muxes = []
+        for k in range(num_pe - 1):
+            select = 0 if phase == 0 else 1
 
-        gamma_3 = GammaMux(
-            carry_instruction=gamma_3_carry_instruction,
-            sum_instruction=gamma_3_sum_instruction,
-        )
+            gamma_muxes.append(
+                GammaMux(
+                    carry_instruction=gamma_carry[k](select),
+                    sum_instruction=gamma_sum[k](select),
+                )
+            )
 
         alpha_a = AlphaAMux(a=a_input)
         gamma_n = GammaNMux(n=n_input)
@@ -269,17 +284,20 @@ def main():
             instruction_word=[
                 gamma_n,
                 alpha_a,
-                gamma_3,
-                gamma_2,
+                *gamma_muxes[::-1],
                 alpha_final,
-                alpha_3,
-                alpha_2,
-                alpha_1,
+                *alpha_muxes[::-1],
             ]
         )
 
         instruction_set.instruction_set.append(instruction_word)
 
+    return instruction_set
+
+
+def write_instruction_pkg(instruction_set: InstructionSet, path: str):
+    """Write the instruction set as a VHDL package"""
+
     package_file_content_prefix = f"""-- This file has been generated using a python script,
 -- please do not make any modifications to this file directly.
 
@@ -289,8 +307,8 @@ use ieee.numeric_std.all;
 
 package {PACKAGE_NAME} is
 
-    constant C_NUMBER_OF_INSTRUCTIONS : integer := {NUM_CLOCK_CYCLES};
-    constant C_INSTRUCTION_LENGTH : integer := {len(str(instruction_word))};
+    constant C_NUMBER_OF_INSTRUCTIONS : integer := {len(instruction_set)};
+    constant C_INSTRUCTION_LENGTH : integer := {len(str(instruction_set[0]))};
 
     type T_INSTRUCTION_SET is array(0 to C_NUMBER_OF_INSTRUCTIONS - 1) of std_logic_vector(C_INSTRUCTION_LENGTH - 1 downto 0);
 
@@ -305,7 +323,7 @@ package body {PACKAGE_NAME} is
 end package body {PACKAGE_NAME};
 """
 
-    with open(PACKAGE_NAME + ".vhd", "w") as file:
+    with open(path, "w") as file:
         file.write(package_file_content_prefix)
 
         for instruction in instruction_set[:-1]:
@@ -315,5 +333,89 @@ end package body {PACKAGE_NAME};
         file.write(package_file_content_suffix)
 
 
+def get_configuration(block_size: int, limb_width: int, num_pe: int = None):
+    """
+    Get the number of processing elements and limbs for a block size and limb width
+
+    By default the smallest number of processing elements is used. The schedule
+    always uses NUM_PHASES * num_pe - 1 limbs, so the data path is zero padded
+    if that is more than needed for the block size.
+    """
+
+    min_num_limbs = math.ceil(block_size / limb_width)
+
+    if num_pe is None:
+        num_pe = get_num_pe(min_num_limbs)
+    elif get_schedule_num_limbs(num_pe) < min_num_limbs:
+        raise ValueError(
+            f"{num_pe} processing elements can not handle {min_num_limbs} limbs, "
+            f"valid number of processing elements are: {get_num_pe(min_num_limbs)} "
+            "or more"
+        )
+
+    return num_pe, get_schedule_num_limbs(num_pe)
+
+
+def print_sweep(block_size: int, limb_widths, handshake_cycles: int):
+    """Print the cycles per monpro for a range of limb widths"""
+
+    print("limb width | limbs | alpha/gamma | instructions | cycles per monpro")
+    for limb_width in limb_widths:
+        num_pe, num_limbs = get_configuration(block_size, limb_width)
+        num_instructions = get_num_instructions(num_limbs)
+
+        print(
+            f"{limb_width:10} | {num_limbs:5} | {num_pe:11} | {num_instructions:12} | "
+            f"{num_instructions + handshake_cycles:17}"
+        )
+
+
+def main():
+    """Run main CLI application"""
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-b", "--block-size", default=BLOCK_SIZE, type=int)
+    parser.add_argument("-w", "--limb-width", default=LIMB_WIDTH, type=int)
+    parser.add_argument(
+        "-p",
+        "--num-pe",
+        default=None,
+        type=int,
+        help="Number of alpha and gamma modules, by default the smallest possible",
+    )
+    parser.add_argument("-o", "--output", default=PACKAGE_NAME + ".vhd")
+    parser.add_argument(
+        "--handshake-cycles",
+        default=MONPRO_HANDSHAKE_CYCLES,
+        type=int,
+        help="Clock cycles used by montgomery_modexp2 around each monpro",
+    )
+    parser.add_argument(
+        "--sweep",
+        nargs="+",
+        type=int,
+        metavar="LIMB_WIDTH",
+        help="Only print the cycles per monpro for the given limb widths",
+    )
+    args = parser.parse_args()
+
+    if args.sweep:
+        print_sweep(args.block_size, args.sweep, args.handshake_cycles)
+        return 0
+
+    num_pe, num_limbs = get_configuration(args.block_size, args.limb_width, args.num_pe)
+
+    instruction_set = generate_instruction_set(num_pe)
+    write_instruction_pkg(instruction_set, args.output)
+
+    print(f"Limbs: {num_limbs} of {args.limb_width} bits")
+    print(f"Alpha and gamma modules: {num_pe}")
+    print(f"Instruction length: {len(str(instruction_set[0]))}")
+    print(f"Instructions: {len(instruction_set)}")
+    print(f"Clock cycles per monpro: {len(instruction_set) + args.handshake_cycles}")
+
+    return 0
+
+
 if __name__ == "__main__":
     sys.exit(main())